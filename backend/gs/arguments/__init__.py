@@ -43,6 +43,7 @@ class ModelParams(ParamGroup):
         self._white_background = False
         self.data_device = "cuda"
         self.eval = False
+        self.dataset_cache = ""
         super().__init__(parser, "Loading Parameters", sentinel)
 
     def extract(self, args):
@@ -54,6 +55,7 @@ class PipelineParams(ParamGroup):
     def __init__(self, parser):
         self.convert_SHs_python = False
         self.compute_cov3D_python = False
+        self.fused_activations = False
         self.debug = False
         super().__init__(parser, "Pipeline Parameters")
 
@@ -76,6 +78,25 @@ class OptimizationParams(ParamGroup):
         self.densify_until_iter = 15_000
         self.densify_grad_threshold = 0.0002
         self.random_background = False
+        self.capacity_mode = False
+        self.capacity_headroom = 2.0
+        self.compaction_threshold = 0.25
+        self.max_gaussians = 0
+        self.max_memory_mb = 0
+        self.budget_prune_ratio = 0.9
+        self.budget_min_opacity = 0.02
+        self.mixed_precision = False
+        self.feature_dtype = "bfloat16"
+        self.sparse_adam = False
+        self.batch_size = 1
+        self.fused_features = False
+        self.early_stop = False
+        self.convergence_interval = 1000
+        self.convergence_min_gain = 0.05
+        self.convergence_patience = 2
+        self.convergence_start = 3000
+        self.convergence_cameras = 8
+        self.convergence_tail = 1000
 
         super().__init__(parser, "Optimization Parameters")
 
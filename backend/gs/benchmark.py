@@ -0,0 +1,341 @@
+import os
+import re
+import sys
+import time
+import tempfile
+import subprocess
+import torch
+from argparse import ArgumentParser
+from utils.loss_utils import ssim, fast_ssim
+from utils.optim_utils import MixedPrecisionAdam, RowSparseAdam, STORAGE_DTYPES
+from utils.fused_utils import ActivationBuffers, fused_activations, fused_covariance, join_features
+
+
+def _time_call(fn, repeats, device):
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def bench_ssim(args):
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    img1 = torch.rand((3, args.height, args.width), device=device, requires_grad=True)
+    img2 = torch.rand((3, args.height, args.width), device=device)
+
+    reference = ssim(img1, img2)
+    fused = fast_ssim(img1, img2)
+    grad_ref, = torch.autograd.grad(reference, img1)
+    grad_fused, = torch.autograd.grad(fused, img1)
+
+    print(f"SSIM parity on {device} ({args.height}x{args.width})")
+    print(f"  value     : ssim={reference.item():.8f} fast_ssim={fused.item():.8f} |diff|={abs(reference.item() - fused.item()):.3e}")
+    print(f"  max |dgrad|: {(grad_ref - grad_fused).abs().max().item():.3e}")
+
+    def run(fn):
+        def step():
+            value = fn(img1, img2)
+            value.backward()
+        return step
+
+    ms_ref = _time_call(run(ssim), args.repeats, device)
+    ms_fused = _time_call(run(fast_ssim), args.repeats, device)
+    print(f"  ssim      : {ms_ref:.3f} ms/iter (forward + backward)")
+    print(f"  fast_ssim : {ms_fused:.3f} ms/iter (forward + backward), {ms_ref / ms_fused:.2f}x")
+
+
+def _run_training(args, model_path, extra_args, return_output=False, views_per_second=False, iterations=None):
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "train.py"),
+        "--source_path", args.source_path,
+        "--model_path", model_path,
+        "--iterations", str(iterations or args.iterations),
+        "--port", str(args.port),
+    ] + extra_args
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    match = re.search(r"\[Training loop\] (\d+) iterations in ([\d.]+) s \(([\d.]+) it/s, ([\d.]+) views/s", result.stdout)
+    if result.returncode != 0 or match is None:
+        print(result.stdout[-2000:])
+        raise RuntimeError(f"Training run failed: {' '.join(command)}")
+    if return_output:
+        return float(match.group(3)), result.stdout
+    if views_per_second:
+        return float(match.group(4))
+    return float(match.group(3))
+
+
+def bench_loop(args):
+    modes = [("default", []), ("fast_loop", ["--fast_loop", "--loss_readback_interval", str(args.loss_readback_interval)])]
+    print(f"Training loop throughput on {args.source_path} ({args.iterations} iterations)")
+    results = {}
+    for name, extra_args in modes:
+        with tempfile.TemporaryDirectory() as model_path:
+            results[name] = _run_training(args, model_path, extra_args)
+        print(f"  {name:<10}: {results[name]:.2f} it/s")
+    print(f"  speedup   : {results['fast_loop'] / results['default']:.2f}x")
+
+
+def _fit_features(optimizer_cls, dtype, args, device, **kwargs):
+    """ Fit random SH rest coefficients to a fixed target with Adam, as the f_rest group is trained """
+    generator = torch.Generator(device="cpu").manual_seed(0)
+    target = (torch.randn((args.num_gaussians, 15, 3), generator=generator) * 0.1).to(device)
+    init = (torch.randn((args.num_gaussians, 15, 3), generator=generator) * 0.1).to(device)
+    param = torch.nn.Parameter(init.to(dtype))
+    optimizer = optimizer_cls([{"params": [param], "lr": 0.0025 / 20.0, "name": "f_rest"}], lr=0.0, eps=1e-15, **kwargs)
+    for _ in range(args.steps):
+        loss = (param.to(torch.float32) - target).abs().mean()
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    state = optimizer.state[param]
+    state_bytes = sum(t.numel() * t.element_size() for k, t in state.items() if k != "step")
+    return (param.detach().float() - target).abs().mean().item(), param.numel() * param.element_size() + state_bytes
+
+
+def _evaluate_psnr(source_path, model_path):
+    from arguments import ModelParams, PipelineParams
+    from scene import Scene, GaussianModel
+    from gaussian_renderer import render
+    from utils.image_utils import psnr
+
+    parser = ArgumentParser()
+    model_params = ModelParams(parser)
+    pipeline_params = PipelineParams(parser)
+    parsed = parser.parse_args(["--source_path", source_path, "--model_path", model_path, "--eval"])
+    dataset = model_params.extract(parsed)
+    gaussians = GaussianModel(dataset.sh_degree)
+    scene = Scene(dataset, gaussians, load_iteration=-1, shuffle=False)
+    cameras = scene.getTestCameras() or scene.getTrainCameras()
+    background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0], dtype=torch.float32, device="cuda")
+    values = []
+    with torch.no_grad():
+        for camera in cameras:
+            image = torch.clamp(render(camera, gaussians, pipeline_params.extract(parsed), background)["render"], 0.0, 1.0)
+            values.append(psnr(image, camera.original_image.cuda()).mean().item())
+    return sum(values) / len(values)
+
+
+def bench_precision(args):
+    device = torch.device(args.device)
+    print(f"f_rest optimizer parity on {device} ({args.num_gaussians} Gaussians, {args.steps} steps)")
+    error_ref, bytes_ref = _fit_features(torch.optim.Adam, torch.float32, args, device)
+    print(f"  float32   : L1 to target {error_ref:.6f}, {bytes_ref / 2**20:.2f} MB parameter + moments")
+    for name in ("float16", "bfloat16"):
+        error, nbytes = _fit_features(MixedPrecisionAdam, STORAGE_DTYPES[name], args, device)
+        print(f"  {name:<10}: L1 to target {error:.6f}, {nbytes / 2**20:.2f} MB parameter + moments ({bytes_ref / nbytes:.2f}x smaller)")
+
+    if args.source_path is None:
+        return
+    print(f"Training on {args.source_path} ({args.iterations} iterations)")
+    modes = [("float32", []), (args.feature_dtype, ["--mixed_precision", "--feature_dtype", args.feature_dtype])]
+    for name, extra_args in modes:
+        with tempfile.TemporaryDirectory() as model_path:
+            its, output = _run_training(args, model_path, ["--eval"] + extra_args, return_output=True)
+            memory = re.search(r"\[Training memory\] peak ([\d.]+) MB, (\d+) Gaussians, (\d+) bytes/Gaussian", output)
+            quality = _evaluate_psnr(args.source_path, model_path)
+        print(f"  {name:<10}: {its:.2f} it/s, peak {memory.group(1)} MB, {memory.group(2)} Gaussians, "
+              f"{memory.group(3)} bytes/Gaussian, PSNR {quality:.2f} dB")
+
+
+def bench_batch(args):
+    print(f"Multi-view batch throughput on {args.source_path} ({args.views} views per run)")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        with tempfile.TemporaryDirectory() as model_path:
+            views_per_second = _run_training(args, model_path, ["--batch_size", str(batch_size)],
+                                             views_per_second=True, iterations=max(args.views // batch_size, 1))
+        baseline = baseline or views_per_second
+        print(f"  B={batch_size:<2}: {views_per_second:.2f} views/s ({views_per_second / baseline:.2f}x)")
+
+
+def bench_activations(args):
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    n = args.num_gaussians
+    scaling = torch.randn((n, 3), device=device, requires_grad=True)
+    rotation = torch.randn((n, 4), device=device, requires_grad=True)
+    opacity = torch.randn((n, 1), device=device, requires_grad=True)
+    features = torch.randn((n, 16, 3), device=device)
+    features_dc = torch.nn.Parameter(features[:, :1])
+    features_rest = torch.nn.Parameter(features[:, 1:])
+    separate_dc = torch.nn.Parameter(features[:, :1].clone())
+    separate_rest = torch.nn.Parameter(features[:, 1:].clone())
+    buffers = ActivationBuffers()
+
+    def reference():
+        outputs = (torch.exp(scaling), torch.nn.functional.normalize(rotation), torch.sigmoid(opacity),
+                   torch.cat((separate_dc, separate_rest), dim=1))
+        sum(o.sum() for o in outputs).backward()
+
+    def fused():
+        outputs = fused_activations(scaling, rotation, opacity, buffers) + (join_features(features_dc, features_rest, features),)
+        sum(o.sum() for o in outputs).backward()
+
+    print(f"Activations + feature join on {device} ({n} Gaussians, forward + backward)")
+    ms_ref = _time_call(reference, args.repeats, device)
+    ms_fused = _time_call(fused, args.repeats, device)
+    print(f"  separate ops : {ms_ref:.3f} ms")
+    print(f"  fused        : {ms_fused:.3f} ms ({ms_ref / ms_fused:.2f}x)")
+
+    if device.type == "cuda":
+        # build_scaling_rotation() allocates on cuda, so the covariance comparison needs a GPU
+        from utils.general_utils import build_scaling_rotation, strip_symmetric
+
+        def reference_cov():
+            L = build_scaling_rotation(torch.exp(scaling), rotation)
+            strip_symmetric(L @ L.transpose(1, 2)).sum().backward()
+
+        def fused_cov():
+            activated_scaling, activated_rotation, _ = fused_activations(scaling, rotation, opacity, buffers)
+            fused_covariance(activated_scaling, activated_rotation).sum().backward()
+
+        ms_ref = _time_call(reference_cov, args.repeats, device)
+        ms_fused = _time_call(fused_cov, args.repeats, device)
+        print(f"  covariance   : {ms_ref:.3f} ms separate, {ms_fused:.3f} ms fused ({ms_ref / ms_fused:.2f}x)")
+
+
+def bench_cameras(args):
+    import numpy as np
+    from scene.cameras import Camera, CameraSet
+
+    rng = np.random.default_rng(0)
+    poses = []
+    for _ in range(args.num_cameras):
+        R, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+        poses.append((R * np.sign(np.linalg.det(R)), rng.normal(size=3)))
+    image = torch.zeros((3, 4, 4))
+
+    def build(batched):
+        cameras = [Camera(colmap_id=i, R=R, T=T, FoVx=0.9, FoVy=0.7, image=image, gt_alpha_mask=None, image_name=str(i),
+                          uid=i, data_device=args.device, build_transforms=not batched) for i, (R, T) in enumerate(poses)]
+        if batched:
+            CameraSet(cameras, device=args.device)
+
+    device = torch.device(args.device)
+    print(f"Camera construction on {device} ({args.num_cameras} cameras)")
+    ms_single = _time_call(lambda: build(False), args.repeats, device)
+    ms_set = _time_call(lambda: build(True), args.repeats, device)
+    print(f"  per camera : {ms_single:.3f} ms")
+    print(f"  CameraSet  : {ms_set:.3f} ms ({ms_single / ms_set:.2f}x)")
+
+
+def bench_adam(args):
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    # Per-Gaussian attribute shapes at SH degree 3: xyz, f_dc, f_rest, opacity, scaling, rotation
+    shapes = [(3,), (1, 3), (15, 3), (1,), (3,), (4,)]
+
+    def make(optimizer_cls):
+        params = [torch.nn.Parameter(torch.randn((args.num_gaussians,) + shape, device=device)) for shape in shapes]
+        optimizer = optimizer_cls([{"params": [p], "lr": 1e-3} for p in params], lr=0.0, eps=1e-15)
+        return params, optimizer
+
+    print(f"Optimizer step on {device} ({args.num_gaussians} Gaussians)")
+    params, dense = make(torch.optim.Adam)
+    for p in params:
+        p.grad = torch.randn_like(p)
+    ms_dense = _time_call(dense.step, args.repeats, device)
+    print(f"  Adam          : {ms_dense:.3f} ms/step")
+    params, sparse = make(RowSparseAdam)
+    for p in params:
+        p.grad = torch.randn_like(p)
+    for fraction in args.visible_fractions:
+        visibility = torch.rand(args.num_gaussians, device=device) < fraction
+        ms_sparse = _time_call(lambda: sparse.step(visibility=visibility), args.repeats, device)
+        print(f"  RowSparseAdam : {ms_sparse:.3f} ms/step at {fraction:.0%} visible ({ms_dense / ms_sparse:.2f}x)")
+
+
+def bench_requests(args):
+    import json
+    import numpy as np
+    from splatviz_network import SplatvizNetworkWs, EasyDict
+    from splatviz_network.protocol import encode_request, decode_request
+
+    rng = np.random.default_rng(0)
+    request = {
+        "resolution_x": 1024, "resolution_y": 1024, "train": True, "fov_y": 0.8, "fov_x": 0.8, "z_near": 0.01, "z_far": 10.0,
+        "shs_python": False, "rot_scale_python": False, "keep_alive": True, "scaling_modifier": 1, "edit_text": "", "slider": {},
+        "single_training_step": False, "stop_at_value": -1, "quality": "auto", "is_predictive": False,
+        "encoding": ["jpeg", "raw"], "encode_quality": 90, "adaptive": True,
+        "view_matrix": rng.normal(size=16).astype(np.float32), "view_projection_matrix": rng.normal(size=16).astype(np.float32),
+    }
+    json_message = json.dumps(dict(request, view_matrix=request["view_matrix"].tolist(),
+                                   view_projection_matrix=request["view_projection_matrix"].tolist()))
+    binary_message = encode_request(request)
+    server = SplatvizNetworkWs()
+    device = torch.device("cuda")
+
+    print(f"Viewer request decoding ({args.repeats} requests)")
+    for name, message, parse in (("JSON  ", json_message, lambda m: EasyDict(json.loads(m))),
+                                 ("binary", binary_message, lambda m: EasyDict(decode_request(m)))):
+        ms_parse = _time_call(lambda: parse(message), args.repeats, device)
+        ms_camera = _time_call(lambda: server._parse_render_request(parse(message)), args.repeats, device)
+        print(f"  {name} : {len(message)} bytes, parse {ms_parse * 1000:.1f} us, parse + camera {ms_camera * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Micro benchmarks for the training pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ssim_parser = subparsers.add_parser("ssim", help="Compare ssim() and fast_ssim() for parity and speed")
+    ssim_parser.add_argument("--device", type=str, default="cpu")
+    ssim_parser.add_argument("--height", type=int, default=540)
+    ssim_parser.add_argument("--width", type=int, default=960)
+    ssim_parser.add_argument("--repeats", type=int, default=20)
+    ssim_parser.set_defaults(func=bench_ssim)
+
+    loop_parser = subparsers.add_parser("loop", help="Compare training iterations/sec with and without --fast_loop")
+    loop_parser.add_argument("--source_path", "-s", type=str, required=True)
+    loop_parser.add_argument("--iterations", type=int, default=2000)
+    loop_parser.add_argument("--loss_readback_interval", type=int, default=10)
+    loop_parser.add_argument("--port", type=int, default=6019)
+    loop_parser.set_defaults(func=bench_loop)
+
+    precision_parser = subparsers.add_parser("precision", help="Compare float32 and mixed-precision feature storage for memory and quality")
+    precision_parser.add_argument("--device", type=str, default="cpu")
+    precision_parser.add_argument("--num_gaussians", type=int, default=100_000)
+    precision_parser.add_argument("--steps", type=int, default=500)
+    precision_parser.add_argument("--source_path", "-s", type=str, default=None)
+    precision_parser.add_argument("--iterations", type=int, default=7000)
+    precision_parser.add_argument("--feature_dtype", type=str, default="bfloat16", choices=["float16", "bfloat16"])
+    precision_parser.add_argument("--port", type=int, default=6019)
+    precision_parser.set_defaults(func=bench_precision)
+
+    batch_parser = subparsers.add_parser("batch", help="Compare training views/sec across --batch_size values")
+    batch_parser.add_argument("--source_path", "-s", type=str, required=True)
+    batch_parser.add_argument("--views", type=int, default=4000)
+    batch_parser.add_argument("--batch_sizes", nargs="+", type=int, default=[1, 2, 4, 8])
+    batch_parser.add_argument("--port", type=int, default=6019)
+    batch_parser.set_defaults(func=bench_batch)
+
+    activations_parser = subparsers.add_parser("activations", help="Compare separate and fused activation/feature paths")
+    activations_parser.add_argument("--device", type=str, default="cpu")
+    activations_parser.add_argument("--num_gaussians", type=int, default=1_000_000)
+    activations_parser.add_argument("--repeats", type=int, default=20)
+    activations_parser.set_defaults(func=bench_activations)
+
+    cameras_parser = subparsers.add_parser("cameras", help="Compare per-camera and batched CameraSet transform construction")
+    cameras_parser.add_argument("--device", type=str, default="cuda")
+    cameras_parser.add_argument("--num_cameras", type=int, default=300)
+    cameras_parser.add_argument("--repeats", type=int, default=5)
+    cameras_parser.set_defaults(func=bench_cameras)
+
+    adam_parser = subparsers.add_parser("adam", help="Compare dense Adam and RowSparseAdam step time")
+    adam_parser.add_argument("--device", type=str, default="cpu")
+    adam_parser.add_argument("--num_gaussians", type=int, default=1_000_000)
+    adam_parser.add_argument("--visible_fractions", nargs="+", type=float, default=[0.1, 0.2, 0.5])
+    adam_parser.add_argument("--repeats", type=int, default=20)
+    adam_parser.set_defaults(func=bench_adam)
+
+    requests_parser = subparsers.add_parser("requests", help="Compare JSON and binary viewer request parse and camera build latency")
+    requests_parser.add_argument("--repeats", type=int, default=1000)
+    requests_parser.set_defaults(func=bench_requests)
+
+    args = parser.parse_args()
+    args.func(args)
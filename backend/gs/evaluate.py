@@ -0,0 +1,139 @@
+import os
+import sys
+import copy
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from argparse import ArgumentParser
+import torch
+from arguments import ModelParams, PipelineParams, get_combined_args
+from scene import GaussianModel, load_scene_info
+from scene.cameras import CameraSet
+from gaussian_renderer import render
+from utils.camera_utils import loadCam
+from utils.image_utils import psnr
+from utils.loss_utils import fast_ssim
+from utils.system_utils import searchForMaxIteration
+
+
+def _load_lpips(device):
+    ''' LPIPS (VGG) when the lpips package is installed, otherwise None '''
+    try:
+        import lpips
+    except ImportError:
+        return None
+    return lpips.LPIPS(net="vgg", verbose=False).to(device).eval()
+
+
+def _load_view(load_args, idx, cam_info):
+    ''' Decode and resize one ground-truth image on a worker thread, into pinned memory when CUDA is available '''
+    camera = loadCam(load_args, idx, cam_info, 1.0)
+    if torch.cuda.is_available():
+        camera.original_image = camera.original_image.pin_memory()
+    return camera
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+@torch.no_grad()
+def evaluate(dataset, pipe, iteration=-1, batch_size=4, num_workers=4, use_lpips=True):
+    """
+    Render every held-out camera with the saved model and write metrics.json next to it.
+
+    Ground-truth images are decoded on `num_workers` threads while earlier batches render,
+    and PSNR/SSIM (plus LPIPS when available) are computed per batch. Without an --eval
+    split the training cameras are scored instead, and the report says so.
+    """
+    if iteration == -1:
+        iteration = searchForMaxIteration(os.path.join(dataset.model_path, "point_cloud"))
+    gaussians = GaussianModel(dataset.sh_degree)
+    gaussians.load_ply(os.path.join(dataset.model_path, "point_cloud", "iteration_" + str(iteration), "point_cloud.ply"))
+
+    scene_info = load_scene_info(dataset)
+    cam_infos, camera_split = (scene_info.test_cameras, "test") if scene_info.test_cameras else (scene_info.train_cameras, "train")
+    background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0], dtype=torch.float32, device="cuda")
+    lpips_model = _load_lpips("cuda") if use_lpips else None
+
+    load_args = copy.copy(dataset)
+    load_args.data_device = "cpu"
+    per_view = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        pending = deque()
+        views = iter(enumerate(cam_infos))
+
+        def prefetch():
+            # Keep two batches of images loading ahead of the renderer
+            while len(pending) < 2 * batch_size:
+                view = next(views, None)
+                if view is None:
+                    return
+                pending.append(pool.submit(_load_view, load_args, *view))
+
+        prefetch()
+        while pending:
+            cameras = [pending.popleft().result() for _ in range(min(batch_size, len(pending)))]
+            prefetch()
+            # Builds every camera's transforms in one batched computation; the cameras were loaded without them
+            cameras = CameraSet(cameras)
+            renders = [torch.clamp(render(camera, gaussians, pipe, background)["render"], 0.0, 1.0) for camera in cameras]
+            gts = [camera.original_image.to("cuda", non_blocking=True) for camera in cameras]
+            if all(image.shape == renders[0].shape for image in renders + gts):
+                groups = [(cameras, torch.stack(renders), torch.stack(gts))]
+            else:
+                groups = [([camera], image[None], gt[None]) for camera, image, gt in zip(cameras, renders, gts)]
+            for group_cameras, images, gt_images in groups:
+                psnr_values = psnr(images, gt_images).squeeze(-1)
+                ssim_values = fast_ssim(images, gt_images, size_average=False)
+                lpips_values = lpips_model(images * 2 - 1, gt_images * 2 - 1).flatten() if lpips_model is not None else None
+                for i, camera in enumerate(group_cameras):
+                    per_view[camera.image_name] = {
+                        "psnr": psnr_values[i].item(),
+                        "ssim": ssim_values[i].item(),
+                        "lpips": lpips_values[i].item() if lpips_values is not None else None,
+                    }
+    elapsed = time.perf_counter() - start
+
+    def mean(key):
+        values = [view[key] for view in per_view.values() if view[key] is not None]
+        return sum(values) / len(values) if values else None
+
+    metrics = {
+        "iteration": iteration,
+        "camera_split": camera_split,
+        "num_views": len(per_view),
+        "psnr": mean("psnr"),
+        "ssim": mean("ssim"),
+        "lpips": mean("lpips"),
+        "num_gaussians": gaussians.num_gaussians,
+        "elapsed_s": elapsed,
+        "views_per_second": len(per_view) / elapsed if elapsed > 0 else None,
+        "timestamp": time.time(),
+        "per_view": per_view,
+    }
+    _write_json(os.path.join(dataset.model_path, "metrics.json"), metrics)
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Evaluate a trained model on its held-out cameras")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--batch_size", default=4, type=int)
+    parser.add_argument("--num_workers", default=4, type=int)
+    parser.add_argument("--no_lpips", action="store_true", default=False)
+    args = get_combined_args(parser)
+    print("Evaluating " + args.model_path)
+
+    metrics = evaluate(model.extract(args), pipeline.extract(args), args.iteration, args.batch_size, args.num_workers, not args.no_lpips)
+    lpips_text = "n/a" if metrics["lpips"] is None else "{:.4f}".format(metrics["lpips"])
+    print("[Evaluation] {} {} views: PSNR {:.3f} SSIM {:.4f} LPIPS {} ({:.2f} views/s)".format(
+        metrics["num_views"], metrics["camera_split"], metrics["psnr"], metrics["ssim"], lpips_text, metrics["views_per_second"]))
+    sys.exit(0)
@@ -41,18 +41,25 @@ def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor,
 
     means3D = pc.get_xyz
     means2D = screenspace_points
-    opacity = pc.get_opacity
 
     # If precomputed 3d covariance is provided, use it. If not, then it will be computed from
     # scaling / rotation by the rasterizer.
     scales = None
     rotations = None
     cov3D_precomp = None
-    if pipe.compute_cov3D_python:
-        cov3D_precomp = pc.get_covariance(scaling_modifier)
+    if getattr(pipe, "fused_activations", False):
+        scales, rotations, opacity = pc.get_fused_activations()
+        if pipe.compute_cov3D_python:
+            cov3D_precomp = pc.get_fused_covariance(scales, rotations, scaling_modifier)
+            scales = None
+            rotations = None
     else:
-        scales = pc.get_scaling
-        rotations = pc.get_rotation
+        opacity = pc.get_opacity
+        if pipe.compute_cov3D_python:
+            cov3D_precomp = pc.get_covariance(scaling_modifier)
+        else:
+            scales = pc.get_scaling
+            rotations = pc.get_rotation
 
     # If precomputed colors are provided, use them. Otherwise, if it is desired to precompute colors
     # from SHs in Python, do it. If not, then SH -> RGB conversion will be done by rasterizer.
@@ -2,11 +2,13 @@ import asyncio
 import json
 import numpy as np
 import torch
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from threading import Thread
 import websockets
 import websockets.client
 import websockets.exceptions  # 添加异常处理模块
 import cv2
+from splatviz_network.protocol import encode_request
 
 from gs.scene.cameras import CustomCam
 from base_renderer import Renderer
@@ -16,39 +18,116 @@ port = 6009
 
 class WebRenderer(Renderer):
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, binary_requests=True, pipelined=True, timeout=5.0):
         super().__init__()
         self.uri = f"ws://{host}:{port}"
         self._websocket = None
+        # 使用二进制请求格式（固定头部 + float32 矩阵）；连接不支持二进制请求的旧服务器时设为 False 使用 JSON
+        self.binary_requests = binary_requests
+        # 流水线模式：先发送本帧请求，再等待上一帧的结果，往返延迟与渲染重叠
+        self.pipelined = pipelined
+        self.timeout = timeout
+        self._in_flight = None
+        # 常驻事件循环线程，持有唯一的长连接；以下状态只在该线程中访问
+        self._pending = {}
+        self._next_request_id = 0
+        self._reader = None
+        self._connect_lock = asyncio.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = Thread(target=self._loop.run_forever, name="web-renderer", daemon=True)
+        self._loop_thread.start()
 
     async def _get_connection(self):
         if self._websocket and self._websocket.open:
             return self._websocket
 
-        try:
-            self._websocket = await asyncio.wait_for(websockets.client.connect(self.uri), timeout=2.0)
-            print(f"Successfully connected to WebSocket server at {self.uri}")
-            return self._websocket
-        except Exception as e:
-            self._websocket = None
-            # Do not print error spam. The UI will show a connection message.
-            return None
+        # 流水线中的多个请求同时发现连接断开时只建立一次连接
+        async with self._connect_lock:
+            if self._websocket and self._websocket.open:
+                return self._websocket
+            try:
+                self._websocket = await asyncio.wait_for(websockets.client.connect(self.uri), timeout=2.0)
+                self._reader = asyncio.ensure_future(self._read_frames(self._websocket))
+                print(f"Successfully connected to WebSocket server at {self.uri}")
+                return self._websocket
+            except Exception as e:
+                self._websocket = None
+                # Do not print error spam. The UI will show a connection message.
+                return None
 
-    def _render_impl(self, res, **kwargs):
+    def render_future(self, message):
+        """
+        线程安全的渲染接口：在后台事件循环中发送请求，返回 concurrent.futures.Future，
+        结果为服务器返回的 (stats, image_data)。无法连接时 Future 抛出 ConnectionError。
+        """
+        return asyncio.run_coroutine_threadsafe(self._request_frame(message), self._loop)
 
+    async def _request_frame(self, message):
+        websocket = await self._get_connection()
+        if not websocket:
+            raise ConnectionError(f"Connecting to\n{self.uri}...")
+        self._next_request_id += 1
+        request_id = self._next_request_id
+        message = dict(message, request_id=request_id)
+        waiter = self._loop.create_future()
+        self._pending[request_id] = waiter
         try:
-            asyncio.run(self._async_render_impl(res, **kwargs))
-        except RuntimeError as e:
-            # This can happen if an asyncio loop is already running in the thread.
-            # In that case, we can try to get the existing loop.
-            try:
-                loop = asyncio.get_running_loop()
-                loop.run_until_complete(self._async_render_impl(res, **kwargs))
-            except Exception as async_e:
-                res.error = f"Async execution error: {async_e}"
+            if self.binary_requests:
+                await websocket.send(encode_request(message))
+            else:
+                message["view_matrix"] = message["view_matrix"].tolist()
+                message["view_projection_matrix"] = message["view_projection_matrix"].tolist()
+                await websocket.send(json.dumps(message))
+            return await asyncio.wait_for(waiter, timeout=self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
 
+    async def _read_frames(self, websocket):
+        """
+        连接的接收任务：每帧为一条 JSON 统计消息加一条二进制图像消息。服务器只渲染每个客户端
+        最新的请求，因此一帧同时完成其 request_id 及之前所有尚未返回的请求。
+        """
+        stats = None
+        try:
+            async for message in websocket:
+                if isinstance(message, str):
+                    if stats is not None:
+                        # 上一帧没有图像（例如编码失败）
+                        self._resolve(stats, None)
+                    stats = json.loads(message)
+                    continue
+                if stats is None:
+                    continue
+                self._resolve(stats, message)
+                frame_id = stats.get("frame", {}).get("id")
+                stats = None
+                # 确认收到该帧，服务器据此测量传输延迟
+                if frame_id is not None:
+                    await websocket.send(json.dumps({"ack": frame_id}))
+        except websockets.exceptions.ConnectionClosed as e:
+            self._fail_pending(e)
+        except Exception as e:
+            self._fail_pending(e)
+        finally:
+            if self._websocket is websocket:
+                self._websocket = None
 
-    async def _async_render_impl(
+    def _resolve(self, stats, image_data):
+        request_id = stats.get("request_id")
+        for pending_id in sorted(self._pending):
+            if request_id is not None and pending_id > request_id:
+                break
+            waiter = self._pending.pop(pending_id)
+            if not waiter.done():
+                waiter.set_result((stats, image_data))
+
+    def _fail_pending(self, error):
+        for waiter in self._pending.values():
+            if not waiter.done():
+                waiter.set_exception(error)
+        self._pending.clear()
+
+    def _render_impl(
         self,
         res,
         fov,
@@ -66,18 +145,10 @@ class WebRenderer(Renderer):
         **other_args,
     ):
         """
-        The core asynchronous rendering logic using WebSockets.
-        支持不同质量级别的渲染和预测性渲染
+        The core rendering logic using WebSockets.
+        支持不同质量级别的渲染和预测性渲染。请求通过常驻事件循环发送；流水线模式下返回上一个请求的结果。
         """
-        websocket = await self._get_connection()
-        if not websocket:
-            res.message = f"Connecting to\n{self.uri}..."
-            # Return a blank image while trying to connect
-            blank_image = torch.zeros(3, resolution, resolution)
-            self._return_image(blank_image, res, normalize=False)
-            return
-
-        # 根据质量级别调整分辨率
+        # 根据质量级别调整分辨率；quality='auto' 时由服务器端的自适应控制器决定分辨率和压缩质量
         actual_resolution = resolution
         if quality == 'low':
             actual_resolution = min(resolution, 400)
@@ -115,24 +186,50 @@ class WebRenderer(Renderer):
             "rot_scale_python": False,
             "keep_alive": True,
             "scaling_modifier": 1,
-            "view_matrix": world_view_transform.cpu().numpy().flatten().tolist(),
-            "view_projection_matrix": full_proj_transform.cpu().numpy().flatten().tolist(),
+            "view_matrix": world_view_transform.cpu().numpy().flatten(),
+            "view_projection_matrix": full_proj_transform.cpu().numpy().flatten(),
             "edit_text": self.sanitize_command(edit_text),
             "slider": slider,
             "single_training_step": single_training_step,
             "stop_at_value": stop_at_value,
             "quality": quality,  # 添加质量参数
             "is_predictive": is_predictive,  # 添加预测性渲染标记
+            # 协商帧编码：服务器按顺序选择第一个支持的编码，旧服务器忽略该字段并发送原始 RGB
+            "encoding": ["jpeg", "raw"],
+            "encode_quality": compression_quality,
+            "adaptive": quality == 'auto',
         }
 
+        future = self.render_future(message)
+        previous, self._in_flight = self._in_flight, (future if self.pipelined else None)
+        # 流水线模式下等待上一个请求，本帧请求在此期间已在路上
+        waiting = previous if self.pipelined and previous is not None and not previous.cancelled() else future
         try:
-            # 1. Send the rendering request to the server
-            await websocket.send(json.dumps(message))
-
-            # 2. Receive the stats/metadata as a JSON message
-            stats_data = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-            stats = json.loads(stats_data)
+            stats, image_data = waiting.result(timeout=self.timeout + 1.0)
+        except ConnectionError as e:
+            self._in_flight = None
+            res.message = str(e)
+            # Return a blank image while trying to connect
+            self._return_image(torch.zeros(3, resolution, resolution), res, normalize=False)
+            return
+        except (websockets.exceptions.ConnectionClosed, ConnectionRefusedError) as e:
+            self._in_flight = None
+            res.error = f"Connection lost. Reconnecting... ({type(e).__name__})"
+            self._return_image(torch.zeros(3, resolution, resolution), res, normalize=False)
+            return
+        except (asyncio.TimeoutError, FutureTimeoutError):
+            self._in_flight = None
+            res.error = "Connection timed out. Server may be busy or down."
+            self._close_connection_threadsafe()
+            self._return_image(torch.zeros(3, resolution, resolution), res, normalize=False)
+            return
+        except Exception as e:
+            self._in_flight = None
+            res.error = f"An unexpected error occurred: {e}"
+            self._close_connection_threadsafe()
+            return
 
+        try:
             # 添加视角参数到统计数据，用于前端缓存
             if is_predictive:
                 stats["view_params"] = {
@@ -142,20 +239,29 @@ class WebRenderer(Renderer):
                 }
                 stats["is_predictive"] = True
 
-            # 3. Receive the image as a binary message
-            image_data = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-            
-            image_np = np.frombuffer(image_data, dtype=np.uint8).reshape(actual_resolution, actual_resolution, 3)
-            
-            # 如果实际分辨率与请求分辨率不同，调整图像大小
-            if actual_resolution != resolution:
+            frame_info = stats.get("frame", {})
+            frame_encoding = frame_info.get("encoding", "raw")
+            if image_data is None:
+                image_np = np.zeros((resolution, resolution, 3), dtype=np.uint8)
+            elif frame_encoding == "raw":
+                image_np = np.frombuffer(image_data, dtype=np.uint8).reshape(
+                    frame_info.get("height", actual_resolution), frame_info.get("width", actual_resolution), 3)
+            else:
+                image_np = cv2.cvtColor(cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+            # 如果实际分辨率与请求分辨率不同（包括自适应降分辨率），调整图像大小
+            resized = image_np.shape[0] != resolution or image_np.shape[1] != resolution
+            if resized:
                 image_np = cv2.resize(image_np, (resolution, resolution), interpolation=cv2.INTER_LINEAR)
-            
+
             # 如果需要压缩图像（用于发送到前端）
             if hasattr(res, 'need_compressed_image') and res.need_compressed_image:
-                compressed_image = self.compress_image(image_np, compression_quality)
-                res.compressed_image = compressed_image
-            
+                if frame_encoding == "jpeg" and not resized:
+                    # 服务器已发送 JPEG，直接复用，无需重新编码
+                    res.compressed_image = image_data
+                else:
+                    res.compressed_image = self.compress_image(image_np, compression_quality)
+
             # 转换为PyTorch张量
             image = torch.from_numpy(image_np) / 255.0
             image = image.permute(2, 0, 1)
@@ -164,32 +270,22 @@ class WebRenderer(Renderer):
                 res.training_stats = stats
                 if "error" in stats and stats["error"]:
                     res.error = res.training_stats["error"]
-            
+
             self._return_image(
                 image,
                 res,
                 normalize=img_normalize,
             )
-
-        except (websockets.exceptions.ConnectionClosed, ConnectionRefusedError) as e:
-            res.error = f"Connection lost. Reconnecting... ({type(e).__name__})"
-            await self._close_connection()
-            blank_image = torch.zeros(3, resolution, resolution)
-            self._return_image(blank_image, res, normalize=False)
-        except asyncio.TimeoutError:
-            res.error = "Connection timed out. Server may be busy or down."
-            await self._close_connection()
-            blank_image = torch.zeros(3, resolution, resolution)
-            self._return_image(blank_image, res, normalize=False)
         except Exception as e:
             res.error = f"An unexpected error occurred: {e}"
-            await self._close_connection()
 
     # 添加图像压缩方法
     def compress_image(self, image_np, quality=80):
-        """压缩图像为JPEG格式"""
+        """压缩 RGB 图像为JPEG格式"""
         try:
-            success, encoded_image = cv2.imencode('.jpg', image_np, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            # cv2 按 BGR 顺序编码，先转换通道顺序，否则前端看到的红蓝通道互换
+            image_bgr = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+            success, encoded_image = cv2.imencode('.jpg', image_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
             if success:
                 return encoded_image.tobytes()
         except Exception as e:
@@ -198,18 +294,26 @@ class WebRenderer(Renderer):
 
     async def _close_connection(self):
         if self._websocket:
-            await self._websocket.close()
-            self._websocket = None
+            websocket, self._websocket = self._websocket, None
+            await websocket.close()
 
-    def __del__(self):
-        # Ensure the connection is closed when the object is destroyed
-        if self._websocket:
+    def _close_connection_threadsafe(self):
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._close_connection(), self._loop)
+
+    def close(self):
+        """关闭连接并停止后台事件循环"""
+        if self._loop.is_running():
             try:
-                loop = asyncio.get_running_loop()
-                if loop.is_running():
-                    loop.create_task(self._close_connection())
-                else:
-                    loop.run_until_complete(self._close_connection())
+                asyncio.run_coroutine_threadsafe(self._close_connection(), self._loop).result(timeout=2.0)
             except Exception:
-                # Ignore errors on cleanup
-                pass 
\ No newline at end of file
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def __del__(self):
+        # Ensure the connection is closed when the object is destroyed
+        try:
+            self.close()
+        except Exception:
+            # Ignore errors on cleanup
+            pass
@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from argparse import ArgumentParser
+from arguments import ModelParams
+from scene import load_scene_info
+from utils.camera_utils import image_resolution, load_resized_image
+
+if __name__ == "__main__":
+    # Decode the dataset once so that several training runs (e.g. a sweep) can share it:
+    # the initial point cloud is materialized next to the source, and resized images are
+    # written to the --dataset_cache directory that the runs are then started with.
+    parser = ArgumentParser(description="Dataset preparation script parameters")
+    lp = ModelParams(parser)
+    parser.add_argument("--num_workers", default=8, type=int)
+    args = parser.parse_args(sys.argv[1:])
+    dataset = lp.extract(args)
+    if not dataset.dataset_cache:
+        dataset.dataset_cache = os.path.join(dataset.source_path, "dataset_cache")
+    print("Preparing " + dataset.source_path)
+
+    start = time.perf_counter()
+    scene_info = load_scene_info(dataset)
+    cam_infos = scene_info.train_cameras + scene_info.test_cameras
+    with ThreadPoolExecutor(max_workers=args.num_workers) as pool:
+        list(pool.map(lambda cam_info: load_resized_image(cam_info, image_resolution(dataset, cam_info, 1.0), dataset.dataset_cache), cam_infos))
+
+    print("[Dataset cache] {} images in {:.2f} s, point cloud {}, cache {}".format(
+        len(cam_infos), time.perf_counter() - start, scene_info.ply_path, dataset.dataset_cache))
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import math
+import queue
+import shutil
+import threading
+import subprocess
+import time
+from argparse import ArgumentParser
+import numpy as np
+import torch
+from arguments import ModelParams, PipelineParams, get_combined_args
+from scene import GaussianModel, load_scene_info
+from scene.cameras import CameraSet
+from gaussian_renderer import render
+from utils.cam_util import LookAtPoseSampler, create_cam2world_matrix
+from utils.system_utils import searchForMaxIteration
+
+CAMERA_PATHS = ("train", "orbit", "keyframes")
+
+
+class PathView:
+    ''' One frame of a camera path; CameraSet fills in its transforms '''
+
+    def __init__(self, R, T, FoVx, FoVy, width, height, image_name="", znear=0.01, zfar=100.0):
+        self.R = R
+        self.T = T
+        self.FoVx = FoVx
+        self.FoVy = FoVy
+        self.image_width = width
+        self.image_height = height
+        self.image_name = image_name
+        self.znear = znear
+        self.zfar = zfar
+
+
+def _view_from_cam2world(cam2world, fovy, width, height):
+    # The renderer's world-to-view matrix is the inverse of cam2world, the same as CustomCam
+    rotation = cam2world[:3, :3].T
+    return PathView(rotation, -rotation @ cam2world[:3, 3], _fovx(fovy, width, height), fovy, width, height)
+
+
+def _fovx(fovy, width, height):
+    return 2 * math.atan(math.tan(fovy * 0.5) * width / height)
+
+
+def _even(value):
+    # yuv420p video needs even frame sizes
+    return max(2, int(value) // 2 * 2)
+
+
+def _catmull_rom(points, t):
+    ''' Uniform Catmull-Rom spline through `points` (K, D) at parameter t in [0, K - 1] '''
+    if len(points) == 1:
+        return points[0]
+    i = min(int(t), len(points) - 2)
+    u = t - i
+    p0, p1, p2, p3 = points[max(i - 1, 0)], points[i], points[i + 1], points[min(i + 2, len(points) - 1)]
+    return 0.5 * (2 * p1 + (p2 - p0) * u + (2 * p0 - 5 * p1 + 4 * p2 - p3) * u ** 2 + (3 * p1 - p0 - 3 * p2 + p3) * u ** 3)
+
+
+def _training_views(scene_info, width=None, height=None):
+    '''
+    Training cameras ordered by image name, all rendered at the size of the first one unless given.
+    A missing width or height follows the first camera's aspect ratio, and each view keeps its
+    vertical field of view with FovX recomputed for the output size, so frames are never stretched
+    '''
+    cam_infos = sorted(scene_info.train_cameras, key=lambda cam: cam.image_name)
+    first = cam_infos[0]
+    if width and not height:
+        height = width * first.height / first.width
+    elif height and not width:
+        width = height * first.width / first.height
+    width = _even(width or first.width)
+    height = _even(height or first.height)
+    return [PathView(cam.R, cam.T, _fovx(cam.FovY, width, height), cam.FovY, width, height, cam.image_name) for cam in cam_infos]
+
+
+def _scene_frame(scene_info, gaussians):
+    '''
+    Default look-at point, camera distance and up vector of a scene: the median Gaussian
+    position, the median distance of the training cameras to it and their mean up axis,
+    or a distance derived from the Gaussians and the viewer's default up without cameras
+    '''
+    xyz = gaussians.get_xyz.detach()
+    look_at = xyz.median(dim=0).values.cpu()
+    if scene_info is None or not scene_info.train_cameras:
+        radius = 2.0 * (xyz - look_at.to(xyz.device)).norm(dim=-1).median().item()
+        return look_at, radius, torch.tensor([0.0, -1.0, 0.0])
+    cameras = CameraSet(_training_views(scene_info), device="cpu")
+    radius = (cameras.camera_centers - look_at).norm(dim=-1).median().item()
+    # Row 1 of the world-to-view rotation is the camera's y axis, which points down in the image
+    up = -cameras.world_view_transforms[:, :3, 1].mean(dim=0)
+    return look_at, radius, up / up.norm()
+
+
+def orbit_views(look_at, radius, up, num_frames, fovy, width, height, elevation=20.0):
+    ''' Turntable around `look_at` with LookAtPoseSampler, one full turn over `num_frames` '''
+    views = []
+    for i in range(num_frames):
+        # vertical_mean is measured from the viewer's up axis, so pi / 2 circles at the height of look_at
+        cam2world = LookAtPoseSampler.sample(2 * math.pi * i / num_frames, math.pi / 2 + math.radians(elevation), look_at, radius, up)[0]
+        views.append(_view_from_cam2world(cam2world.numpy(), fovy, width, height))
+    return views
+
+
+def keyframe_views(keyframes, num_frames, fovy, width, height, up):
+    '''
+    Frames interpolated through keyframes. Each keyframe has "position" and "look_at", or a
+    4x4 "cam2world" matrix, and optionally "up" and "fov" (vertical, in degrees). Positions
+    and look-at points follow a Catmull-Rom spline, the field of view is interpolated linearly.
+    '''
+    positions, targets, ups, fovs = [], [], [], []
+    for keyframe in keyframes:
+        if "cam2world" in keyframe:
+            cam2world = np.asarray(keyframe["cam2world"], dtype=np.float32).reshape(4, 4)
+            positions.append(cam2world[:3, 3])
+            targets.append(cam2world[:3, 3] + cam2world[:3, 2])
+            ups.append(keyframe.get("up", -cam2world[:3, 1]))
+        else:
+            positions.append(keyframe["position"])
+            targets.append(keyframe["look_at"])
+            ups.append(keyframe.get("up", up))
+        fovs.append(math.radians(keyframe["fov"]) if "fov" in keyframe else fovy)
+    positions, targets, ups = (np.asarray(values, dtype=np.float32).reshape(-1, 3) for values in (positions, targets, ups))
+
+    steps = np.linspace(0.0, len(keyframes) - 1, num_frames) if num_frames > 1 else np.zeros(1)
+    origins, targets, up_vectors = (torch.from_numpy(np.stack([_catmull_rom(points, t) for t in steps]).astype(np.float32))
+                                    for points in (positions, targets, ups))
+    forwards = targets - origins
+    # create_cam2world_matrix builds every frame in one batched call
+    cam2worlds = create_cam2world_matrix(forwards, origins, up_vectors).numpy()
+    return [_view_from_cam2world(cam2world, float(np.interp(t, np.arange(len(fovs)), fovs)), width, height)
+            for cam2world, t in zip(cam2worlds, steps)]
+
+
+class VideoWriter:
+    '''
+    Streams raw RGB frames into an ffmpeg process through its stdin, so no frame is written
+    to disk. Batches are written on a thread while the next batch renders; the queue holds at
+    most `max_pending` batches, which bounds the host memory held by frames in flight.
+    '''
+
+    def __init__(self, output_path, width, height, fps, codec="libx264", crf=18, max_pending=2):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg was not found on PATH; it is required to encode the video")
+        command = [ffmpeg, "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                   "-an", "-c:v", codec, "-pix_fmt", "yuv420p", "-crf", str(crf), output_path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.frames_written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frames = self._queue.get()
+            if frames is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                for frame in frames:
+                    self.process.stdin.write(memoryview(frame))
+                    self.frames_written += 1
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+
+    def write(self, frames):
+        ''' Queue a (B, H, W, 3) uint8 array of frames; blocks while `max_pending` batches wait '''
+        if self._error is not None:
+            raise RuntimeError(f"ffmpeg stopped accepting frames: {self._read_stderr()}")
+        self._queue.put(frames)
+
+    def _read_stderr(self):
+        return self.process.stderr.read().decode("utf-8", errors="replace").strip()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        stderr = self._read_stderr()
+        if self.process.wait() != 0 or self._error is not None:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}: {stderr}")
+
+
+@torch.no_grad()
+def render_camera_path(dataset, pipe, camera_path="orbit", output_path=None, iteration=-1, keyframes=None,
+                       num_frames=120, fps=30, width=None, height=None, fov=None, radius=None, elevation=20.0,
+                       look_at=None, up=None, batch_size=8, codec="libx264", crf=18, progress=None):
+    """
+    Render a camera path of the saved model into a video.
+
+    The model is loaded from point_cloud.ply with GaussianModel.load_ply. `camera_path` is
+    "train" (the training cameras ordered by name), "orbit" (a LookAtPoseSampler turntable)
+    or "keyframes" (a list of keyframe dicts, see keyframe_views). Frames are rendered in
+    batches of `batch_size`, converted to uint8 on the GPU and copied to the host with one
+    transfer per batch, then piped into ffmpeg. progress(done, total) is called after every
+    batch. Returns a summary dict.
+    """
+    if camera_path not in CAMERA_PATHS:
+        raise ValueError(f"Unknown camera path '{camera_path}'; expected one of {', '.join(CAMERA_PATHS)}")
+    if iteration == -1:
+        iteration = searchForMaxIteration(os.path.join(dataset.model_path, "point_cloud"))
+    gaussians = GaussianModel(dataset.sh_degree)
+    gaussians.load_ply(os.path.join(dataset.model_path, "point_cloud", "iteration_" + str(iteration), "point_cloud.ply"))
+
+    try:
+        scene_info = load_scene_info(dataset)
+    except Exception as e:
+        # Orbits and keyframes do not need the dataset, only their defaults come from it
+        if camera_path == "train":
+            raise
+        print(f"[Warning] Could not load the training cameras ({e}), using defaults from the Gaussians")
+        scene_info = None
+
+    if camera_path == "train":
+        views = _training_views(scene_info, width, height)
+    else:
+        first = scene_info.train_cameras[0] if scene_info is not None and scene_info.train_cameras else None
+        width = _even(width or (first.width if first else 1280))
+        height = _even(height or (first.height if first else 720))
+        fovy = math.radians(fov) if fov else (first.FovY if first else math.radians(50.0))
+        default_look_at, default_radius, default_up = _scene_frame(scene_info, gaussians)
+        look_at = torch.tensor(look_at, dtype=torch.float32) if look_at is not None else default_look_at
+        up = torch.tensor(up, dtype=torch.float32) if up is not None else default_up
+        if camera_path == "orbit":
+            views = orbit_views(look_at, radius or default_radius, up, num_frames, fovy, width, height, elevation)
+        else:
+            if not keyframes:
+                raise ValueError("The keyframes camera path needs at least one keyframe")
+            views = keyframe_views(keyframes, num_frames, fovy, width, height, up.numpy())
+    width, height = views[0].image_width, views[0].image_height
+
+    if output_path is None:
+        output_path = os.path.join(dataset.model_path, "renders", f"{camera_path}_{iteration}.mp4")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    # Builds every view's transforms in one batched computation; PathView does not build its own
+    views = CameraSet(views)
+    background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0], dtype=torch.float32, device="cuda")
+    frames = torch.empty((batch_size, height, width, 3), dtype=torch.uint8, device="cuda")
+    writer = VideoWriter(output_path, width, height, fps, codec, crf)
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(views), batch_size):
+            batch = views[offset:offset + batch_size]
+            for i, view in enumerate(batch):
+                image = render(view, gaussians, pipe, background)["render"]
+                frames[i].copy_(image.mul(255.0).clamp_(0.0, 255.0).permute(1, 2, 0))
+            # One device-to-host copy per batch; the writer thread may still hold the previous batch, so each gets its own array
+            writer.write(frames[:len(batch)].cpu().numpy())
+            if progress is not None:
+                progress(offset + len(batch), len(views))
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "camera_path": camera_path,
+        "iteration": iteration,
+        "output_path": output_path,
+        "num_frames": len(views),
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "elapsed_s": elapsed,
+        "frames_per_second": len(views) / elapsed if elapsed > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Render a camera path of a trained model into a video")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--camera_path", default="orbit", choices=CAMERA_PATHS)
+    parser.add_argument("--keyframes", type=str, default=None, help="JSON file with a list of keyframes, or an object with 'keyframes'")
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--frames", default=120, type=int, help="Number of frames of an orbit or keyframe path")
+    parser.add_argument("--fps", default=30, type=int)
+    parser.add_argument("--width", default=None, type=int)
+    parser.add_argument("--height", default=None, type=int)
+    parser.add_argument("--fov", default=None, type=float, help="Vertical field of view in degrees")
+    parser.add_argument("--radius", default=None, type=float)
+    parser.add_argument("--elevation", default=20.0, type=float, help="Orbit elevation in degrees")
+    parser.add_argument("--look_at", nargs=3, type=float, default=None)
+    parser.add_argument("--up", nargs=3, type=float, default=None)
+    parser.add_argument("--batch_size", default=8, type=int)
+    parser.add_argument("--codec", default="libx264", type=str)
+    parser.add_argument("--crf", default=18, type=int)
+    args = get_combined_args(parser)
+    print("Rendering " + args.model_path)
+
+    keyframes = None
+    if args.keyframes:
+        with open(args.keyframes, "r") as f:
+            keyframes = json.load(f)
+        if isinstance(keyframes, dict):
+            args.frames = keyframes.get("frames", args.frames)
+            args.fps = keyframes.get("fps", args.fps)
+            keyframes = keyframes["keyframes"]
+
+    def report(done, total):
+        print(f"[Render] frame {done}/{total}", flush=True)
+
+    summary = render_camera_path(
+        model.extract(args), pipeline.extract(args), args.camera_path, args.output, args.iteration, keyframes,
+        args.frames, args.fps, args.width, args.height, args.fov, args.radius, args.elevation, args.look_at, args.up,
+        args.batch_size, args.codec, args.crf, progress=report)
+    print("[Render] {} frames ({}x{}) in {:.1f} s ({:.2f} frames/s) -> {}".format(
+        summary["num_frames"], summary["width"], summary["height"], summary["elapsed_s"], summary["frames_per_second"],
+        summary["output_path"]), flush=True)
+    sys.exit(0)
@@ -7,6 +7,17 @@ from scene.gaussian_model import GaussianModel
 from arguments import ModelParams
 from utils.camera_utils import cameraList_from_camInfos, camera_to_JSON
 
+def load_scene_info(args):
+    if os.path.exists(os.path.join(args.source_path, "sparse")):
+        return sceneLoadTypeCallbacks["Colmap"](args.source_path, args.images, args.eval)
+    elif os.path.exists(os.path.join(args.source_path, "transforms_train.json")):
+        print("Found transforms_train.json file, assuming Blender data set!")
+        # With a dataset cache, images are only decoded when they are not cached yet
+        return sceneLoadTypeCallbacks["Blender"](args.source_path, args.white_background, args.eval,
+                                                 lazy=bool(getattr(args, "dataset_cache", "")))
+    else:
+        assert False, "Could not recognize scene type!"
+
 class Scene:
 
     gaussians : GaussianModel
@@ -29,13 +40,7 @@ class Scene:
         self.train_cameras = {}
         self.test_cameras = {}
 
-        if os.path.exists(os.path.join(args.source_path, "sparse")):
-            scene_info = sceneLoadTypeCallbacks["Colmap"](args.source_path, args.images, args.eval)
-        elif os.path.exists(os.path.join(args.source_path, "transforms_train.json")):
-            print("Found transforms_train.json file, assuming Blender data set!")
-            scene_info = sceneLoadTypeCallbacks["Blender"](args.source_path, args.white_background, args.eval)
-        else:
-            assert False, "Could not recognize scene type!"
+        scene_info = load_scene_info(args)
 
         if not self.loaded_iter:
             with open(scene_info.ply_path, 'rb') as src_file, open(os.path.join(self.model_path, "input.ply") , 'wb') as dest_file:
@@ -71,9 +76,12 @@ class Scene:
         else:
             self.gaussians.create_from_pcd(scene_info.point_cloud, scene_info.train_cameras, self.cameras_extent)
 
-    def save(self, iteration):
+    def save(self, iteration, checkpoint_manager=None):
         point_cloud_path = os.path.join(self.model_path, "point_cloud/iteration_{}".format(iteration))
-        self.gaussians.save_ply(os.path.join(point_cloud_path, "point_cloud.ply"))
+        if checkpoint_manager is not None:
+            checkpoint_manager.save_ply(self.gaussians, os.path.join(point_cloud_path, "point_cloud.ply"))
+        else:
+            self.gaussians.save_ply(os.path.join(point_cloud_path, "point_cloud.ply"))
 
     def getTrainCameras(self, scale=1.0):
         return self.train_cameras[scale]
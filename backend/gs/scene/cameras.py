@@ -1,3 +1,4 @@
+from functools import lru_cache
 import torch
 from torch import nn
 import numpy as np
@@ -19,6 +20,7 @@ class Camera(nn.Module):
         trans=np.array([0.0, 0.0, 0.0]),
         scale=1.0,
         data_device="cuda",
+        build_transforms=True,
     ):
         super(Camera, self).__init__()
 
@@ -52,6 +54,10 @@ class Camera(nn.Module):
         self.trans = trans
         self.scale = scale
 
+        # A CameraSet fills in the transforms for many cameras at once
+        if not build_transforms:
+            return
+
         self.world_view_transform = torch.tensor(getWorld2View2(R, T, trans, scale)).transpose(0, 1).cuda()
         self.projection_matrix = (
             getProjectionMatrix(znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy).transpose(0, 1).cuda()
@@ -72,8 +78,7 @@ class MiniCam:
         self.zfar = zfar
         self.world_view_transform = world_view_transform
         self.full_proj_transform = full_proj_transform
-        view_inv = torch.inverse(self.world_view_transform)
-        self.camera_center = view_inv[3][:3]
+        self.camera_center = rigid_camera_center(self.world_view_transform)
 
 
 class CustomCam:
@@ -86,10 +91,67 @@ class CustomCam:
         self.zfar = zfar
 
         self.world_view_transform = extr.T.inverse()
-        self.projection_matrix = (
-            getProjectionMatrix(znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy).transpose(0, 1).cuda()
-        )
-        self.full_proj_transform = (
-            self.world_view_transform.unsqueeze(0).bmm(self.projection_matrix.unsqueeze(0))
-        ).squeeze(0)
-        self.camera_center = self.world_view_transform.inverse()[3, :3]
+        # Only the pose changes between viewer frames, so the projection comes from a cache
+        self.projection_matrix = cached_projection_matrix(self.znear, self.zfar, self.FoVx, self.FoVy, str(extr.device))
+        self.full_proj_transform = self.world_view_transform @ self.projection_matrix
+        # extr is camera-to-world, so its translation is the camera center
+        self.camera_center = extr[:3, 3]
+
+
+def rigid_camera_center(world_view_transform):
+    ''' Camera center of a transposed rigid world-to-view matrix, without a 4x4 inverse '''
+    return -world_view_transform[:3, :3] @ world_view_transform[3, :3]
+
+
+@lru_cache(maxsize=32)
+def cached_projection_matrix(znear, zfar, fovX, fovY, device="cuda"):
+    ''' Transposed projection matrix on `device`, shared by all cameras with the same intrinsics; do not modify in place '''
+    return getProjectionMatrix(znear=znear, zfar=zfar, fovX=fovX, fovY=fovY).transpose(0, 1).to(device)
+
+
+class CameraSet(list):
+    '''
+    List of training cameras whose transforms live in stacked (N, 4, 4) tensors.
+
+    All matrices are built in one batched computation and moved to the device once; each
+    camera's world_view_transform, projection_matrix, full_proj_transform and camera_center
+    are views into the stacked tensors, so rendering code can keep using single cameras.
+    '''
+
+    def __init__(self, cameras, device="cuda"):
+        super().__init__(cameras)
+        n = len(cameras)
+        R = torch.from_numpy(np.stack([np.asarray(cam.R, dtype=np.float32) for cam in cameras])) if n else torch.zeros((0, 3, 3))
+        T = torch.from_numpy(np.stack([np.asarray(cam.T, dtype=np.float32) for cam in cameras])) if n else torch.zeros((0, 3))
+        fov = torch.tensor([[cam.FoVx, cam.FoVy] for cam in cameras], dtype=torch.float32).view(n, 2)
+        clip = torch.tensor([[cam.znear, cam.zfar] for cam in cameras], dtype=torch.float32).view(n, 2)
+
+        # getWorld2View2: Rt = [[R, T], [0, 1]], stored transposed
+        Rt = torch.zeros((n, 4, 4))
+        Rt[:, :3, :3] = R
+        Rt[:, :3, 3] = T
+        Rt[:, 3, 3] = 1.0
+        world_view = Rt.transpose(1, 2)
+
+        # getProjectionMatrix, for all cameras at once, stored transposed
+        tan_half = torch.tan(fov * 0.5)
+        znear, zfar = clip[:, 0], clip[:, 1]
+        P = torch.zeros((n, 4, 4))
+        P[:, 0, 0] = 1.0 / tan_half[:, 0]
+        P[:, 1, 1] = 1.0 / tan_half[:, 1]
+        P[:, 3, 2] = 1.0
+        P[:, 2, 2] = (zfar + znear) / (zfar - znear)
+        P[:, 2, 3] = -(zfar * znear) / (zfar - znear)
+        projection = P.transpose(1, 2)
+
+        self.world_view_transforms = world_view.contiguous().to(device)
+        self.projection_matrices = projection.contiguous().to(device)
+        self.full_proj_transforms = torch.bmm(self.world_view_transforms, self.projection_matrices)
+        # Inverse of [[R, T], [0, 1]] has translation -R^T T
+        self.camera_centers = -torch.einsum("nji,nj->ni", R, T).to(device)
+
+        for idx, cam in enumerate(cameras):
+            cam.world_view_transform = self.world_view_transforms[idx]
+            cam.projection_matrix = self.projection_matrices[idx]
+            cam.full_proj_transform = self.full_proj_transforms[idx]
+            cam.camera_center = self.camera_centers[idx]
@@ -9,6 +9,7 @@
 # For inquiries contact  george.drettakis@inria.fr
 #
 
+import math
 import torch
 import numpy as np
 from utils.general_utils import inverse_sigmoid, get_expon_lr_func, build_rotation
@@ -18,9 +19,10 @@ import json
 from utils.system_utils import mkdir_p
 from plyfile import PlyData, PlyElement
 from utils.sh_utils import RGB2SH
-from simple_knn._C import distCUDA2
 from utils.graphics_utils import BasicPointCloud
 from utils.general_utils import strip_symmetric, build_scaling_rotation
+from utils.optim_utils import MixedPrecisionAdam, RowSparseAdam, STORAGE_DTYPES
+from utils.fused_utils import ActivationBuffers, fused_activations, fused_covariance, join_features
 
 
 class GaussianModel:
@@ -58,21 +60,43 @@ class GaussianModel:
         self.optimizer = None
         self.percent_dense = 0
         self.spatial_lr_scale = 0
+        # Capacity mode: parameters, Adam moments and densification stats are views into
+        # preallocated buffers; pruned rows stay in place as dead slots until compaction
+        self._storage = None
+        self._stats_storage = None
+        self._live = None
+        self._num_slots = 0
+        self._num_live = 0
+        self.compaction_threshold = 0.0
+        self.capacity_growth = 1.5
+        # Densification budget: 0 means unlimited
+        self.gaussian_budget = 0
+        self.budget_prune_ratio = 1.0
+        self.budget_min_opacity = 0.0
+        # Fused features: f_dc and f_rest are views of one contiguous tensor, so get_features needs no cat
+        self.fused_features = False
+        self._features = None
+        self._activation_buffers = ActivationBuffers()
         self.setup_functions()
 
     def capture(self):
+        live = self._live_rows
+        opt_dict = self.optimizer.state_dict()
+        if self._has_dead_slots():
+            opt_dict["state"] = {idx: {key: live(value) if key != "step" else value for key, value in state.items()}
+                                 for idx, state in opt_dict["state"].items()}
         return (
             self.active_sh_degree,
-            self._xyz,
-            self._features_dc,
-            self._features_rest,
-            self._scaling,
-            self._rotation,
-            self._opacity,
-            self.max_radii2D,
-            self.xyz_gradient_accum,
-            self.denom,
-            self.optimizer.state_dict(),
+            live(self._xyz),
+            live(self._features_dc),
+            live(self._features_rest),
+            live(self._scaling),
+            live(self._rotation),
+            live(self._opacity),
+            live(self.max_radii2D),
+            live(self.xyz_gradient_accum),
+            live(self.denom),
+            opt_dict,
             self.spatial_lr_scale,
         )
     
@@ -90,9 +114,14 @@ class GaussianModel:
         opt_dict, 
         self.spatial_lr_scale) = model_args
         self.training_setup(training_args)
-        self.xyz_gradient_accum = xyz_gradient_accum
-        self.denom = denom
         self.optimizer.load_state_dict(opt_dict)
+        if self._storage is not None:
+            self.xyz_gradient_accum.copy_(xyz_gradient_accum)
+            self.denom.copy_(denom)
+            self._adopt_optimizer_state()
+        else:
+            self.xyz_gradient_accum = xyz_gradient_accum
+            self.denom = denom
 
     @property
     def get_scaling(self):
@@ -105,11 +134,20 @@ class GaussianModel:
     @property
     def get_xyz(self):
         return self._xyz
+
+    @property
+    def num_gaussians(self):
+        ''' Number of live Gaussians (dead capacity slots excluded) '''
+        if self._storage is not None:
+            return self._num_live
+        return self._xyz.shape[0]
     
     @property
     def get_features(self):
+        if self._features_are_fused():
+            return join_features(self._features_dc, self._features_rest, self._features)
         features_dc = self._features_dc
-        features_rest = self._features_rest
+        features_rest = self._features_rest.to(features_dc.dtype)
         return torch.cat((features_dc, features_rest), dim=1)
     
     @property
@@ -137,11 +175,48 @@ class GaussianModel:
     def get_covariance(self, scaling_modifier = 1):
         return self.covariance_activation(self.get_scaling, scaling_modifier, self._rotation)
 
+    def get_fused_activations(self):
+        ''' (get_scaling, get_rotation, get_opacity) in one pass, written into buffers reused across renders '''
+        return fused_activations(self._scaling, self._rotation, self._opacity, self._activation_buffers)
+
+    def get_fused_covariance(self, scaling, rotation, scaling_modifier = 1):
+        ''' get_covariance() from already activated scaling and rotation '''
+        return fused_covariance(scaling, rotation, scaling_modifier)
+
+    def _features_are_fused(self):
+        features = self._features
+        return (features is not None and features.shape[0] == self._features_dc.shape[0]
+                and self._features_dc.data_ptr() == features.data_ptr()
+                and self._features_rest.data_ptr() == features[:, self._features_dc.shape[1]:].data_ptr())
+
+    def _fuse_features(self):
+        ''' Re-allocate f_dc and f_rest as views of one contiguous (N, K, 3) tensor, keeping their optimizer state '''
+        if not self.fused_features or self._features_dc.dtype != self._features_rest.dtype:
+            self._features = None
+            return
+        if self._features_are_fused():
+            return
+        num_dc = self._features_dc.shape[1]
+        features = torch.cat((self._features_dc.detach(), self._features_rest.detach()), dim=1)
+        fused = {"f_dc": nn.Parameter(features[:, :num_dc]), "f_rest": nn.Parameter(features[:, num_dc:])}
+        if self.optimizer is not None:
+            for group in self.optimizer.param_groups:
+                if group["name"] in fused:
+                    stored_state = self.optimizer.state.pop(group["params"][0], None)
+                    group["params"][0] = fused[group["name"]]
+                    if stored_state is not None:
+                        self.optimizer.state[group["params"][0]] = stored_state
+        self._features_dc = fused["f_dc"]
+        self._features_rest = fused["f_rest"]
+        self._features = features
+
     def oneupSHdegree(self):
         if self.active_sh_degree < self.max_sh_degree:
             self.active_sh_degree += 1
 
     def create_from_pcd(self, pcd : BasicPointCloud, cam_infos : int, spatial_lr_scale : float):
+        # CUDA extension, only needed to initialise from a point cloud
+        from simple_knn._C import distCUDA2
         self.spatial_lr_scale = spatial_lr_scale
         fused_point_cloud = torch.tensor(np.asarray(pcd.points)).float().cuda()
         fused_color = RGB2SH(torch.tensor(np.asarray(pcd.colors)).float().cuda())
@@ -172,25 +247,266 @@ class GaussianModel:
 
     def training_setup(self, training_args):
         self.percent_dense = training_args.percent_dense
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self.get_xyz.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self.get_xyz.device)
+
+        # Mixed precision only changes the storage of the SH rest coefficients; positions and the other attributes stay float32
+        feature_dtype = STORAGE_DTYPES[training_args.feature_dtype] if training_args.mixed_precision else torch.float32
+        if self._features_rest.dtype != feature_dtype:
+            self._features_rest = nn.Parameter(self._features_rest.detach().to(feature_dtype).requires_grad_(True))
+        self.fused_features = training_args.fused_features and not training_args.capacity_mode
+        self._fuse_features()
+
+        # One optimizer step averages batch_size views: scale learning rates by sqrt(batch_size) and
+        # raise the Adam betas to the batch size so the moments decay at the same rate per view
+        lr_scale = math.sqrt(training_args.batch_size)
+        betas = (0.9 ** training_args.batch_size, 0.999 ** training_args.batch_size)
 
         l = [
-            {'params': [self._xyz], 'lr': training_args.position_lr_init * self.spatial_lr_scale, "name": "xyz"},
-            {'params': [self._features_dc], 'lr': training_args.feature_lr, "name": "f_dc"},
-            {'params': [self._features_rest], 'lr': training_args.feature_lr / 20.0, "name": "f_rest"},
-            {'params': [self._opacity], 'lr': training_args.opacity_lr, "name": "opacity"},
-            {'params': [self._scaling], 'lr': training_args.scaling_lr, "name": "scaling"},
-            {'params': [self._rotation], 'lr': training_args.rotation_lr, "name": "rotation"}
+            {'params': [self._xyz], 'lr': training_args.position_lr_init * self.spatial_lr_scale * lr_scale, "name": "xyz"},
+            {'params': [self._features_dc], 'lr': training_args.feature_lr * lr_scale, "name": "f_dc"},
+            {'params': [self._features_rest], 'lr': training_args.feature_lr / 20.0 * lr_scale, "name": "f_rest"},
+            {'params': [self._opacity], 'lr': training_args.opacity_lr * lr_scale, "name": "opacity"},
+            {'params': [self._scaling], 'lr': training_args.scaling_lr * lr_scale, "name": "scaling"},
+            {'params': [self._rotation], 'lr': training_args.rotation_lr * lr_scale, "name": "rotation"}
         ]
 
 
-        self.optimizer = torch.optim.Adam(l, lr=0.0, eps=1e-15)
-        self.xyz_scheduler_args = get_expon_lr_func(lr_init=training_args.position_lr_init*self.spatial_lr_scale,
-                                                    lr_final=training_args.position_lr_final*self.spatial_lr_scale,
+        if training_args.sparse_adam:
+            self.optimizer = RowSparseAdam(l, lr=0.0, betas=betas, eps=1e-15)
+        elif training_args.mixed_precision:
+            self.optimizer = MixedPrecisionAdam(l, lr=0.0, betas=betas, eps=1e-15)
+        else:
+            self.optimizer = torch.optim.Adam(l, lr=0.0, betas=betas, eps=1e-15)
+        self.xyz_scheduler_args = get_expon_lr_func(lr_init=training_args.position_lr_init*self.spatial_lr_scale*lr_scale,
+                                                    lr_final=training_args.position_lr_final*self.spatial_lr_scale*lr_scale,
                                                     lr_delay_mult=training_args.position_lr_delay_mult,
                                                     max_steps=training_args.position_lr_max_steps)
-        
+        self.gaussian_budget = self.compute_gaussian_budget(training_args.max_gaussians, training_args.max_memory_mb)
+        self.budget_prune_ratio = training_args.budget_prune_ratio
+        self.budget_min_opacity = training_args.budget_min_opacity
+        if training_args.capacity_mode:
+            self.compaction_threshold = training_args.compaction_threshold
+            self._init_capacity_storage(training_args.capacity_headroom)
+        else:
+            self._storage = None
+            self._stats_storage = None
+
+    def bytes_per_gaussian(self):
+        ''' Training memory per Gaussian: parameter, gradient and per-row optimizer state, plus densification stats '''
+        total = 0
+        for group in self.optimizer.param_groups:
+            param = group["params"][0]
+            total += 2 * math.prod(param.shape[1:]) * param.element_size()
+            for shape, dtype in self._row_state_spec(param).values():
+                total += math.prod(shape) * torch.empty((), dtype=dtype).element_size()
+        # xyz_gradient_accum, denom and max_radii2D
+        return total + 3 * 4
+
+    def _moment_dtype(self, param):
+        if isinstance(self.optimizer, MixedPrecisionAdam):
+            return self.optimizer.moment_dtype_for(param)
+        return param.dtype
+
+    def _row_state_keys(self):
+        return getattr(self.optimizer, "row_state_keys", ("exp_avg", "exp_avg_sq"))
+
+    def _row_state_spec(self, param):
+        ''' Trailing shape and dtype of each per-row optimizer state tensor of `param` '''
+        moment = (tuple(param.shape[1:]), self._moment_dtype(param))
+        spec = {"exp_avg": moment, "exp_avg_sq": moment}
+        if "row_step" in self._row_state_keys():
+            spec["row_step"] = ((), torch.int32)
+        return spec
+
+    def compute_gaussian_budget(self, max_gaussians, max_memory_mb):
+        budget = max_gaussians
+        if max_memory_mb > 0:
+            by_memory = int(max_memory_mb * 1024 * 1024 // self.bytes_per_gaussian())
+            budget = by_memory if budget <= 0 else min(budget, by_memory)
+        return budget
+
+    def _limit_densification(self, grads, grad_threshold):
+        ''' Keep only the top-k candidates by accumulated gradient so a densification round stays within the budget '''
+        candidates = grads.squeeze(-1) >= grad_threshold
+        # A clone adds one Gaussian and a split (N=2) adds two and removes its source
+        headroom = max(self.gaussian_budget - self.num_gaussians, 0)
+        num_candidates = int(candidates.sum())
+        if num_candidates <= headroom:
+            return grads
+        limited = torch.zeros_like(grads)
+        if headroom > 0:
+            top = torch.topk(torch.where(candidates, grads.squeeze(-1), torch.zeros_like(grads.squeeze(-1))), headroom).indices
+            limited[top] = grads[top]
+        return limited
+
+    def _enforce_budget(self):
+        ''' Prune the least opaque live Gaussians until the count is back under the budget '''
+        excess = self.num_gaussians - self.gaussian_budget
+        if excess <= 0:
+            return
+        opacity = self.get_opacity.squeeze(-1).clone()
+        if self._storage is not None:
+            opacity[~self._live[:self._num_slots]] = float("inf")
+        prune_mask = torch.zeros_like(opacity, dtype=torch.bool)
+        prune_mask[torch.topk(opacity, excess, largest=False).indices] = True
+        self.prune_points(prune_mask)
+
+    def _init_capacity_storage(self, headroom):
+        n = self._xyz.shape[0]
+        capacity = max(n, int(n * headroom))
+        device = self._xyz.device
+        self._storage = {}
+        for group in self.optimizer.param_groups:
+            param = group["params"][0]
+            shape = (capacity,) + tuple(param.shape[1:])
+            store = {"param": torch.zeros(shape, dtype=param.dtype, device=device)}
+            for key, (row_shape, dtype) in self._row_state_spec(param).items():
+                store[key] = torch.zeros((capacity,) + row_shape, dtype=dtype, device=device)
+            store["param"][:n] = param.detach()
+            self._storage[group["name"]] = store
+        self._stats_storage = {
+            "xyz_gradient_accum": torch.zeros((capacity, 1), device=device),
+            "denom": torch.zeros((capacity, 1), device=device),
+            "max_radii2D": torch.zeros((capacity), device=device),
+        }
+        self._stats_storage["max_radii2D"][:n] = self.max_radii2D
+        self._live = torch.zeros((capacity), dtype=torch.bool, device=device)
+        self._live[:n] = True
+        self._num_slots = n
+        self._num_live = n
+        self._bind_capacity_views()
+
+    def _bind_capacity_views(self):
+        ''' Re-point parameters, Adam moments and stats at the first _num_slots rows of the buffers '''
+        n = self._num_slots
+        for group in self.optimizer.param_groups:
+            store = self._storage[group["name"]]
+            stored_state = self.optimizer.state.pop(group["params"][0], None)
+            if not stored_state:
+                stored_state = {"step": torch.tensor(0.0, dtype=torch.float32)}
+            for key in self._row_state_keys():
+                stored_state[key] = store[key][:n]
+            group["params"][0] = nn.Parameter(store["param"][:n])
+            self.optimizer.state[group["params"][0]] = stored_state
+            setattr(self, self._param_attribute(group["name"]), group["params"][0])
+        self.xyz_gradient_accum = self._stats_storage["xyz_gradient_accum"][:n]
+        self.denom = self._stats_storage["denom"][:n]
+        self.max_radii2D = self._stats_storage["max_radii2D"][:n]
+
+    def _adopt_optimizer_state(self):
+        ''' Copy moments from a freshly loaded optimizer state back into the capacity buffers '''
+        n = self._num_slots
+        for group in self.optimizer.param_groups:
+            stored_state = self.optimizer.state.get(group["params"][0], None)
+            if not stored_state:
+                continue
+            for key in self._row_state_keys():
+                if key in stored_state:
+                    self._storage[group["name"]][key][:n] = stored_state[key]
+                elif key == "row_step" and "step" in stored_state:
+                    # Restored from a dense optimizer: every row has taken the global number of steps
+                    self._storage[group["name"]][key][:n] = int(stored_state["step"])
+        self._bind_capacity_views()
+
+    @staticmethod
+    def _param_attribute(name):
+        return {"xyz": "_xyz", "f_dc": "_features_dc", "f_rest": "_features_rest",
+                "opacity": "_opacity", "scaling": "_scaling", "rotation": "_rotation"}[name]
+
+    def _ensure_capacity(self, num_slots):
+        capacity = self._live.shape[0]
+        if num_slots <= capacity:
+            return
+        capacity = max(num_slots, int(capacity * self.capacity_growth))
+        used = self._num_slots
+
+        def grow(buf):
+            new_buf = torch.zeros((capacity,) + tuple(buf.shape[1:]), dtype=buf.dtype, device=buf.device)
+            new_buf[:used] = buf[:used]
+            return new_buf
+
+        for store in self._storage.values():
+            for key in store:
+                store[key] = grow(store[key])
+        for key in self._stats_storage:
+            self._stats_storage[key] = grow(self._stats_storage[key])
+        self._live = grow(self._live)
+
+    def _capacity_insert(self, tensors_dict, new_tmp_radii):
+        ''' Write new points into dead slots first, then append behind the last used slot '''
+        num_new = tensors_dict["xyz"].shape[0]
+        old_slots = self._num_slots
+        free_idx = torch.nonzero(~self._live[:old_slots]).squeeze(1)[:num_new]
+        num_tail = num_new - free_idx.shape[0]
+        self._ensure_capacity(old_slots + num_tail)
+        tail_idx = torch.arange(old_slots, old_slots + num_tail, device=free_idx.device)
+        idx = torch.cat((free_idx, tail_idx))
+
+        for name, store in self._storage.items():
+            store["param"].index_copy_(0, idx, tensors_dict[name].to(store["param"].dtype))
+            for key in self._row_state_keys():
+                store[key].index_fill_(0, idx, 0)
+        self._live[idx] = True
+        self._num_slots = old_slots + num_tail
+        self._num_live += num_new
+
+        tmp_radii = torch.zeros((self._num_slots), dtype=self.tmp_radii.dtype, device=self.tmp_radii.device)
+        tmp_radii[:old_slots] = self.tmp_radii
+        tmp_radii[idx] = new_tmp_radii
+        self.tmp_radii = tmp_radii
+        self._bind_capacity_views()
+
+    def _capacity_remove(self, mask):
+        ''' Turn the masked rows into dead slots: invisible, zero moments, excluded from the live count '''
+        idx = torch.nonzero(torch.logical_and(mask, self._live[:self._num_slots])).squeeze(1)
+        self._live[idx] = False
+        self._num_live -= idx.shape[0]
+        for name, store in self._storage.items():
+            for key in self._row_state_keys():
+                store[key].index_fill_(0, idx, 0)
+        # A large negative logit keeps dead slots below the rasterizer's alpha cutoff
+        self._storage["opacity"]["param"].index_fill_(0, idx, -20.0)
+        for buf in self._stats_storage.values():
+            buf.index_fill_(0, idx, 0.0)
+
+    def _has_dead_slots(self):
+        return self._storage is not None and self._num_live != self._num_slots
+
+    def _live_rows(self, tensor):
+        ''' Copy of `tensor` without dead capacity slots (the tensor itself when there are none) '''
+        if not self._has_dead_slots():
+            return tensor
+        rows = tensor.detach()[self._live[:self._num_slots]]
+        if isinstance(tensor, nn.Parameter):
+            return nn.Parameter(rows, requires_grad=tensor.requires_grad)
+        return rows
+
+    @property
+    def fragmentation(self):
+        if self._storage is None or self._num_slots == 0:
+            return 0.0
+        return 1.0 - self._num_live / self._num_slots
+
+    def compact(self):
+        ''' Move live rows to the front of the capacity buffers, dropping dead slots '''
+        if not self._has_dead_slots():
+            return
+        live_idx = torch.nonzero(self._live[:self._num_slots]).squeeze(1)
+        n = live_idx.shape[0]
+        for store in self._storage.values():
+            for buf in store.values():
+                buf[:n] = buf.index_select(0, live_idx)
+        for buf in self._stats_storage.values():
+            buf[:n] = buf.index_select(0, live_idx)
+        if getattr(self, "tmp_radii", None) is not None:
+            self.tmp_radii = self.tmp_radii[live_idx]
+        self._live[:n] = True
+        self._live[n:self._num_slots] = False
+        self._num_slots = n
+        self._num_live = n
+        self._bind_capacity_views()
+
     def update_learning_rate(self, iteration):
         ''' Learning rate scheduling per step '''
         for param_group in self.optimizer.param_groups:
@@ -213,18 +529,25 @@ class GaussianModel:
             l.append('rot_{}'.format(i))
         return l
 
-    def save_ply(self, path):
+    def ply_attributes(self):
+        ''' Device tensors written by save_ply, in construct_list_of_attributes() order (normals excluded) '''
+        live = self._live_rows
+        xyz = live(self._xyz.detach())
+        f_dc = live(self._features_dc.detach()).transpose(1, 2).flatten(start_dim=1).contiguous()
+        f_rest = live(self._features_rest.detach()).float().transpose(1, 2).flatten(start_dim=1).contiguous()
+        opacities = live(self._opacity.detach())
+        scale = live(self._scaling.detach())
+        rotation = live(self._rotation.detach())
+        return [xyz, f_dc, f_rest, opacities, scale, rotation]
+
+    @staticmethod
+    def write_ply(path, attributes, attribute_names):
         mkdir_p(os.path.dirname(path))
 
-        xyz = self._xyz.detach().cpu().numpy()
+        xyz, f_dc, f_rest, opacities, scale, rotation = attributes
         normals = np.zeros_like(xyz)
-        f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        opacities = self._opacity.detach().cpu().numpy()
-        scale = self._scaling.detach().cpu().numpy()
-        rotation = self._rotation.detach().cpu().numpy()
 
-        dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
+        dtype_full = [(attribute, 'f4') for attribute in attribute_names]
 
         elements = np.empty(xyz.shape[0], dtype=dtype_full)
         attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
@@ -232,8 +555,18 @@ class GaussianModel:
         el = PlyElement.describe(elements, 'vertex')
         PlyData([el]).write(path)
 
+    def save_ply(self, path):
+        attributes = [t.cpu().numpy() for t in self.ply_attributes()]
+        self.write_ply(path, attributes, self.construct_list_of_attributes())
+
     def reset_opacity(self):
         opacities_new = self.inverse_opacity_activation(torch.min(self.get_opacity, torch.ones_like(self.get_opacity)*0.01))
+        if self._storage is not None:
+            # Dead slots map back to about -20, so they stay invisible
+            self._opacity.data.copy_(opacities_new)
+            for key in self._row_state_keys():
+                self._storage["opacity"][key].zero_()
+            return
         optimizable_tensors = self.replace_tensor_to_optimizer(opacities_new, "opacity")
         self._opacity = optimizable_tensors["opacity"]
 
@@ -295,8 +628,9 @@ class GaussianModel:
         for group in self.optimizer.param_groups:
             if group["name"] == name:
                 stored_state = self.optimizer.state.get(group['params'][0], None)
-                stored_state["exp_avg"] = torch.zeros_like(tensor)
-                stored_state["exp_avg_sq"] = torch.zeros_like(tensor)
+                for key in self._row_state_keys():
+                    if key in stored_state:
+                        stored_state[key] = stored_state[key].new_zeros((tensor.shape[0],) + stored_state[key].shape[1:])
 
                 del self.optimizer.state[group['params'][0]]
                 group["params"][0] = nn.Parameter(tensor.requires_grad_(True))
@@ -310,8 +644,9 @@ class GaussianModel:
         for group in self.optimizer.param_groups:
             stored_state = self.optimizer.state.get(group['params'][0], None)
             if stored_state is not None:
-                stored_state["exp_avg"] = stored_state["exp_avg"][mask]
-                stored_state["exp_avg_sq"] = stored_state["exp_avg_sq"][mask]
+                for key in self._row_state_keys():
+                    if key in stored_state:
+                        stored_state[key] = stored_state[key][mask]
 
                 del self.optimizer.state[group['params'][0]]
                 group["params"][0] = nn.Parameter((group["params"][0][mask].requires_grad_(True)))
@@ -324,6 +659,9 @@ class GaussianModel:
         return optimizable_tensors
 
     def prune_points(self, mask):
+        if self._storage is not None:
+            self._capacity_remove(mask)
+            return
         valid_points_mask = ~mask
         optimizable_tensors = self._prune_optimizer(valid_points_mask)
 
@@ -339,17 +677,20 @@ class GaussianModel:
         self.denom = self.denom[valid_points_mask]
         self.max_radii2D = self.max_radii2D[valid_points_mask]
         self.tmp_radii = self.tmp_radii[valid_points_mask]
+        self._fuse_features()
 
     def cat_tensors_to_optimizer(self, tensors_dict):
         optimizable_tensors = {}
         for group in self.optimizer.param_groups:
             assert len(group["params"]) == 1
-            extension_tensor = tensors_dict[group["name"]]
+            extension_tensor = tensors_dict[group["name"]].to(group["params"][0].dtype)
             stored_state = self.optimizer.state.get(group['params'][0], None)
             if stored_state is not None:
 
-                stored_state["exp_avg"] = torch.cat((stored_state["exp_avg"], torch.zeros_like(extension_tensor)), dim=0)
-                stored_state["exp_avg_sq"] = torch.cat((stored_state["exp_avg_sq"], torch.zeros_like(extension_tensor)), dim=0)
+                for key in self._row_state_keys():
+                    if key in stored_state:
+                        extension_state = stored_state[key].new_zeros((extension_tensor.shape[0],) + stored_state[key].shape[1:])
+                        stored_state[key] = torch.cat((stored_state[key], extension_state), dim=0)
 
                 del self.optimizer.state[group['params'][0]]
                 group["params"][0] = nn.Parameter(torch.cat((group["params"][0], extension_tensor), dim=0).requires_grad_(True))
@@ -370,6 +711,13 @@ class GaussianModel:
         "scaling" : new_scaling,
         "rotation" : new_rotation}
 
+        if self._storage is not None:
+            self._capacity_insert(d, new_tmp_radii)
+            self.xyz_gradient_accum.zero_()
+            self.denom.zero_()
+            self.max_radii2D.zero_()
+            return
+
         optimizable_tensors = self.cat_tensors_to_optimizer(d)
         self._xyz = optimizable_tensors["xyz"]
         self._features_dc = optimizable_tensors["f_dc"]
@@ -379,6 +727,7 @@ class GaussianModel:
         self._rotation = optimizable_tensors["rotation"]
 
         self.tmp_radii = torch.cat((self.tmp_radii, new_tmp_radii))
+        self._fuse_features()
         self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
         self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
         self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
@@ -406,7 +755,8 @@ class GaussianModel:
 
         self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacity, new_scaling, new_rotation, new_tmp_radii)
 
-        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device="cuda", dtype=bool)))
+        # New points are not necessarily appended at the end in capacity mode, so pad to the current size
+        prune_filter = torch.cat((selected_pts_mask, torch.zeros(self.get_xyz.shape[0] - selected_pts_mask.shape[0], device="cuda", dtype=bool)))
         self.prune_points(prune_filter)
 
     def densify_and_clone(self, grads, grad_threshold, scene_extent):
@@ -429,22 +779,34 @@ class GaussianModel:
     def densify_and_prune(self, max_grad, min_opacity, extent, max_screen_size, radii):
         grads = self.xyz_gradient_accum / self.denom
         grads[grads.isnan()] = 0.0
+        if self._storage is not None:
+            grads[~self._live[:self._num_slots]] = 0.0
+
+        if self.gaussian_budget > 0:
+            grads = self._limit_densification(grads, max_grad)
 
         self.tmp_radii = radii
         self.densify_and_clone(grads, max_grad, extent)
         self.densify_and_split(grads, max_grad, extent)
 
+        if self.gaussian_budget > 0 and self.num_gaussians > self.budget_prune_ratio * self.gaussian_budget:
+            # Close to the cap: prune with a stricter opacity threshold
+            min_opacity = max(min_opacity, self.budget_min_opacity)
         prune_mask = (self.get_opacity < min_opacity).squeeze()
         if max_screen_size:
             big_points_vs = self.max_radii2D > max_screen_size
             big_points_ws = self.get_scaling.max(dim=1).values > 0.1 * extent
             prune_mask = torch.logical_or(torch.logical_or(prune_mask, big_points_vs), big_points_ws)
         self.prune_points(prune_mask)
-        tmp_radii = self.tmp_radii
+        if self.gaussian_budget > 0:
+            self._enforce_budget()
         self.tmp_radii = None
+        if self.fragmentation > self.compaction_threshold:
+            self.compact()
 
         torch.cuda.empty_cache()
 
-    def add_densification_stats(self, viewspace_point_tensor, update_filter):
-        self.xyz_gradient_accum[update_filter] += torch.norm(viewspace_point_tensor.grad[update_filter,:2], dim=-1, keepdim=True)
+    def add_densification_stats(self, viewspace_point_tensor, update_filter, grad_scale=1.0):
+        ''' grad_scale undoes the 1/B loss weighting of a batch, so thresholds see per-view gradients '''
+        self.xyz_gradient_accum[update_filter] += grad_scale * torch.norm(viewspace_point_tensor.grad[update_filter,:2], dim=-1, keepdim=True)
         self.denom[update_filter] += 1
@@ -12,6 +12,10 @@ setup(
         "torch",
         "websockets",
     ],
+    extras_require={
+        # Faster JPEG/WebP frame encoding; PIL is used when neither is installed
+        "encoding": ["PyTurboJPEG", "opencv-python"],
+    },
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Science/Research",
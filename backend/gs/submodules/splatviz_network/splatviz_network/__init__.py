@@ -3,10 +3,14 @@ import torch
 import traceback
 import json
 import websockets.server
-from collections import deque
 import threading
-import copy
+import time
 from websockets.exceptions import ConnectionClosed
+from .encoding import FrameEncoder, negotiate_encoding, resolve_quality
+from .channel import ClientChannel
+from .protocol import is_binary_request, decode_request
+from .edits import EditedGaussians, EditError
+from .readback import FrameReadback
 
 __version__ = "0.0.2"
 __author__ = '(WebSocket version by Gemini)'
@@ -14,41 +18,94 @@ __author__ = '(WebSocket version by Gemini)'
 
 class SplatvizNetworkWs:
 
-    def __init__(self, host="127.0.0.1", port=6009):
+    def __init__(self, host="127.0.0.1", port=6009, views_per_step=4):
         self.host = host
         self.port = port
         self.clients = set()
-        self._render_requests = deque(maxlen=1) # Only store the latest request
         self.server = None
         self.loop = None
+        self._encoder = FrameEncoder()
+        self._readback = FrameReadback()
+        # Per-client latest request, adaptive controller and outgoing frame slot, plus the counters of clients that already left
+        self._channels = {}
+        # At most this many client views are rendered per call; the rest are served first on the next call
+        self.views_per_step = views_per_step
+        self._next_client = 0
+        self._sent_frames = 0
+        self._dropped_frames = 0
 
     def is_connected(self):
         """Check if there are any active client connections."""
         return len(self.clients) > 0
 
-    def get_render_request(self):
-        if self._render_requests:
-            return self._render_requests.popleft()
-        return None
+    def get_render_requests(self):
+        """
+        Take the pending requests of up to `views_per_step` clients as (channel, request) pairs.
+        Clients are visited round-robin starting after the last one served, so a client left
+        over when the budget ran out goes first next time.
+        """
+        channels = list(self._channels.values())
+        requests = []
+        start = self._next_client
+        for offset in range(len(channels)):
+            if len(requests) >= self.views_per_step:
+                break
+            index = (start + offset) % len(channels)
+            request = channels[index].take_request()
+            if request is not None:
+                requests.append((channels[index], request))
+                self._next_client = index + 1
+        return requests
+
+    def has_render_work(self):
+        """
+        True when a client has a pending request or its adaptive controller wants a refinement
+        frame, and the encoder is not still busy with earlier batches.
+        """
+        if self._readback.saturated():
+            return False
+        return any(channel.has_request() for channel in list(self._channels.values()))
+
+    def delivery_stats(self):
+        """Frames sent and dropped (skipped for slow clients) since the server started."""
+        channels = list(self._channels.values())
+        return {
+            "clients": len(channels),
+            "sent": self._sent_frames + sum(channel.sent for channel in channels),
+            "dropped": self._dropped_frames + sum(channel.dropped for channel in channels),
+        }
 
     async def _register(self, websocket):
         self.clients.add(websocket)
+        self._channels[websocket] = ClientChannel(websocket)
         print(f"Client connected: {websocket.remote_address}. Total clients: {len(self.clients)}")
 
     async def _unregister(self, websocket):
         """Unregister a client connection."""
         self.clients.remove(websocket)
+        channel = self._channels.pop(websocket, None)
+        if channel is not None:
+            channel.close()
+            self._sent_frames += channel.sent
+            self._dropped_frames += channel.dropped
         print(f"Client disconnected: {websocket.remote_address}. Total clients: {len(self.clients)}")
 
     async def _handler(self, websocket, path):
         await self._register(websocket)
+        channel = self._channels[websocket]
         try:
             async for message in websocket:
                 try:
+                    if is_binary_request(message):
+                        channel.submit_request(EasyDict(decode_request(message)))
+                        continue
                     data = json.loads(message)
                     if "heartbeat" in data: # Respond to heartbeats to keep connection alive
                         continue
-                    self._render_requests.append(EasyDict(data))
+                    if "ack" in data:  # Client finished receiving a frame: feeds the adaptive controller
+                        channel.controller.record_ack(data["ack"])
+                        continue
+                    channel.submit_request(EasyDict(data))
                 except json.JSONDecodeError:
                     print("Error: Received invalid JSON message.")
                 except Exception as e:
@@ -58,52 +115,51 @@ class SplatvizNetworkWs:
         finally:
             await self._unregister(websocket)
 
-    async def send_rendered_output(self, image_bytes, training_stats_dict):
-
-        if not self.is_connected():
+    async def send_rendered_output(self, image_bytes, training_stats_dict, channels=None):
+        """
+        Hand a frame to the given client channels, or to every client. This only fills the
+        per-client slots; the channels' sender tasks do the actual sends, so it never waits
+        on a slow client.
+        """
+        channels = list(self._channels.values()) if channels is None else [channel for channel in channels if channel in self._channels.values()]
+        if not channels:
             return
-        stats_json = json.dumps(training_stats_dict)
-        tasks = []
-        for client in self.clients.copy():  # Use copy to avoid modification during iteration
-            try:
-                tasks.append(asyncio.create_task(client.send(stats_json)))
-                if image_bytes is not None:
-                    # Convert memoryview to bytes if necessary
-                    if isinstance(image_bytes, memoryview):
-                        image_data = bytes(image_bytes)
-                    else:
-                        image_data = image_bytes
-                    tasks.append(asyncio.create_task(client.send(image_data)))
-                print(f"[DEBUG] Created send tasks for client {client.remote_address}")
-            except Exception as e:
-                self.clients.discard(client)
-
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            print(f"[DEBUG] Send tasks completed with {len(results)} results")
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    print(f"[ERROR] Send task {i} failed: {result}")
-        else:
-            print(f"[DEBUG] No send tasks created")
+        # One buffer for all clients: convert once instead of copying per client
+        image_data = bytes(image_bytes) if isinstance(image_bytes, memoryview) else image_bytes
+        for channel in channels:
+            channel.offer(training_stats_dict, image_data)
 
-    def send_rendered_output_threadsafe(self, image_bytes, training_stats_dict):
+    def _send_encoded_frame(self, future, training_stats, channel, frame_meta=None, batch=None, render_share=None):
         """
-        A thread-safe method to call `send_rendered_output` from another thread.
+        Done-callback of an encoder job (runs on the encoder thread): attach the frame's
+        encoding metadata to the stats and hand both to the server loop for `channel`.
+        `render_share` is the frame's share of its readback batch, charged to the adaptive
+        controller as render time (render and readback until the frames were on the host).
         """
-        if self.loop:
-            try:
-                future = asyncio.run_coroutine_threadsafe(
-                    self.send_rendered_output(image_bytes, training_stats_dict),
-                    self.loop
-                )
-                # Wait for completion with timeout
-                future.result(timeout=1.0)
-                print(f"[DEBUG] Successfully sent rendered output to {len(self.clients)} clients")
-            except Exception as e:
-                print(f"[ERROR] Failed to send rendered output: {e}")
-        else:
-            print(f"[ERROR] WebSocket event loop not available, cannot send rendered output")
+        try:
+            frame = future.result()
+        except Exception as e:
+            print(f"[ERROR] Frame encoding failed: {e}")
+            training_stats["error"] = training_stats.get("error") or f"Frame encoding failed: {e}"
+            frame = None
+        if frame is not None:
+            training_stats["frame"] = frame.info()
+            if frame_meta is not None:
+                if render_share is not None and batch is not None:
+                    channel.controller.record_render(batch.ready_ms() * render_share)
+                if not frame_meta["refinement"]:
+                    channel.controller.record_encode(frame.encode_ms)
+                channel.controller.frame_sent(frame_meta["id"])
+                training_stats["frame"].update(frame_meta)
+                training_stats["adaptive"] = channel.controller.stats()
+        self._schedule_send(frame.data if frame is not None else None, training_stats, [channel])
+
+    def _schedule_send(self, image_bytes, training_stats, channels=None):
+        """Queue a send on the server loop from any thread without waiting for it."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        future = asyncio.run_coroutine_threadsafe(self.send_rendered_output(image_bytes, training_stats, channels), self.loop)
+        future.add_done_callback(_report_send_error)
 
     def _parse_render_request(self, message):
         """Parses the dictionary from a render request into structured objects."""
@@ -111,11 +167,14 @@ class SplatvizNetworkWs:
             width = message.resolution_x
             height = message.resolution_y
             
-            world_view_transform = torch.reshape(torch.tensor(message.view_matrix, dtype=torch.float32), (4, 4)).cuda()
+            # Binary requests arrive with both matrices in one pinned tensor; JSON requests are packed the same way
+            matrices = message.get("matrices")
+            if matrices is None:
+                matrices = torch.tensor([message.view_matrix, message.view_projection_matrix], dtype=torch.float32).reshape(2, 4, 4)
+            matrices = matrices.cuda(non_blocking=True)
+            world_view_transform, full_proj_transform = matrices[0], matrices[1]
             world_view_transform[:, 1] = -world_view_transform[:, 1]
             world_view_transform[:, 2] = -world_view_transform[:, 2]
-            
-            full_proj_transform = torch.reshape(torch.tensor(message.view_projection_matrix, dtype=torch.float32), (4, 4)).cuda()
             full_proj_transform[:, 1] = -full_proj_transform[:, 1]
 
             custom_cam = MiniCam(
@@ -196,58 +255,120 @@ class SplatvizNetworkWs:
         return thread
 
 
-    def render_and_respond_async(self, pipe, gaussians, loss, render, background, iteration, opt):
+    def render_and_respond_async(self, pipe, gaussians, loss, render, background, iteration, opt, extra_stats=None):
         """
         An async version of the main render loop integration.
         This would be called from your main training loop.
+
+        Every connected client is served its own latest view. Up to `views_per_step` views
+        are rendered per call over the same Gaussians, read back to the host in a single
+        copy, and each frame is encoded and sent to the client that asked for it only.
+        `extra_stats` is an optional callable returning a dict merged into the training stats;
+        it is only evaluated when a render request is pending. While the encoder is still busy
+        with earlier batches nothing is rendered; the requests stay pending, so each client
+        gets its latest view once the encoder caught up.
         """
-        request = self.get_render_request()
-        if not request:
+        if self._readback.saturated():
             return
-
-        parsed_request = self._parse_render_request(request)
-        if not parsed_request:
+        jobs = []
+        for channel, request in self.get_render_requests():
+            parsed_request = self._parse_render_request(request)
+            if not parsed_request:
+                continue
+            plan = None
+            if parsed_request.get("adaptive") or parsed_request.get("quality") == "auto":
+                channel.last_adaptive_request = request
+                plan = channel.controller.plan(parsed_request.view_matrix, (parsed_request.resolution_x, parsed_request.resolution_y),
+                                               parsed_request.get("target_fps"))
+                # The projection only depends on the field of view, so scaling the pixel grid is enough
+                parsed_request.custom_cam.image_width = max(1, round(parsed_request.resolution_x * plan.scale))
+                parsed_request.custom_cam.image_height = max(1, round(parsed_request.resolution_y * plan.scale))
+            jobs.append((channel, parsed_request, plan))
+        if not jobs:
             return
 
-        edit_error = ""
+        batch = None
+        submitted = 0
         try:
-            net_image_bytes = None
-            pipe.convert_SHs_python = parsed_request.shs_python
-            pipe.compute_cov3D_python = parsed_request.rot_scale_python
-            
-            # Note: For security, running exec on arbitrary text is dangerous.
-            # Consider a safer way to apply edits if this is exposed to untrusted clients.
-            if len(parsed_request.edit_text) > 0:
-                gs = copy.deepcopy(gaussians)
-                slider = parsed_request.slider
-                try:
-                    exec(parsed_request.edit_text)
-                except Exception as e:
-                    edit_error = str(e)
-            else:
+            images = []
+            edit_errors = []
+            render_start = time.perf_counter()
+            for channel, parsed_request, plan in jobs:
+                edit_error = ""
+                pipe.convert_SHs_python = parsed_request.shs_python
+                pipe.compute_cov3D_python = parsed_request.rot_scale_python
+
+                # Edits are previewed as overrides on the shared tensors; the model itself is never copied
                 gs = gaussians
+                render_kwargs = {}
+                scaling_modifier = parsed_request.scaling_modifier
+                if parsed_request.edit_text:
+                    try:
+                        gs = EditedGaussians(gaussians, parsed_request.edit_text, parsed_request.get("slider"))
+                        scaling_modifier *= gs.scale
+                        if gs.color is not None:
+                            render_kwargs["override_color"] = gs.override_color
+                    except EditError as e:
+                        gs = gaussians
+                        edit_error = str(e)
 
-            if parsed_request.custom_cam:
                 with torch.no_grad():
-                    net_image = render(parsed_request.custom_cam, gs, pipe, background, parsed_request.scaling_modifier)["render"]
-                net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
+                    net_image = render(parsed_request.custom_cam, gs, pipe, background, scaling_modifier, **render_kwargs)["render"]
+                images.append(net_image)
+                edit_errors.append(edit_error)
+
+            # One asynchronous device-to-host copy for the whole batch; the encoder waits for it, not this thread
+            batch = self._readback.start(images, render_start)
+            total_pixels = sum(image.numel() for image in images)
 
-            training_stats = {
+            shared_stats = {
                 "loss": loss,
                 "iteration": iteration,
-                "num_gaussians": gaussians.get_xyz.shape[0],
+                "num_gaussians": gaussians.num_gaussians,
                 "sh_degree": gaussians.active_sh_degree,
                 "train_params": vars(opt) if opt else {},
-                "error": edit_error,
-                "paused": parsed_request.stop_at_value == iteration
             }
-            
-            # This needs to be awaited
-            asyncio.create_task(self.send_rendered_output(net_image_bytes, training_stats))
+            if extra_stats is not None:
+                shared_stats.update(extra_stats())
+            shared_stats["views"] = len(jobs)
+
+            for (channel, parsed_request, plan), image, net_image, edit_error in zip(jobs, images, batch.frames, edit_errors):
+                training_stats = dict(shared_stats, error=edit_error, paused=parsed_request.stop_at_value == iteration,
+                                      request_id=parsed_request.get("request_id"))
+
+                # Compress on the encoder thread; the frame is sent from its done-callback
+                encoding = negotiate_encoding(parsed_request.get("encoding"))
+                quality = resolve_quality(parsed_request)
+                frame_meta = None
+                render_share = None
+                if plan is not None:
+                    # The batch is timed as a whole: charge each view its share of the pixels.
+                    # The one-off full-resolution refinement would skew the timings of the adaptive frames
+                    if not plan.refinement:
+                        render_share = image.numel() / total_pixels
+                    quality = plan.quality
+                    accepted = parsed_request.get("encoding") or []
+                    if plan.refinement and "png" in accepted:
+                        # The refinement frame is a still: send it lossless when the client accepts PNG
+                        encoding = "png"
+                    frame_meta = {"id": channel.controller.next_frame_id(), "scale": plan.scale, "refinement": plan.refinement}
+                future = self._encoder.submit(net_image, encoding, quality, ready=batch.wait, done=batch.release)
+                submitted += 1
+                future.add_done_callback(lambda f, stats=training_stats, channel=channel, meta=frame_meta, share=render_share:
+                                         self._send_encoded_frame(f, stats, channel, meta, batch, share))
 
         except Exception as e:
             print(f"An error occurred during rendering: {e}")
             traceback.print_exc()
+            # Frames that never reached the encoder would keep the batch in flight forever
+            if batch is not None:
+                for _ in range(len(batch.frames) - submitted):
+                    batch.release()
+
+def _report_send_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"[ERROR] Failed to queue rendered output: {future.exception()}")
+
 
 class EasyDict(dict):
     def __getattr__(self, name: str):
@@ -273,5 +394,5 @@ class MiniCam:
         self.zfar = zfar
         self.world_view_transform = world_view_transform
         self.full_proj_transform = full_proj_transform
-        view_inv = torch.inverse(self.world_view_transform)
-        self.camera_center = view_inv[3][:3]
\ No newline at end of file
+        # Rigid view matrix (stored transposed): the center is -R^T t, no 4x4 inverse needed
+        self.camera_center = -self.world_view_transform[:3, :3] @ self.world_view_transform[3, :3]
\ No newline at end of file
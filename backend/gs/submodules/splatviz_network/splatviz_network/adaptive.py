@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# Resolution scale and encoder quality for one frame; `refinement` marks the full-quality frame sent once the camera settles
+FramePlan = namedtuple("FramePlan", ["scale", "quality", "refinement"])
+
+
+class AdaptiveQualityController:
+    """
+    Closed-loop choice of render resolution and encoder quality for the live viewer.
+
+    Each frame's render (including readback), encode and client acknowledgement latency
+    are tracked as moving averages. Their sum is compared against the frame budget of
+    `target_fps`. The resolution scale moves towards the budget first, since render,
+    encode and transfer cost all grow with the pixel count. Encoder quality only drops
+    once the scale has reached `min_scale`, and only rises once it is back at `max_scale`.
+    While the camera moves, frames use these adaptive settings. When the view has not
+    changed for `settle_time` seconds, a single full-resolution, full-quality refinement
+    frame is sent.
+
+    The training thread, the encoder thread and the server loop all call into the
+    controller, so its state is guarded by a lock.
+    """
+
+    def __init__(self, target_fps=20.0, min_scale=0.25, max_scale=1.0, min_quality=50, max_quality=90,
+                 settle_time=0.3, smoothing=0.3, motion_epsilon=1e-4):
+        self.target_fps = target_fps
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.settle_time = settle_time
+        self.smoothing = smoothing
+        self.motion_epsilon = motion_epsilon
+
+        self.scale = max_scale
+        self.quality = max_quality
+        self.render_ms = 0.0
+        self.encode_ms = 0.0
+        self.ack_ms = 0.0
+        self._lock = threading.Lock()
+        self._last_view = None
+        self._last_motion = 0.0
+        self._refined = True
+        self._sent = {}
+        self._next_frame_id = 0
+
+    def plan(self, view_matrix, resolution, target_fps=None, now=None):
+        """Decide the settings for the next frame of the camera described by `view_matrix` and `resolution`."""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            if target_fps:
+                self.target_fps = float(target_fps)
+            view = (np.asarray(view_matrix, dtype=np.float32).reshape(-1), tuple(resolution))
+            moving = (self._last_view is None or view[1] != self._last_view[1]
+                      or np.abs(view[0] - self._last_view[0]).max() > self.motion_epsilon)
+            self._last_view = view
+            if moving:
+                self._last_motion = now
+                self._refined = False
+            elif self._refinement_due(now):
+                self._refined = True
+                return FramePlan(1.0, self.max_quality, True)
+            if self.scale >= 1.0 and self.quality >= self.max_quality:
+                # Already at full quality, nothing left to refine
+                self._refined = True
+            return FramePlan(self.scale, self.quality, False)
+
+    def refinement_due(self, now=None):
+        """True once the camera has been still for `settle_time` and the last frame was degraded."""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            return self._refinement_due(now)
+
+    def _refinement_due(self, now):
+        return not self._refined and self._last_view is not None and now - self._last_motion >= self.settle_time
+
+    def record_render(self, render_ms):
+        with self._lock:
+            self.render_ms = self._smooth(self.render_ms, render_ms)
+
+    def record_encode(self, encode_ms):
+        with self._lock:
+            self.encode_ms = self._smooth(self.encode_ms, encode_ms)
+            self._adapt()
+
+    def next_frame_id(self):
+        with self._lock:
+            self._next_frame_id += 1
+            return self._next_frame_id
+
+    def frame_sent(self, frame_id, now=None):
+        with self._lock:
+            self._sent[frame_id] = time.perf_counter() if now is None else now
+            # Clients that never acknowledge must not grow this without bound
+            while len(self._sent) > 64:
+                self._sent.pop(next(iter(self._sent)))
+
+    def record_ack(self, frame_id, now=None):
+        """A client acknowledged `frame_id`: the time since it was handed to the sender is the transfer latency."""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            sent = self._sent.pop(frame_id, None)
+            if sent is not None:
+                self.ack_ms = self._smooth(self.ack_ms, (now - sent) * 1000.0)
+
+    def frame_ms(self):
+        return self.render_ms + self.encode_ms + self.ack_ms
+
+    def _smooth(self, average, value):
+        return value if average == 0.0 else (1.0 - self.smoothing) * average + self.smoothing * value
+
+    def _adapt(self):
+        frame_ms = self.frame_ms()
+        if frame_ms <= 0.0:
+            return
+        budget_ms = 1000.0 / self.target_fps
+        ratio = budget_ms / frame_ms
+        # Cost is roughly proportional to the pixel count, i.e. to scale^2; limit each step to avoid oscillation
+        step = min(max(math.sqrt(ratio), 0.8), 1.25)
+        self.scale = min(max(self.scale * step, self.min_scale), self.max_scale)
+        if ratio < 0.9 and self.scale <= self.min_scale:
+            self.quality = max(self.quality - 5, self.min_quality)
+        elif ratio > 1.2 and self.scale >= self.max_scale:
+            self.quality = min(self.quality + 5, self.max_quality)
+
+    def stats(self):
+        with self._lock:
+            frame_ms = self.frame_ms()
+            return {
+                "target_fps": self.target_fps,
+                "scale": round(self.scale, 3),
+                "quality": self.quality,
+                "render_ms": round(self.render_ms, 2),
+                "encode_ms": round(self.encode_ms, 2),
+                "ack_ms": round(self.ack_ms, 2),
+                "estimated_fps": round(1000.0 / frame_ms, 1) if frame_ms > 0 else None,
+            }
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+import traceback
+from websockets.exceptions import ConnectionClosed
+from .adaptive import AdaptiveQualityController
+
+
+class ClientChannel:
+    """
+    Per-client state of the viewer server: the client's latest render request, its
+    adaptive quality controller and its outgoing frames.
+
+    Requests and frames are both single slots. A newer request replaces one that was not
+    rendered yet, so every client is served its own latest view. A frame offered while the
+    previous one is still waiting replaces it and counts as dropped, so a client whose
+    connection cannot keep up skips frames instead of queueing them. A sender task per
+    client awaits each send (websockets applies the socket's flow control there), which
+    keeps one slow client from delaying the others.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.controller = AdaptiveQualityController()
+        self.last_adaptive_request = None
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.send_ms = 0.0
+        self._request = None
+        # Requests arrive on the server loop and are taken by the rendering thread
+        self._request_lock = threading.Lock()
+        self._pending = None
+        self._ready = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    def submit_request(self, request):
+        with self._request_lock:
+            self._request = request
+
+    def take_request(self):
+        """
+        The latest unserved request; once the camera settled after degraded frames, the
+        last adaptive request again so it is re-rendered at full quality. None otherwise.
+        """
+        with self._request_lock:
+            request, self._request = self._request, None
+        if request is None and self.last_adaptive_request is not None and self.controller.refinement_due():
+            request = self.last_adaptive_request
+        return request
+
+    def has_request(self):
+        return self._request is not None or (self.last_adaptive_request is not None and self.controller.refinement_due())
+
+    def offer(self, training_stats, image_bytes):
+        """Make this the next frame to send, replacing a frame that has not been sent yet."""
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = (training_stats, image_bytes)
+        self._ready.set()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            training_stats, image_bytes = self._pending
+            self._pending = None
+            start = time.perf_counter()
+            try:
+                await self.websocket.send(json.dumps(dict(training_stats, delivery=self.stats())))
+                if image_bytes is not None:
+                    await self.websocket.send(image_bytes)
+            except ConnectionClosed:
+                return
+            except Exception as e:
+                print(f"[ERROR] Failed to send frame to {self.websocket.remote_address}: {e}")
+                traceback.print_exc()
+                continue
+            self.sent += 1
+            self.bytes_sent += len(image_bytes) if image_bytes is not None else 0
+            self.send_ms = (time.perf_counter() - start) * 1000.0
+
+    def stats(self):
+        return {"sent": self.sent, "dropped": self.dropped, "bytes_sent": self.bytes_sent, "send_ms": round(self.send_ms, 2)}
+
+    def close(self):
+        self._task.cancel()
@@ -0,0 +1,135 @@
+import functools
+import re
+import torch
+
+# Whitelisted preview edits and their argument counts. A statement is a command followed by
+# its arguments, each a number or "slider.<name>" (a value of the request's slider dict);
+# statements are separated by ";" or newlines and "#" starts a comment.
+#   opacity <factor>                         scale every opacity (clamped to 1)
+#   min_opacity <threshold>                  hide Gaussians whose opacity is below the threshold
+#   scale <factor>                           multiply the rendered splat size
+#   crop_box <xmin ymin zmin xmax ymax zmax> only show Gaussians inside the box
+#   crop_sphere <x y z radius>               only show Gaussians inside the sphere
+#   color <r g b>                            draw every Gaussian in one color (0-1)
+EDIT_COMMANDS = {"opacity": 1, "min_opacity": 1, "scale": 1, "crop_box": 6, "crop_sphere": 4, "color": 3}
+_NUMBER = re.compile(r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+
+
+class EditError(ValueError):
+    pass
+
+
+@functools.lru_cache(maxsize=64)
+def parse_edit(text):
+    """
+    Parse edit text into a tuple of (command, args) statements. Number arguments become
+    floats and slider references stay names, resolved per frame. Cached per text, since
+    the viewer sends the same text with every request.
+    """
+    statements = []
+    for statement in re.split(r"[;\n]", text):
+        statement = statement.split("#", 1)[0]
+        tokens = statement.replace(",", " ").replace("(", " ").replace(")", " ").split()
+        if not tokens:
+            continue
+        command, args = tokens[0].lower(), tokens[1:]
+        if command not in EDIT_COMMANDS:
+            raise EditError(f"Unknown edit command '{tokens[0]}'; allowed: {', '.join(EDIT_COMMANDS)}")
+        if len(args) != EDIT_COMMANDS[command]:
+            raise EditError(f"'{command}' takes {EDIT_COMMANDS[command]} arguments, got {len(args)}")
+        values = []
+        for arg in args:
+            if _NUMBER.match(arg):
+                values.append(float(arg))
+            elif arg.startswith("slider.") and arg[len("slider."):].isidentifier():
+                values.append(arg[len("slider."):])
+            else:
+                raise EditError(f"Invalid argument '{arg}' for '{command}': expected a number or slider.<name>")
+        statements.append((command, tuple(values)))
+    return tuple(statements)
+
+
+class EditedGaussians:
+    """
+    Preview of edits on top of a model's (or snapshot's) tensors without copying them.
+
+    Crops and the opacity threshold become a visibility mask that is folded into the
+    opacities together with the opacity factor, so hidden Gaussians reach the rasterizer
+    with zero opacity and are skipped there. The color override and splat scale are passed
+    to render() as `override_color` and `scaling_modifier`. Everything else is read from
+    the wrapped object as is.
+    """
+
+    def __init__(self, base, text, slider=None):
+        self._base = base
+        self.opacity_scale = 1.0
+        self.min_opacity = None
+        self.scale = 1.0
+        self.boxes = []
+        self.spheres = []
+        self.color = None
+        for command, args in parse_edit(text):
+            values = [self._resolve(arg, slider or {}) for arg in args]
+            if command == "opacity":
+                self.opacity_scale *= values[0]
+            elif command == "min_opacity":
+                self.min_opacity = values[0]
+            elif command == "scale":
+                self.scale *= values[0]
+            elif command == "crop_box":
+                self.boxes.append((values[:3], values[3:]))
+            elif command == "crop_sphere":
+                self.spheres.append((values[:3], values[3]))
+            elif command == "color":
+                self.color = values
+
+    @staticmethod
+    def _resolve(arg, slider):
+        if isinstance(arg, float):
+            return arg
+        if arg not in slider:
+            raise EditError(f"Unknown slider '{arg}'")
+        return float(slider[arg])
+
+    def __getattr__(self, name):
+        return getattr(self._base, name)
+
+    def visibility_mask(self):
+        """Boolean mask of the Gaussians left visible by the crops and opacity threshold, or None."""
+        if not self.boxes and not self.spheres and self.min_opacity is None:
+            return None
+        xyz = self._base.get_xyz
+        mask = torch.ones(xyz.shape[0], dtype=torch.bool, device=xyz.device)
+        for low, high in self.boxes:
+            low = torch.tensor(low, dtype=xyz.dtype, device=xyz.device)
+            high = torch.tensor(high, dtype=xyz.dtype, device=xyz.device)
+            mask &= ((xyz >= low) & (xyz <= high)).all(dim=-1)
+        for center, radius in self.spheres:
+            center = torch.tensor(center, dtype=xyz.dtype, device=xyz.device)
+            mask &= (xyz - center).square().sum(dim=-1) <= radius * radius
+        if self.min_opacity is not None:
+            mask &= self._base.get_opacity.squeeze(-1) >= self.min_opacity
+        return mask
+
+    @property
+    def get_opacity(self):
+        return self._edit_opacity(self._base.get_opacity)
+
+    def _edit_opacity(self, opacity):
+        if self.opacity_scale != 1.0:
+            opacity = (opacity * self.opacity_scale).clamp(max=1.0)
+        mask = self.visibility_mask()
+        if mask is not None:
+            opacity = opacity * mask.unsqueeze(-1).to(opacity.dtype)
+        return opacity
+
+    def get_fused_activations(self):
+        scaling, rotation, opacity = self._base.get_fused_activations()
+        return scaling, rotation, self._edit_opacity(opacity)
+
+    @property
+    def override_color(self):
+        if self.color is None:
+            return None
+        xyz = self._base.get_xyz
+        return torch.tensor(self.color, dtype=torch.float32, device=xyz.device).clamp(0.0, 1.0).expand(xyz.shape[0], 3)
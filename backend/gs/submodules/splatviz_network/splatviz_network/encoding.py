@@ -0,0 +1,163 @@
+import io
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    _turbojpeg = TurboJPEG()
+except Exception:
+    _turbojpeg = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Frame encodings in the order they are preferred when a client accepts several
+FRAME_ENCODINGS = ("jpeg", "webp", "png", "raw")
+
+# Encoder quality used for the viewer's coarse "quality" levels when no explicit quality is requested
+QUALITY_LEVELS = {"low": 70, "medium": 80, "high": 90}
+DEFAULT_QUALITY = 90
+
+
+def available_encodings():
+    """Encodings this process can produce; "raw" (uncompressed RGB bytes) is always available."""
+    encodings = ["raw"]
+    if _turbojpeg is not None or cv2 is not None or Image is not None:
+        encodings += ["jpeg", "png"]
+    if cv2 is not None or (Image is not None and _pil_has_webp()):
+        encodings.append("webp")
+    return [encoding for encoding in FRAME_ENCODINGS if encoding in encodings]
+
+
+def _pil_has_webp():
+    try:
+        from PIL import features
+        return features.check("webp")
+    except Exception:
+        return False
+
+
+def negotiate_encoding(requested):
+    """
+    Pick the frame encoding for a request. `requested` is an encoding name or a list of
+    names in the client's order of preference; clients that ask for nothing get "raw",
+    which is what the viewer protocol always sent.
+    """
+    if not requested:
+        return "raw"
+    if isinstance(requested, str):
+        requested = [requested]
+    supported = available_encodings()
+    for encoding in requested:
+        encoding = str(encoding).lower()
+        encoding = "jpeg" if encoding == "jpg" else encoding
+        if encoding in supported:
+            return encoding
+    return "raw"
+
+
+def resolve_quality(request):
+    """Encoder quality (1-100) from the request's `encode_quality`, or its coarse `quality` level."""
+    quality = request.get("encode_quality")
+    if quality is None:
+        quality = QUALITY_LEVELS.get(request.get("quality"), DEFAULT_QUALITY)
+    return int(min(max(quality, 1), 100))
+
+
+def encode_frame(frame, encoding, quality=DEFAULT_QUALITY):
+    """
+    Encode an (H, W, 3) uint8 RGB array. JPEG prefers libjpeg-turbo, then OpenCV, then PIL;
+    PNG is written with fast compression since it is meant for lossless stills.
+    """
+    if encoding == "raw":
+        return np.ascontiguousarray(frame).tobytes()
+    if encoding == "jpeg":
+        if _turbojpeg is not None:
+            return _turbojpeg.encode(np.ascontiguousarray(frame), quality=quality, pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+        if cv2 is not None:
+            return _cv2_encode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return _pil_encode(frame, "JPEG", quality=quality)
+    if encoding == "webp":
+        if cv2 is not None:
+            return _cv2_encode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        return _pil_encode(frame, "WEBP", quality=quality, method=0)
+    if encoding == "png":
+        if cv2 is not None:
+            return _cv2_encode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        return _pil_encode(frame, "PNG", compress_level=1)
+    raise ValueError(f"Unknown frame encoding: {encoding}")
+
+
+def _cv2_encode(extension, frame, params):
+    success, encoded = cv2.imencode(extension, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), params)
+    if not success:
+        raise RuntimeError(f"OpenCV failed to encode {extension} frame")
+    return encoded.tobytes()
+
+
+def _pil_encode(frame, fmt, **params):
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+class EncodedFrame:
+    """One encoded frame; `data` is shared by every client the frame is sent to."""
+
+    __slots__ = ("data", "encoding", "quality", "width", "height", "encode_ms")
+
+    def __init__(self, data, encoding, quality, width, height, encode_ms):
+        self.data = data
+        self.encoding = encoding
+        self.quality = quality
+        self.width = width
+        self.height = height
+        self.encode_ms = encode_ms
+
+    def info(self):
+        return {
+            "encoding": self.encoding,
+            "quality": self.quality,
+            "width": self.width,
+            "height": self.height,
+            "bytes": len(self.data),
+            "encode_ms": self.encode_ms,
+        }
+
+
+class FrameEncoder:
+    """Encodes frames on a single worker thread so compression never runs on the training thread."""
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="splatviz-encoder")
+
+    def submit(self, frame, encoding, quality, ready=None, done=None):
+        """
+        Queue `frame` for encoding; returns a Future resolving to an EncodedFrame. `ready` is
+        called on the encoder thread before `frame` is read (e.g. to wait for an asynchronous
+        copy into it) and `done` once it is no longer needed.
+        """
+        return self._pool.submit(self._encode, frame, encoding, quality, ready, done)
+
+    @staticmethod
+    def _encode(frame, encoding, quality, ready=None, done=None):
+        try:
+            if ready is not None:
+                ready()
+            start = time.perf_counter()
+            data = encode_frame(frame, encoding, quality)
+            return EncodedFrame(data, encoding, quality, frame.shape[1], frame.shape[0], (time.perf_counter() - start) * 1000.0)
+        finally:
+            if done is not None:
+                done()
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,87 @@
+import json
+import struct
+import numpy as np
+import torch
+from .encoding import FRAME_ENCODINGS
+
+# Binary render requests: a fixed little-endian header, the view and view-projection matrices as
+# 32 float32 values, then an optional JSON tail for the rarely used variable-length fields.
+REQUEST_MAGIC = b"SVRQ"
+REQUEST_VERSION = 2
+# magic, version, flags, request id (echoed in the frame's stats, 0 = unset), resolution x/y, fov y/x, z near/far, scaling modifier,
+# stop_at_value, target_fps, encode_quality (0 = unset), quality level, 4 preferred encodings (index + 1 into FRAME_ENCODINGS, 0 = unused),
+# JSON tail length
+REQUEST_HEADER = struct.Struct("<4sHHIIIfffffifBB4BI")
+MATRIX_FLOATS = 32
+REQUEST_FLAGS = ("train", "shs_python", "rot_scale_python", "keep_alive", "single_training_step", "is_predictive", "adaptive")
+QUALITY_NAMES = ("high", "low", "medium", "auto")
+TAIL_FIELDS = ("edit_text", "slider")
+
+
+def is_binary_request(message):
+    return isinstance(message, (bytes, bytearray, memoryview)) and bytes(message[:4]) == REQUEST_MAGIC
+
+
+def encode_request(request):
+    """Pack a request dict with the fields of the JSON protocol into a binary request."""
+    flags = sum(1 << bit for bit, name in enumerate(REQUEST_FLAGS) if request.get(name))
+    encodings = request.get("encoding") or []
+    if isinstance(encodings, str):
+        encodings = [encodings]
+    codes = [FRAME_ENCODINGS.index(encoding) + 1 for encoding in encodings if encoding in FRAME_ENCODINGS][:4]
+    codes += [0] * (4 - len(codes))
+    tail = {name: request[name] for name in TAIL_FIELDS if request.get(name)}
+    tail_bytes = json.dumps(tail).encode("utf-8") if tail else b""
+    quality = request.get("quality", "high")
+    header = REQUEST_HEADER.pack(
+        REQUEST_MAGIC, REQUEST_VERSION, flags, request.get("request_id") or 0,
+        request["resolution_x"], request["resolution_y"],
+        request["fov_y"], request["fov_x"], request.get("z_near", 0.01), request.get("z_far", 10.0),
+        request.get("scaling_modifier", 1.0), request.get("stop_at_value", -1), request.get("target_fps") or 0.0,
+        request.get("encode_quality") or 0, QUALITY_NAMES.index(quality) if quality in QUALITY_NAMES else 0,
+        *codes, len(tail_bytes))
+    matrices = np.concatenate([np.asarray(request["view_matrix"], dtype=np.float32).reshape(16),
+                               np.asarray(request["view_projection_matrix"], dtype=np.float32).reshape(16)])
+    return header + matrices.tobytes() + tail_bytes
+
+
+def decode_request(message):
+    """
+    Unpack a binary request into the same fields as a JSON request. Both matrices are
+    read with numpy.frombuffer and land in one (2, 4, 4) page-locked tensor under
+    "matrices", so building the camera is a single asynchronous host-to-device copy.
+    """
+    (magic, version, flags, request_id, resolution_x, resolution_y, fov_y, fov_x, z_near, z_far, scaling_modifier,
+     stop_at_value, target_fps, encode_quality, quality, *codes, tail_length) = REQUEST_HEADER.unpack_from(message)
+    if magic != REQUEST_MAGIC or version != REQUEST_VERSION:
+        raise ValueError(f"Unsupported render request (magic {magic!r}, version {version})")
+    matrices = np.frombuffer(message, dtype=np.float32, count=MATRIX_FLOATS, offset=REQUEST_HEADER.size)
+    # The caching host allocator keeps a pinned block alive until its pending copy has finished
+    pinned = torch.empty((2, 4, 4), dtype=torch.float32, pin_memory=torch.cuda.is_available())
+    pinned.numpy()[...] = matrices.reshape(2, 4, 4)
+
+    request = {name: bool(flags & (1 << bit)) for bit, name in enumerate(REQUEST_FLAGS)}
+    request.update({
+        "request_id": request_id or None,
+        "resolution_x": resolution_x,
+        "resolution_y": resolution_y,
+        "fov_y": fov_y,
+        "fov_x": fov_x,
+        "z_near": z_near,
+        "z_far": z_far,
+        "scaling_modifier": scaling_modifier,
+        "stop_at_value": stop_at_value,
+        "target_fps": target_fps or None,
+        "encode_quality": encode_quality or None,
+        "quality": QUALITY_NAMES[quality] if quality < len(QUALITY_NAMES) else "high",
+        "encoding": [FRAME_ENCODINGS[code - 1] for code in codes if 0 < code <= len(FRAME_ENCODINGS)],
+        "view_matrix": matrices[:16],
+        "view_projection_matrix": matrices[16:],
+        "matrices": pinned,
+        "edit_text": "",
+        "slider": {},
+    })
+    if tail_length:
+        offset = REQUEST_HEADER.size + MATRIX_FLOATS * 4
+        request.update(json.loads(bytes(message[offset:offset + tail_length]).decode("utf-8")))
+    return request
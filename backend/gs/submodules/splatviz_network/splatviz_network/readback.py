@@ -0,0 +1,125 @@
+import threading
+import time
+import torch
+
+
+class _Slot:
+    """Reusable device and host buffers for one batch of frames in flight."""
+
+    def __init__(self, num_values, num_pixels, device, pin_memory):
+        self.scratch = torch.empty(num_values, dtype=torch.float32, device=device)
+        self.device_bytes = torch.empty(num_values, dtype=torch.uint8, device=device)
+        self.host_bytes = torch.empty(num_values, dtype=torch.uint8, pin_memory=pin_memory)
+        self.num_pixels = num_pixels
+
+
+class ReadbackBatch:
+    """
+    Host copies of one batch of rendered frames. `frames` are (H, W, 3) uint8 numpy views into
+    the pinned buffer; they are valid once wait() returned and until the last release().
+    """
+
+    def __init__(self, readback, slot, frames, event, start_time):
+        self.frames = frames
+        self.start_time = start_time
+        self.ready_time = None
+        self._readback = readback
+        self._slot = slot
+        self._event = event
+        self._users = len(frames)
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if self._event is not None:
+            self._event.synchronize()
+        with self._lock:
+            if self.ready_time is None:
+                self.ready_time = time.perf_counter()
+
+    def ready_ms(self):
+        """Time from the start of the batch until its frames were on the host."""
+        return (self.ready_time - self.start_time) * 1000.0 if self.ready_time is not None else 0.0
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            done = self._users == 0
+        if done:
+            self._readback._release(self._slot)
+
+
+class FrameReadback:
+    """
+    Device-to-host path for rendered frames that does not block the rendering thread.
+
+    Each (3, H, W) float image is scaled, clamped and cast into a reusable uint8 (H, W, 3)
+    device buffer with out= kernels, so no intermediate tensors are allocated. The whole
+    batch is then copied with one non-blocking copy into a pinned host buffer on a side
+    stream that first waits for the rendering stream. The rendering thread returns right
+    away; the encoder thread waits on the copy's event before it reads the frames. Slots
+    of buffers are recycled once every frame of a batch is released, and a batch that finds
+    no free slot gets a new one, so frames still being encoded are never overwritten. At most
+    `max_in_flight` batches are outstanding: callers check saturated() and skip rendering
+    while the encoder catches up, which bounds the buffers to that many slots.
+    """
+
+    def __init__(self, max_free_slots=3, max_in_flight=2):
+        self.max_free_slots = max_free_slots
+        self.max_in_flight = max_in_flight
+        self._cuda = torch.cuda.is_available()
+        self._stream = torch.cuda.Stream() if self._cuda else None
+        self._free = []
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def saturated(self):
+        """True while `max_in_flight` batches are still being encoded."""
+        return self._in_flight >= self.max_in_flight
+
+    def _acquire(self, num_values, num_pixels, device):
+        with self._lock:
+            for i, slot in enumerate(self._free):
+                if slot.device_bytes.numel() >= num_values and slot.device_bytes.device == device:
+                    return self._free.pop(i)
+        # Some headroom so small changes in resolution reuse the slot
+        return _Slot(int(num_values * 1.25), num_pixels, device, self._cuda and device.type == "cuda")
+
+    def _release(self, slot):
+        with self._lock:
+            self._in_flight -= 1
+            if len(self._free) < self.max_free_slots:
+                self._free.append(slot)
+
+    def start(self, images, start_time=None):
+        """Convert and start copying `images` (a list of (3, H, W) tensors) to the host; returns a ReadbackBatch."""
+        start_time = time.perf_counter() if start_time is None else start_time
+        device = images[0].device
+        sizes = [image.numel() for image in images]
+        slot = self._acquire(sum(sizes), sum(sizes) // 3, device)
+        with self._lock:
+            self._in_flight += 1
+
+        offset = 0
+        views = []
+        for image, size in zip(images, sizes):
+            height, width = image.shape[1], image.shape[2]
+            scratch = slot.scratch[offset:offset + size].view(image.shape)
+            torch.mul(image, 255.0, out=scratch)
+            scratch.clamp_(0.0, 255.0)
+            slot.device_bytes[offset:offset + size].view(height, width, 3).copy_(scratch.permute(1, 2, 0))
+            views.append((offset, size, (height, width, 3)))
+            offset += size
+
+        event = None
+        if device.type == "cuda":
+            self._stream.wait_stream(torch.cuda.current_stream(device))
+            with torch.cuda.stream(self._stream):
+                slot.host_bytes[:offset].copy_(slot.device_bytes[:offset], non_blocking=True)
+                event = torch.cuda.Event()
+                event.record(self._stream)
+        else:
+            slot.host_bytes[:offset].copy_(slot.device_bytes[:offset])
+
+        host = slot.host_bytes.numpy()
+        frames = [host[start:start + size].reshape(shape) for start, size, shape in views]
+        return ReadbackBatch(self, slot, frames, event, start_time)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Import the package from this checkout rather than an installed copy
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PACKAGE_ROOT not in sys.path:
+    sys.path.insert(0, PACKAGE_ROOT)
@@ -0,0 +1,87 @@
+import pytest
+import torch
+
+from splatviz_network.edits import EditedGaussians, EditError, parse_edit
+
+
+class FakeGaussians:
+    """Five Gaussians on the x axis at x = 0..4 with opacities 0.1..0.5."""
+
+    def __init__(self):
+        self.get_xyz = torch.tensor([[float(x), 0.0, 0.0] for x in range(5)])
+        self.get_opacity = torch.tensor([[0.1], [0.2], [0.3], [0.4], [0.5]])
+        self.get_scaling = torch.ones(5, 3)
+        self.active_sh_degree = 2
+
+    def get_fused_activations(self):
+        return self.get_scaling, torch.zeros(5, 4), self.get_opacity
+
+
+def test_parse_numbers_sliders_and_comments():
+    text = "opacity 0.5; scale slider.size  # comment\ncrop_box(-1, -2, -3, 1e1, 2., .5)\n\n"
+    assert parse_edit(text) == (
+        ("opacity", (0.5,)),
+        ("scale", ("size",)),
+        ("crop_box", (-1.0, -2.0, -3.0, 10.0, 2.0, 0.5)),
+    )
+    assert parse_edit("OPACITY 1") == (("opacity", (1.0,)),)
+
+
+def test_opacity_scales_and_clamps():
+    edited = EditedGaussians(FakeGaussians(), "opacity 3")
+    assert torch.allclose(edited.get_opacity.squeeze(-1), torch.tensor([0.3, 0.6, 0.9, 1.0, 1.0]))
+    assert edited.visibility_mask() is None
+
+
+def test_min_opacity_hides_transparent_gaussians():
+    edited = EditedGaussians(FakeGaussians(), "min_opacity 0.3")
+    assert edited.visibility_mask().tolist() == [False, False, True, True, True]
+    assert torch.allclose(edited.get_opacity.squeeze(-1), torch.tensor([0.0, 0.0, 0.3, 0.4, 0.5]))
+
+
+def test_scale_multiplies_and_reads_sliders():
+    edited = EditedGaussians(FakeGaussians(), "scale 2; scale slider.size", slider={"size": 1.5})
+    assert edited.scale == 3.0
+
+
+def test_crop_box_and_crop_sphere_intersect():
+    base = FakeGaussians()
+    assert EditedGaussians(base, "crop_box 0.5 -1 -1 3.5 1 1").visibility_mask().tolist() == [False, True, True, True, False]
+    assert EditedGaussians(base, "crop_sphere 0 0 0 2").visibility_mask().tolist() == [True, True, True, False, False]
+    both = EditedGaussians(base, "crop_box 0.5 -1 -1 3.5 1 1; crop_sphere 0 0 0 2")
+    assert both.visibility_mask().tolist() == [False, True, True, False, False]
+    scaling, _, opacity = both.get_fused_activations()
+    assert scaling is base.get_scaling
+    assert torch.allclose(opacity.squeeze(-1), torch.tensor([0.0, 0.2, 0.3, 0.0, 0.0]))
+
+
+def test_color_overrides_every_gaussian_and_clamps():
+    edited = EditedGaussians(FakeGaussians(), "color 1.5 0.25 -1")
+    assert edited.override_color.shape == (5, 3)
+    assert edited.override_color[0].tolist() == [1.0, 0.25, 0.0]
+    assert EditedGaussians(FakeGaussians(), "opacity 1").override_color is None
+
+
+def test_other_attributes_come_from_the_base():
+    assert EditedGaussians(FakeGaussians(), "").active_sh_degree == 2
+
+
+@pytest.mark.parametrize("text", [
+    "delete",                           # not a whitelisted command
+    "__import__('os').system('ls')",    # code is not a command
+    "opacity",                          # missing argument
+    "color 1 1",                        # wrong argument count
+    "crop_sphere 0 0 0 1 2",
+    "opacity 0x10",                     # only decimal numbers
+    "scale slider.a.b",                 # slider names are identifiers
+    "scale nan",
+])
+def test_rejects_anything_outside_the_whitelist(text):
+    with pytest.raises(EditError):
+        parse_edit(text)
+
+
+def test_unknown_slider_is_rejected():
+    with pytest.raises(EditError):
+        EditedGaussians(FakeGaussians(), "scale slider.size", slider={"other": 1.0})
+
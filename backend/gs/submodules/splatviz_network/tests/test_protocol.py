@@ -0,0 +1,74 @@
+import struct
+
+import numpy as np
+import pytest
+
+from splatviz_network.protocol import REQUEST_HEADER, decode_request, encode_request, is_binary_request
+
+
+def _request(**overrides):
+    request = {
+        "resolution_x": 640, "resolution_y": 480, "fov_y": 0.8, "fov_x": 1.0,
+        "view_matrix": np.arange(16, dtype=np.float32).reshape(4, 4),
+        "view_projection_matrix": -np.arange(16, dtype=np.float32),
+    }
+    request.update(overrides)
+    return request
+
+
+def test_round_trip_keeps_every_field():
+    message = encode_request(_request(
+        request_id=42, z_near=0.1, z_far=50.0, scaling_modifier=0.5, stop_at_value=3, target_fps=30.0,
+        encode_quality=85, quality="auto", encoding=["webp", "jpeg", "bogus"], train=True, adaptive=True,
+        edit_text="opacity 0.5", slider={"size": 2.0}))
+    assert is_binary_request(message)
+
+    request = decode_request(message)
+    assert request["request_id"] == 42
+    assert (request["resolution_x"], request["resolution_y"]) == (640, 480)
+    assert request["fov_y"] == pytest.approx(0.8) and request["fov_x"] == pytest.approx(1.0)
+    assert request["z_near"] == pytest.approx(0.1) and request["z_far"] == pytest.approx(50.0)
+    assert request["scaling_modifier"] == 0.5
+    assert request["stop_at_value"] == 3
+    assert request["target_fps"] == 30.0
+    assert request["encode_quality"] == 85
+    assert request["quality"] == "auto"
+    assert request["encoding"] == ["webp", "jpeg"]
+    assert request["train"] and request["adaptive"]
+    assert not request["keep_alive"] and not request["is_predictive"]
+    assert request["edit_text"] == "opacity 0.5"
+    assert request["slider"] == {"size": 2.0}
+    assert np.array_equal(request["view_matrix"], np.arange(16, dtype=np.float32))
+    assert np.array_equal(request["view_projection_matrix"], -np.arange(16, dtype=np.float32))
+    assert np.array_equal(request["matrices"].numpy(), np.stack([np.arange(16), -np.arange(16)]).reshape(2, 4, 4))
+
+
+def test_round_trip_defaults():
+    request = decode_request(encode_request(_request()))
+    assert request["request_id"] is None
+    assert request["target_fps"] is None and request["encode_quality"] is None
+    assert request["quality"] == "high"
+    assert request["encoding"] == []
+    assert request["edit_text"] == "" and request["slider"] == {}
+    assert request["z_near"] == pytest.approx(0.01) and request["z_far"] == pytest.approx(10.0)
+
+
+def test_rejects_bad_magic():
+    message = bytearray(encode_request(_request()))
+    message[:4] = b"XXXX"
+    assert not is_binary_request(bytes(message))
+    with pytest.raises(ValueError, match="magic"):
+        decode_request(bytes(message))
+
+
+def test_rejects_other_version():
+    message = bytearray(encode_request(_request()))
+    struct.pack_into("<H", message, 4, 1)
+    with pytest.raises(ValueError, match="version 1"):
+        decode_request(bytes(message))
+
+
+def test_header_layout():
+    message = encode_request(_request())
+    assert len(message) == REQUEST_HEADER.size + 32 * 4
+    assert REQUEST_HEADER.unpack_from(message)[:2] == (b"SVRQ", 2)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The training code imports its modules relative to backend/gs (e.g. "from utils.x import y")
+GS_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if GS_ROOT not in sys.path:
+    sys.path.insert(0, GS_ROOT)
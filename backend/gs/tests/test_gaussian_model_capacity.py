@@ -0,0 +1,115 @@
+from argparse import ArgumentParser
+
+import torch
+from torch import nn
+
+from arguments import OptimizationParams
+from scene.gaussian_model import GaussianModel
+
+ATTRIBUTES = {"xyz": "_xyz", "f_dc": "_features_dc", "f_rest": "_features_rest",
+              "opacity": "_opacity", "scaling": "_scaling", "rotation": "_rotation"}
+
+
+def _new_points(n, generator):
+    return {"xyz": torch.randn(n, 3, generator=generator), "f_dc": torch.randn(n, 1, 3, generator=generator),
+            "f_rest": torch.randn(n, 3, 3, generator=generator), "opacity": torch.zeros(n, 1),
+            "scaling": torch.randn(n, 3, generator=generator), "rotation": torch.randn(n, 4, generator=generator)}
+
+
+def _capacity_model(n=8, headroom="1.5"):
+    generator = torch.Generator().manual_seed(0)
+    gaussians = GaussianModel(sh_degree=1)
+    for name, value in _new_points(n, generator).items():
+        setattr(gaussians, ATTRIBUTES[name], nn.Parameter(value))
+    gaussians.max_radii2D = torch.zeros(n)
+    parser = ArgumentParser()
+    op = OptimizationParams(parser)
+    gaussians.training_setup(op.extract(parser.parse_args(["--capacity_mode", "--capacity_headroom", headroom])))
+    gaussians.compaction_threshold = 1.0  # compact explicitly
+    gaussians.tmp_radii = torch.zeros(n)
+    # One Adam step so every row has non-zero moments
+    for group in gaussians.optimizer.param_groups:
+        group["params"][0].grad = torch.randn(group["params"][0].shape, generator=generator)
+    gaussians.optimizer.step()
+    return gaussians, generator
+
+
+def _insert(gaussians, points):
+    gaussians.densification_postfix(points["xyz"], points["f_dc"], points["f_rest"], points["opacity"],
+                                     points["scaling"], points["rotation"], torch.zeros(points["xyz"].shape[0]))
+
+
+def _assert_consistent(gaussians, num_live):
+    live = gaussians._live[:gaussians._num_slots]
+    assert gaussians.num_gaussians == num_live == int(live.sum())
+    # Dead slots are invisible and carry no optimizer state
+    assert torch.all(gaussians.get_opacity[~live] < 1e-8)
+    for group in gaussians.optimizer.param_groups:
+        param = group["params"][0]
+        assert param is getattr(gaussians, ATTRIBUTES[group["name"]])
+        assert param.shape[0] == gaussians._num_slots
+        state = gaussians.optimizer.state[param]
+        for key in ("exp_avg", "exp_avg_sq"):
+            assert state[key].shape == param.shape
+            assert state[key].data_ptr() == gaussians._storage[group["name"]][key].data_ptr()
+            assert torch.count_nonzero(state[key][~live]) == 0
+    for stats in (gaussians.xyz_gradient_accum, gaussians.denom, gaussians.max_radii2D):
+        assert stats.shape[0] == gaussians._num_slots
+
+
+def _live_rows(gaussians):
+    live = gaussians._live[:gaussians._num_slots]
+    xyz_state = gaussians.optimizer.state[gaussians._xyz]
+    return gaussians._xyz.detach()[live].clone(), xyz_state["exp_avg"][live].clone()
+
+
+def test_insert_remove_compact_keep_model_and_optimizer_consistent():
+    gaussians, generator = _capacity_model(n=8)
+    _assert_consistent(gaussians, 8)
+
+    # Appending past the preallocated capacity grows the buffers
+    points = _new_points(6, generator)
+    _insert(gaussians, points)
+    _assert_consistent(gaussians, 14)
+    assert gaussians._live.shape[0] >= 14
+    assert torch.equal(gaussians._xyz.detach()[8:14], points["xyz"])
+    assert torch.count_nonzero(gaussians.optimizer.state[gaussians._xyz]["exp_avg"][8:14]) == 0
+
+    remove = torch.zeros(14, dtype=torch.bool)
+    remove[[1, 4, 9, 12]] = True
+    kept_xyz = gaussians._xyz.detach()[~remove].clone()
+    kept_moments = gaussians.optimizer.state[gaussians._xyz]["exp_avg"][~remove].clone()
+    gaussians.prune_points(remove)
+    _assert_consistent(gaussians, 10)
+    assert gaussians._num_slots == 14
+    assert gaussians.fragmentation == 4 / 14
+
+    # New points reuse the dead slots before appending
+    points = _new_points(2, generator)
+    _insert(gaussians, points)
+    _assert_consistent(gaussians, 12)
+    assert gaussians._num_slots == 14
+    assert torch.equal(gaussians._xyz.detach()[[1, 4]], points["xyz"])
+
+    xyz, moments = _live_rows(gaussians)
+    gaussians.compact()
+    _assert_consistent(gaussians, 12)
+    assert gaussians._num_slots == 12 and gaussians.fragmentation == 0.0
+    assert torch.equal(gaussians._xyz.detach(), xyz)
+    assert torch.equal(gaussians.optimizer.state[gaussians._xyz]["exp_avg"], moments)
+    surviving = [row for row in range(12) if not torch.equal(xyz[row], points["xyz"][0]) and not torch.equal(xyz[row], points["xyz"][1])]
+    assert torch.equal(xyz[surviving], kept_xyz)
+    assert torch.equal(moments[surviving], kept_moments)
+
+
+def test_capture_drops_dead_slots():
+    gaussians, _ = _capacity_model(n=8)
+    remove = torch.zeros(8, dtype=torch.bool)
+    remove[[0, 5]] = True
+    gaussians.prune_points(remove)
+
+    captured = gaussians.capture()
+    assert captured[1].shape[0] == 6
+    assert torch.equal(captured[1], gaussians._xyz.detach()[~remove])
+    for state in captured[10]["state"].values():
+        assert state["exp_avg"].shape[0] == 6
@@ -0,0 +1,60 @@
+import torch
+
+from utils.optim_utils import RowSparseAdam
+
+
+def _params_and_grads(seed, shapes=((16, 3), (16, 1), (16, 4, 3))):
+    generator = torch.Generator().manual_seed(seed)
+    params = [torch.randn(shape, generator=generator) for shape in shapes]
+    grads = [[torch.randn(shape, generator=generator) for shape in shapes] for _ in range(5)]
+    return params, grads
+
+
+def _run(optimizer_cls, params, grads, **step_kwargs):
+    params = [torch.nn.Parameter(p.clone()) for p in params]
+    optimizer = optimizer_cls([{"params": [p], "lr": 1e-2} for p in params], lr=0.0, betas=(0.9, 0.999), eps=1e-15)
+    for step_grads in grads:
+        for param, grad in zip(params, step_grads):
+            param.grad = grad.clone()
+        optimizer.step(**step_kwargs)
+    return params, optimizer
+
+
+def test_all_rows_visible_matches_adam():
+    params, grads = _params_and_grads(0)
+    expected, dense = _run(torch.optim.Adam, params, grads)
+    all_visible = torch.ones(16, dtype=torch.bool)
+    for step_kwargs in ({}, {"visibility": all_visible}):
+        actual, sparse = _run(RowSparseAdam, params, grads, **step_kwargs)
+        for param, reference in zip(actual, expected):
+            torch.testing.assert_close(param, reference, rtol=1e-5, atol=1e-6)
+            torch.testing.assert_close(sparse.state[param]["exp_avg"], dense.state[reference]["exp_avg"])
+            torch.testing.assert_close(sparse.state[param]["exp_avg_sq"], dense.state[reference]["exp_avg_sq"])
+            assert torch.equal(sparse.state[param]["row_step"], torch.full((16,), 5, dtype=torch.int32))
+
+
+def test_hidden_rows_are_untouched():
+    params, grads = _params_and_grads(1)
+    visibility = torch.zeros(16, dtype=torch.bool)
+    visibility[::3] = True
+    actual, sparse = _run(RowSparseAdam, params, grads, visibility=visibility)
+    for param, initial in zip(actual, params):
+        assert torch.equal(param[~visibility], initial[~visibility])
+        assert not torch.equal(param[visibility], initial[visibility])
+        assert torch.count_nonzero(sparse.state[param]["exp_avg"][~visibility]) == 0
+        assert torch.equal(sparse.state[param]["row_step"], visibility.int() * 5)
+
+
+def test_closure_is_the_first_positional_argument():
+    param = torch.nn.Parameter(torch.ones(4, 2))
+    optimizer = RowSparseAdam([param], lr=0.1)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = (param ** 2).sum()
+        loss.backward()
+        return loss
+
+    loss = optimizer.step(closure)
+    assert loss.item() == 8.0
+    assert torch.all(param < 1.0)
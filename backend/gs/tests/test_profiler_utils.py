@@ -0,0 +1,94 @@
+import json
+import types
+import pytest
+from utils import profiler_utils
+from utils.profiler_utils import TrainingProfiler
+
+
+class FakeClock:
+    """perf_counter replacement whose phases last exactly the scripted number of milliseconds."""
+
+    def __init__(self, durations_ms):
+        self._durations = iter(durations_ms)
+        self._now = 0.0
+        self._in_phase = False
+
+    def perf_counter(self):
+        if self._in_phase:
+            self._now += next(self._durations) / 1000.0
+        self._in_phase = not self._in_phase
+        return self._now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    def install(durations_ms):
+        fake = FakeClock(durations_ms)
+        monkeypatch.setattr(profiler_utils, "time", types.SimpleNamespace(perf_counter=fake.perf_counter, time=lambda: 0.0))
+        return fake
+    return install
+
+
+def run_phases(profiler, name, count):
+    for _ in range(count):
+        with profiler.phase(name):
+            pass
+
+
+def test_percentiles_over_sliding_window(clock):
+    # 1..150 ms, but only the last 100 samples (51..150 ms) are in the window
+    clock([float(ms) for ms in range(1, 151)])
+    profiler = TrainingProfiler(window=100, device="cpu")
+    run_phases(profiler, "render", 150)
+
+    stats = profiler.summary()["render"]
+    assert stats["count"] == 100
+    assert stats["mean_ms"] == pytest.approx(100.5)
+    assert stats["p50_ms"] == pytest.approx(100.5)
+    assert stats["p90_ms"] == pytest.approx(140.1)
+    assert stats["p99_ms"] == pytest.approx(149.01)
+
+
+def test_phases_are_reported_separately(clock):
+    clock([2.0, 10.0, 2.0, 10.0])
+    profiler = TrainingProfiler(window=10, device="cpu")
+    for _ in range(2):
+        with profiler.phase("loss"):
+            pass
+        with profiler.phase("optimizer"):
+            pass
+
+    summary = profiler.summary()
+    assert list(summary) == ["loss", "optimizer"]
+    assert summary["loss"]["p99_ms"] == pytest.approx(2.0)
+    assert summary["optimizer"]["p50_ms"] == pytest.approx(10.0)
+
+
+def test_disabled_profiler_records_nothing(tmp_path):
+    profiler = TrainingProfiler(enabled=False, window=2, device="cpu")
+    run_phases(profiler, "render", 3)
+    assert profiler.summary() == {}
+    assert not profiler.maybe_dump(str(tmp_path / "training_profile.json"), 2)
+    assert not (tmp_path / "training_profile.json").exists()
+
+
+def test_dump_fires_every_window_iterations(clock, tmp_path):
+    clock([5.0] * 10)
+    profiler = TrainingProfiler(window=4, device="cpu")
+    path = str(tmp_path / "training_profile.json")
+
+    dumped = []
+    for iteration in range(1, 11):
+        run_phases(profiler, "render", 1)
+        if profiler.maybe_dump(path, iteration):
+            dumped.append(iteration)
+    assert dumped == [4, 8]
+
+    with open(path) as f:
+        report = json.load(f)
+    assert report["iteration"] == 8
+    assert report["window"] == 4
+    assert set(report["phases"]) == {"render"}
+    assert report["phases"]["render"]["count"] == 4
+    assert report["phases"]["render"]["p90_ms"] == pytest.approx(5.0)
+    assert not (tmp_path / "training_profile.json.tmp").exists()
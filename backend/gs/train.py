@@ -1,7 +1,7 @@
 import os
 import torch
 from random import randint
-from utils.loss_utils import l1_loss, ssim
+from utils.loss_utils import l1_loss, fast_ssim
 from gaussian_renderer import render
 import sys
 from scene import Scene, GaussianModel
@@ -11,6 +11,10 @@ from tqdm import tqdm
 from utils.image_utils import psnr
 from argparse import ArgumentParser, Namespace
 from arguments import ModelParams, PipelineParams, OptimizationParams
+from utils.checkpoint_utils import CheckpointManager, PreemptionHandler, PREEMPTED_EXIT_CODE, load_checkpoint
+from utils.profiler_utils import TrainingProfiler
+from utils.convergence_utils import ConvergenceMonitor
+from utils.viewer_utils import ViewerScheduler
 from splatviz_network import SplatvizNetworkWs
 import copy
 import traceback
@@ -24,78 +28,203 @@ import math
 import copy
 
 
-def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, ip, port):
+# Options of training() that are read straight from the parsed command line (see training_options)
+TRAINING_OPTIONS = ("test_iterations", "save_iterations", "checkpoint_iterations", "start_checkpoint", "debug_from", "ip", "port",
+                    "checkpoint_keep", "checkpoint_interval", "fast_loop", "loss_readback_interval", "profile", "profile_window",
+                    "viewer_interval_ms", "viewer_interval_iters")
+
+
+def training_options(args):
+    """Keyword arguments for training() from parsed arguments; options missing from args keep their defaults."""
+    return {name: getattr(args, name) for name in TRAINING_OPTIONS if hasattr(args, name)}
+
+
+def training(dataset, opt, pipe, *, test_iterations=(), save_iterations=(), checkpoint_iterations=(), start_checkpoint=None, debug_from=-1,
+             ip="127.0.0.1", port=6009, checkpoint_keep=0, checkpoint_interval=0, fast_loop=False, loss_readback_interval=10,
+             profile=False, profile_window=200, viewer_interval_ms=50, viewer_interval_iters=0):
     first_iter = 0
     gaussians = GaussianModel(dataset.sh_degree)
     scene = Scene(dataset, gaussians)
     gaussians.training_setup(opt)
-    if checkpoint:
-        (model_params, first_iter) = torch.load(checkpoint)
+    if start_checkpoint:
+        (model_params, first_iter) = load_checkpoint(start_checkpoint)
         gaussians.restore(model_params, opt)
+    checkpoint_manager = CheckpointManager(scene.model_path, checkpoint_keep)
+    # SIGTERM (cancel, preemption) stops at the next iteration boundary with a checkpoint
+    preemption = PreemptionHandler()
+    preempted = False
 
     bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
     background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
 
-    iter_start = torch.cuda.Event(enable_timing = True)
-    iter_end = torch.cuda.Event(enable_timing = True)
+    profiler = TrainingProfiler(enabled=profile, window=profile_window)
+
+    # Membership tests run every iteration, so look them up in sets
+    checkpoint_iterations = set(checkpoint_iterations)
 
     viewpoint_stack = scene.getTrainCameras().copy()
     ema_loss_for_log = 0.0
+    # Convergence monitor: scores a subset of held-out cameras and ends training early once PSNR stops improving
+    monitor = None
+    if opt.early_stop:
+        eval_cameras, camera_split = (scene.getTestCameras(), "test") if scene.getTestCameras() else (scene.getTrainCameras(), "train")
+        monitor = ConvergenceMonitor(eval_cameras, camera_split, opt.convergence_interval, opt.convergence_min_gain,
+                                     opt.convergence_patience, opt.convergence_start, opt.convergence_cameras)
+    convergence_path = os.path.join(scene.model_path, "convergence.json")
+    last_iteration = opt.iterations
+    densify_until_iter = opt.densify_until_iter
+    # In fast loop mode the EMA stays on the device and is only read back every loss_readback_interval iterations
+    ema_loss = torch.zeros((), device="cuda")
     progress_bar = tqdm(range(first_iter, opt.iterations), desc="Training progress")
     first_iter += 1
     network = SplatvizNetworkWs(ip, port)
     network.start_server_in_thread()  # 启动WebSocket服务器
+    profile_path = os.path.join(scene.model_path, "training_profile.json")
+
+    def viewer_stats():
+        stats = {"gaussian_budget": gaussians.gaussian_budget}
+        if profiler.enabled:
+            stats["profile"] = profiler.summary(block=False)
+        return stats
+
+    # Viewer frames are rendered from parameter snapshots on a background thread
+    viewer = ViewerScheduler(network, pipe, render, background, opt, viewer_interval_ms, viewer_interval_iters)
+    loop_start = time.perf_counter()
     for iteration in range(first_iter, opt.iterations + 1):
-        network.render_and_respond_async(pipe, gaussians, ema_loss_for_log, render, background, iteration, opt)
+        with profiler.phase("viewer"):
+            viewer.step(gaussians, ema_loss_for_log, iteration, extra_stats=viewer_stats)
         gaussians.update_learning_rate(iteration)
         if iteration % 1000 == 0:
             gaussians.oneupSHdegree()
-        if not viewpoint_stack:
-            viewpoint_stack = scene.getTrainCameras().copy()
-        viewpoint_cam = viewpoint_stack.pop(randint(0, len(viewpoint_stack)-1))
+        batch_cams = []
+        for _ in range(opt.batch_size):
+            if not viewpoint_stack:
+                viewpoint_stack = scene.getTrainCameras().copy()
+            batch_cams.append(viewpoint_stack.pop(randint(0, len(viewpoint_stack)-1)))
         # Render
         if (iteration - 1) == debug_from:
             pipe.debug = True
-        bg = torch.rand((3), device="cuda") if opt.random_background else background
-        render_pkg = render(viewpoint_cam, gaussians, pipe, bg)
-        image, viewspace_point_tensor, visibility_filter, radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
-        gt_image = viewpoint_cam.original_image.cuda()
-        Ll1 = l1_loss(image, gt_image)
-        ssim_value = ssim(image, gt_image)
-        loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
-        loss.backward()
+        # Each view is backpropagated on its own so only one graph is alive; gradients accumulate into the batch average
+        batch_loss = 0.0
+        view_stats = []
+        for viewpoint_cam in batch_cams:
+            with profiler.phase("render"):
+                bg = torch.rand((3), device="cuda") if opt.random_background else background
+                render_pkg = render(viewpoint_cam, gaussians, pipe, bg)
+                image, viewspace_point_tensor, view_visibility, view_radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
+            with profiler.phase("loss"):
+                gt_image = viewpoint_cam.original_image.cuda()
+                Ll1 = l1_loss(image, gt_image)
+                ssim_value = fast_ssim(image, gt_image)
+                view_loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
+            with profiler.phase("backward"):
+                (view_loss / opt.batch_size).backward()
+            batch_loss = batch_loss + view_loss.detach()
+            view_stats.append((viewspace_point_tensor, view_visibility, view_radii))
+        loss = batch_loss / opt.batch_size
+        visibility_filter = view_stats[0][1]
+        radii = view_stats[0][2]
+        for _, view_visibility, view_radii in view_stats[1:]:
+            visibility_filter = visibility_filter | view_visibility
+            radii = torch.maximum(radii, view_radii)
 
         with torch.no_grad():
-            ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log        
+            if fast_loop:
+                ema_loss.mul_(0.6).add_(loss.detach(), alpha=0.4)
+                if iteration % loss_readback_interval == 0:
+                    ema_loss_for_log = ema_loss.item()
+                    progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}"})
+            else:
+                ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log
+                if iteration % 10 == 0:
+                    progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}"})
             if iteration % 10 == 0:
-                progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}"})
                 progress_bar.update(10)
-            if iteration == opt.iterations:
+            if iteration == last_iteration:
                 progress_bar.close()       
                 print("\n[ITER {}] Saving Gaussians".format(iteration))
-                scene.save(iteration)
-            if iteration < opt.densify_until_iter:
-                # Keep track of max radii in image-space for pruning
-                gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
-                gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
-
-                if iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0:
-                    size_threshold = 20 if iteration > opt.opacity_reset_interval else None
-                    gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
-                
-                if iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter):
-                    gaussians.reset_opacity()
+                with profiler.phase("checkpoint"):
+                    scene.save(iteration, checkpoint_manager)
+            # Score before this iteration's densification and opacity reset, never a model whose opacities were just reset
+            converging = False
+            if monitor is not None and iteration < last_iteration and monitor.should_evaluate(iteration):
+                with profiler.phase("eval"):
+                    converged = monitor.evaluate(iteration, lambda camera: render(camera, gaussians, pipe, background)["render"])
+                if converged:
+                    if iteration < densify_until_iter:
+                        # Converged: this iteration's densification is the last one (in place of the scheduled one, whose
+                        # gradient statistics it would otherwise find cleared), then a short tail lets the new points settle
+                        converging = True
+                        last_iteration = min(opt.iterations, iteration + opt.convergence_tail)
+                    else:
+                        last_iteration = iteration + 1
+                    monitor.stop_iteration = last_iteration
+                latest = monitor.history[-1]
+                print("\n[Convergence] iteration {} psnr {:.3f} ssim {:.4f} gain_per_1k {} decision={} stop_iteration={}".format(
+                    iteration, latest["psnr"], latest["ssim"], "n/a" if latest["gain_per_1k"] is None else "{:.4f}".format(latest["gain_per_1k"]),
+                    monitor.decision, last_iteration))
+                monitor.dump(convergence_path)
+            if iteration < densify_until_iter:
+                with profiler.phase("densify"):
+                    # Keep track of max radii in image-space for pruning
+                    gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
+                    for viewspace_point_tensor, view_visibility, _ in view_stats:
+                        gaussians.add_densification_stats(viewspace_point_tensor, view_visibility, grad_scale=opt.batch_size)
+
+                    if converging or (iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0):
+                        size_threshold = 20 if iteration > opt.opacity_reset_interval else None
+                        gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
+
+                    if not converging and (iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter)):
+                        gaussians.reset_opacity()
+                        if monitor is not None:
+                            monitor.note_opacity_reset(iteration)
+                if converging:
+                    densify_until_iter = iteration
 
             # Optimizer step
-            if iteration < opt.iterations:
+            if iteration < last_iteration:
                 if gaussians.optimizer is not None:
-                    gaussians.optimizer.step()
-                    gaussians.optimizer.zero_grad(set_to_none = True)
+                    with profiler.phase("optimizer"):
+                        if opt.sparse_adam:
+                            gaussians.optimizer.step(visibility=visibility_filter)
+                        else:
+                            gaussians.optimizer.step()
+                        gaussians.optimizer.zero_grad(set_to_none = True)
 
-            if (iteration in checkpoint_iterations):
+            if (iteration in checkpoint_iterations) or (checkpoint_interval > 0 and iteration % checkpoint_interval == 0):
                 print("\n[ITER {}] Saving Checkpoint".format(iteration))
-                torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
-            torch.cuda.synchronize()
+                with profiler.phase("checkpoint"):
+                    checkpoint_manager.save_checkpoint(gaussians, iteration)
+            if preemption.requested and iteration < last_iteration:
+                # Preempted: checkpoint this iteration and end the loop here; the job resumes from it
+                print("\n[ITER {}] Saving Checkpoint before exit".format(iteration))
+                with profiler.phase("checkpoint"):
+                    checkpoint_manager.save_checkpoint(gaussians, iteration)
+                last_iteration = iteration
+                preempted = True
+            profiler.maybe_dump(profile_path, iteration)
+            if iteration == last_iteration:
+                break
+            if not fast_loop:
+                torch.cuda.synchronize()
+    torch.cuda.synchronize()
+    loop_time = time.perf_counter() - loop_start
+    num_iterations = last_iteration - first_iter + 1
+    print("\n[Training loop] {} iterations in {:.2f} s ({:.2f} it/s, {:.2f} views/s, batch_size={}, fast_loop={})".format(
+        num_iterations, loop_time, num_iterations / loop_time, num_iterations * opt.batch_size / loop_time, opt.batch_size, fast_loop))
+    print("[Training memory] peak {:.1f} MB, {} Gaussians, {} bytes/Gaussian (mixed_precision={})".format(
+        torch.cuda.max_memory_allocated() / 2**20, gaussians.num_gaussians, gaussians.bytes_per_gaussian(), opt.mixed_precision))
+    viewer.close()
+    viewer_summary = viewer.summary()
+    print("[Viewer] {} frames ({:.2f} fps, {:.1f} ms/frame), training-thread overhead {:.1f} ms ({:.2f}% of the loop), {:.1f} MB snapshotted".format(
+        viewer_summary["frames"], viewer_summary["fps"], viewer_summary["avg_render_ms"], viewer_summary["training_overhead_ms"],
+        viewer_summary["training_overhead_pct"], viewer_summary["snapshot_mb"]))
+    profiler.dump(profile_path, last_iteration)
+    checkpoint_manager.close()
+    preemption.close()
+    if preempted:
+        sys.exit(PREEMPTED_EXIT_CODE)
     
 
 def prepare_output_and_logger(args):    
@@ -122,6 +251,14 @@ def parse_arguments():
     parser.add_argument('--disable_viewer', action='store_true', default=False)
     parser.add_argument("--checkpoint_iterations", nargs="+", type=int, default=[])
     parser.add_argument("--start_checkpoint", type=str, default = None)
+    parser.add_argument("--checkpoint_keep", type=int, default=0)
+    parser.add_argument("--checkpoint_interval", type=int, default=0)
+    parser.add_argument("--fast_loop", action="store_true", default=False)
+    parser.add_argument("--loss_readback_interval", type=int, default=10)
+    parser.add_argument("--profile", action="store_true", default=False)
+    parser.add_argument("--profile_window", type=int, default=200)
+    parser.add_argument("--viewer_interval_ms", type=float, default=50)
+    parser.add_argument("--viewer_interval_iters", type=int, default=0)
     
     args = parser.parse_args(sys.argv[1:])
     args.save_iterations.append(args.iterations)
@@ -138,7 +275,7 @@ if __name__ == "__main__":
 
     try:
         safe_state(args.quiet)
-        training(lp.extract(args), op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from, args.ip, args.port)
+        training(lp.extract(args), op.extract(args), pp.extract(args), **training_options(args))
         
     except Exception as e:
         # Create a detailed error report
@@ -1,17 +1,11 @@
 import os
-import torch
 import sys
 import uuid
 import traceback
-from random import randint
-from utils.loss_utils import l1_loss, ssim
-from gaussian_renderer import render
-from scene import Scene, GaussianModel
 from utils.general_utils import safe_state
-from tqdm import tqdm
 from argparse import ArgumentParser, Namespace
 from arguments import ModelParams, PipelineParams, OptimizationParams
-from splatviz_network import SplatvizNetworkWs
+from train import training as run_training, training_options
 
 
 class GaussianTrainer:
@@ -70,6 +64,14 @@ class GaussianTrainer:
         parser.add_argument('--disable_viewer', action='store_true', default=False)
         parser.add_argument("--checkpoint_iterations", nargs="+", type=int, default=[])
         parser.add_argument("--start_checkpoint", type=str, default=None)
+        parser.add_argument("--checkpoint_keep", type=int, default=0)
+        parser.add_argument("--checkpoint_interval", type=int, default=0)
+        parser.add_argument("--fast_loop", action="store_true", default=False)
+        parser.add_argument("--loss_readback_interval", type=int, default=10)
+        parser.add_argument("--profile", action="store_true", default=False)
+        parser.add_argument("--profile_window", type=int, default=200)
+        parser.add_argument("--viewer_interval_ms", type=float, default=50)
+        parser.add_argument("--viewer_interval_iters", type=int, default=0)
         
         args = parser.parse_args(sys.argv[1:])
         args.save_iterations.append(args.iterations)
@@ -116,18 +118,7 @@ class GaussianTrainer:
         try:
             safe_state(self.args.quiet)
 
-            self.training(
-                self.model_params, 
-                self.opt_params, 
-                self.pipeline_params, 
-                self.args.test_iterations, 
-                self.args.save_iterations, 
-                self.args.checkpoint_iterations, 
-                self.args.start_checkpoint, 
-                self.args.debug_from, 
-                self.args.ip, 
-                self.args.port
-            )
+            self.training(self.model_params, self.opt_params, self.pipeline_params, **training_options(self.args))
 
             # 训练完成
             print("\nTraining complete.")
@@ -152,98 +143,17 @@ class GaussianTrainer:
             
             return False
 
-    def training(self, dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, ip, port):
+    def training(self, dataset, opt, pipe, **options):
         """
-        训练过程的核心实现
-        
+        训练过程的核心实现，与 train.py 共用同一个训练循环
+
         Args:
             dataset: 数据集参数
             opt: 优化参数
             pipe: 渲染管道参数
-            testing_iterations: 测试迭代次数列表
-            saving_iterations: 保存模型的迭代次数列表
-            checkpoint_iterations: 保存检查点的迭代次数列表
-            checkpoint: 起始检查点路径
-            debug_from: 开始调试的迭代次数
-            ip: WebSocket服务器IP
-            port: WebSocket服务器端口
+            **options: train.training 的关键字参数，如 test_iterations、start_checkpoint、ip、port、fast_loop、profile 等
         """
-        first_iter = 0
-        gaussians = GaussianModel(dataset.sh_degree)
-        scene = Scene(dataset, gaussians)
-        gaussians.training_setup(opt)
-        if checkpoint:
-            (model_params, first_iter) = torch.load(checkpoint)
-            gaussians.restore(model_params, opt)
-
-        bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
-        background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
-
-        iter_start = torch.cuda.Event(enable_timing=True)
-        iter_end = torch.cuda.Event(enable_timing=True)
-
-        viewpoint_stack = scene.getTrainCameras().copy()
-        ema_loss_for_log = 0.0
-        progress_bar = tqdm(range(first_iter, opt.iterations), desc="Training progress")
-        first_iter += 1
-        network = SplatvizNetworkWs()
-        
-        for iteration in range(first_iter, opt.iterations + 1):
-            network.render_and_respond_async(pipe, gaussians, ema_loss_for_log, render, background, iteration, opt)
-            gaussians.update_learning_rate(iteration)
-            if iteration % 1000 == 0:
-                gaussians.oneupSHdegree()
-            if not viewpoint_stack:
-                viewpoint_stack = scene.getTrainCameras().copy()
-            viewpoint_cam = viewpoint_stack.pop(randint(0, len(viewpoint_stack)-1))
-            # 渲染
-            if (iteration - 1) == debug_from:
-                pipe.debug = True
-            bg = torch.rand((3), device="cuda") if opt.random_background else background
-            render_pkg = render(viewpoint_cam, gaussians, pipe, bg)
-            image, viewspace_point_tensor, visibility_filter, radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
-            gt_image = viewpoint_cam.original_image.cuda()
-            Ll1 = l1_loss(image, gt_image)
-            ssim_value = ssim(image, gt_image)
-            loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
-            loss.backward()
-
-            with torch.no_grad():
-                ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log        
-                if iteration % 10 == 0:
-                    progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}"})
-                    progress_bar.update(10)
-                if iteration == opt.iterations:
-                    progress_bar.close()       
-                    print("\n[ITER {}] Saving Gaussians".format(iteration))
-                    scene.save(iteration)
-                if iteration < opt.densify_until_iter:
-                    # 跟踪图像空间中的最大半径以进行修剪
-                    gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
-                    gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
-
-                    if iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0:
-                        size_threshold = 20 if iteration > opt.opacity_reset_interval else None
-                        gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
-                    
-                    if iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter):
-                        gaussians.reset_opacity()
-
-                # 优化器步骤
-                if iteration < opt.iterations:
-                    if gaussians.optimizer is not None:
-                        gaussians.optimizer.step()
-                        gaussians.optimizer.zero_grad(set_to_none=True)
-
-                if (iteration in checkpoint_iterations):
-                    print("\n[ITER {}] Saving Checkpoint".format(iteration))
-                    torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
-
-                iter_end.record(torch.cuda.current_stream())
-                torch.cuda.synchronize()
-                iter_time = iter_start.elapsed_time(iter_end)
-                if iteration % 100 == 0:
-                    print(f"Iteration {iteration} took {iter_time:.2f} ms")
+        run_training(dataset, opt, pipe, **options)
 
 
 # 如果作为主程序运行，创建训练器并开始训练
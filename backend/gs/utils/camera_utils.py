@@ -1,13 +1,15 @@
 
 
-from scene.cameras import Camera
+import os
+from scene.cameras import Camera, CameraSet
 import numpy as np
-from utils.general_utils import PILtoTorch
+import torch
+from utils.general_utils import PILtoTorch, composite_on_background
 from utils.graphics_utils import fov2focal
 
 WARNED = False
 
-def loadCam(args, id, cam_info, resolution_scale):
+def image_resolution(args, cam_info, resolution_scale):
     orig_w, orig_h = cam_info.image.size
 
     if args.resolution in [1, 2, 4, 8]:
@@ -28,8 +30,42 @@ def loadCam(args, id, cam_info, resolution_scale):
 
         scale = float(global_down) * float(resolution_scale)
         resolution = (int(orig_w / scale), int(orig_h / scale))
+    return resolution
+
+def decode_image(cam_info):
+    """ The camera's PIL image, composited onto its background if the scene loader deferred that """
+    if getattr(cam_info, "background", None) is None:
+        return cam_info.image
+    return composite_on_background(cam_info.image, cam_info.background)
 
-    resized_image_rgb = PILtoTorch(cam_info.image, resolution)
+def load_resized_image(cam_info, resolution, cache_dir=None):
+    """
+    Resized image as a (C, H, W) float tensor in [0, 1], like PILtoTorch. With a cache
+    directory the decoded and resized pixels are kept there as uint8 .npy files, so runs
+    that share the directory skip decoding and resizing (scene loaders open images lazily
+    when a cache is set, so a cached image is never decoded).
+    """
+    if not cache_dir:
+        return PILtoTorch(decode_image(cam_info), resolution)
+    cache_file = os.path.join(cache_dir, "{}_{}x{}.npy".format(cam_info.image_name, resolution[0], resolution[1]))
+    if os.path.exists(cache_file):
+        pixels = np.load(cache_file)
+    else:
+        pixels = np.array(decode_image(cam_info).resize(resolution))
+        # Written under a unique name and renamed, so concurrent runs never read a partial file
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        with open(tmp_file, "wb") as f:
+            np.save(f, pixels)
+        os.replace(tmp_file, cache_file)
+    image = torch.from_numpy(pixels) / 255.0
+    if len(image.shape) == 3:
+        return image.permute(2, 0, 1)
+    return image.unsqueeze(dim=-1).permute(2, 0, 1)
+
+def loadCam(args, id, cam_info, resolution_scale):
+    resolution = image_resolution(args, cam_info, resolution_scale)
+    resized_image_rgb = load_resized_image(cam_info, resolution, getattr(args, "dataset_cache", None))
 
     gt_image = resized_image_rgb[:3, ...]
     loaded_mask = None
@@ -40,7 +76,8 @@ def loadCam(args, id, cam_info, resolution_scale):
     return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T, 
                   FoVx=cam_info.FovX, FoVy=cam_info.FovY, 
                   image=gt_image, gt_alpha_mask=loaded_mask,
-                  image_name=cam_info.image_name, uid=id, data_device=args.data_device)
+                  image_name=cam_info.image_name, uid=id, data_device=args.data_device,
+                  build_transforms=False)
 
 def cameraList_from_camInfos(cam_infos, resolution_scale, args):
     camera_list = []
@@ -48,7 +85,8 @@ def cameraList_from_camInfos(cam_infos, resolution_scale, args):
     for id, c in enumerate(cam_infos):
         camera_list.append(loadCam(args, id, c, resolution_scale))
 
-    return camera_list
+    # Transforms for the whole list are built in one batched computation
+    return CameraSet(camera_list)
 
 def camera_to_JSON(id, camera : Camera):
     Rt = np.zeros((4, 4))
@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import queue
+import signal
+import threading
+import traceback
+import torch
+from torch import nn
+
+# Exit status of a run that stopped on SIGTERM after writing its checkpoint (128 + SIGTERM, as the shell reports it)
+PREEMPTED_EXIT_CODE = 143
+
+
+class CheckpointManager:
+    """
+    Writes training checkpoints and point clouds off the training thread.
+
+    A save only snapshots the model into reusable host buffers (pinned when CUDA is
+    available) with non-blocking copies queued on the current stream. A background
+    writer waits for those copies, serializes exact-size copies of them to a temporary
+    file and renames it into place, so a partially written checkpoint is never visible. Only the newest
+    `keep_last` checkpoints are kept (0 keeps all of them).
+    """
+
+    CHECKPOINT_PATTERN = re.compile(r"^chkpnt(\d+)\.pth$")
+
+    def __init__(self, model_path, keep_last=0):
+        self.model_path = model_path
+        self.keep_last = keep_last
+        self._pin = torch.cuda.is_available()
+        self._buffers = {}
+        self._jobs = queue.Queue()
+        self._writer = threading.Thread(target=self._run_writer, daemon=True)
+        self._writer.start()
+
+    def checkpoint_path(self, iteration):
+        return os.path.join(self.model_path, "chkpnt" + str(iteration) + ".pth")
+
+    def save_checkpoint(self, gaussians, iteration):
+        """Snapshot gaussians.capture() and write it to chkpnt<iteration>.pth in the background."""
+        # Host buffers are reused between saves, so the previous write must be done with them
+        self._jobs.join()
+        snapshot = self._snapshot(gaussians.capture(), "capture")
+        ready = self._record_event()
+        path = self.checkpoint_path(iteration)
+
+        def write():
+            self._wait(ready)
+            # torch.save writes a view's whole storage, so serialize exact-size copies rather than views into the staging buffers
+            self._atomic_save((self._exact_copy(snapshot), iteration), path)
+            self._remove_stale_checkpoints()
+            # Only reported once the file is complete, so the backend can resume from it
+            print("[Checkpoint] iteration {} {}".format(iteration, path), flush=True)
+        self._jobs.put(write)
+        return path
+
+    def save_ply(self, gaussians, path):
+        """Snapshot the attributes written by GaussianModel.save_ply and write the PLY in the background."""
+        self._jobs.join()
+        attributes = self._snapshot(gaussians.ply_attributes(), "ply")
+        ready = self._record_event()
+        attribute_names = gaussians.construct_list_of_attributes()
+
+        def write():
+            self._wait(ready)
+            tmp_path = path + ".tmp"
+            gaussians.write_ply(tmp_path, [t.numpy() for t in attributes], attribute_names)
+            os.replace(tmp_path, path)
+        self._jobs.put(write)
+        return path
+
+    def flush(self):
+        """Block until every queued write has reached disk."""
+        self._jobs.join()
+
+    def close(self):
+        self.flush()
+        self._jobs.put(None)
+        self._writer.join()
+
+    def _snapshot(self, obj, key):
+        if isinstance(obj, torch.Tensor):
+            buf = self._host_buffer(key, obj)
+            buf.copy_(obj.detach(), non_blocking=self._pin)
+            if isinstance(obj, nn.Parameter):
+                return nn.Parameter(buf, requires_grad=obj.requires_grad)
+            return buf
+        if isinstance(obj, dict):
+            return {k: self._snapshot(v, f"{key}.{k}") for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._snapshot(v, f"{key}.{i}") for i, v in enumerate(obj))
+        return obj
+
+    @classmethod
+    def _exact_copy(cls, obj):
+        if isinstance(obj, torch.Tensor):
+            copy = obj.detach().clone()
+            if isinstance(obj, nn.Parameter):
+                return nn.Parameter(copy, requires_grad=obj.requires_grad)
+            return copy
+        if isinstance(obj, dict):
+            return {k: cls._exact_copy(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(cls._exact_copy(v) for v in obj)
+        return obj
+
+    def _host_buffer(self, key, tensor):
+        storage = self._buffers.get(key)
+        numel = tensor.numel()
+        if storage is None or storage.dtype != tensor.dtype or storage.numel() < numel:
+            # Leave headroom so that densification does not force a reallocation every save
+            capacity = numel + numel // 4
+            storage = torch.empty(capacity, dtype=tensor.dtype, pin_memory=self._pin)
+            self._buffers[key] = storage
+        return storage[:numel].view(tensor.shape)
+
+    def _record_event(self):
+        if not self._pin:
+            return None
+        event = torch.cuda.Event()
+        event.record(torch.cuda.current_stream())
+        return event
+
+    @staticmethod
+    def _wait(event):
+        if event is not None:
+            event.synchronize()
+
+    @staticmethod
+    def _atomic_save(obj, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        torch.save(obj, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _remove_stale_checkpoints(self):
+        if self.keep_last <= 0:
+            return
+        checkpoints = []
+        for fname in os.listdir(self.model_path):
+            match = self.CHECKPOINT_PATTERN.match(fname)
+            if match:
+                checkpoints.append((int(match.group(1)), fname))
+        checkpoints.sort()
+        for _, fname in checkpoints[:-self.keep_last]:
+            try:
+                os.remove(os.path.join(self.model_path, fname))
+            except OSError:
+                pass
+
+    def _run_writer(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._jobs.task_done()
+                return
+            try:
+                job()
+            except Exception:
+                print("[CheckpointManager] Background write failed")
+                traceback.print_exc()
+            finally:
+                self._jobs.task_done()
+
+
+class PreemptionHandler:
+    """
+    Turns SIGTERM into a request to stop at the next iteration boundary, so the training
+    loop can write a checkpoint before exiting instead of losing its progress. A second
+    SIGTERM exits right away. Signal handlers can only be installed from the main thread;
+    elsewhere the handler is inert.
+    """
+
+    def __init__(self):
+        self.requested = False
+        self._previous = None
+        if threading.current_thread() is threading.main_thread():
+            self._previous = signal.signal(signal.SIGTERM, self._handle)
+
+    def _handle(self, signum, frame):
+        if self.requested:
+            sys.exit(PREEMPTED_EXIT_CODE)
+        print("\n[Preemption] SIGTERM received, checkpointing at the end of this iteration", flush=True)
+        self.requested = True
+
+    def close(self):
+        if self._previous is not None:
+            signal.signal(signal.SIGTERM, self._previous)
+            self._previous = None
+
+
+def load_checkpoint(path, device="cuda"):
+    """
+    Load a checkpoint written by torch.save((gaussians.capture(), iteration)) or CheckpointManager.
+    Model tensors are moved to `device`; GaussianModel.restore places the optimizer state.
+    """
+    model_params, iteration = torch.load(path, map_location="cpu", weights_only=False)
+    model_params = list(model_params)
+    for i, value in enumerate(model_params):
+        if isinstance(value, nn.Parameter):
+            model_params[i] = nn.Parameter(value.data.to(device), requires_grad=value.requires_grad)
+        elif isinstance(value, torch.Tensor):
+            model_params[i] = value.to(device)
+    return tuple(model_params), iteration
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import torch
+from utils.image_utils import psnr
+from utils.loss_utils import fast_ssim
+
+
+class ConvergenceMonitor:
+    """
+    Decides when training has stopped improving.
+
+    Every `interval` iterations (from `start_iteration` on) a fixed, evenly spaced subset of
+    at most `max_cameras` held-out cameras is rendered and scored with PSNR/SSIM. The PSNR
+    gain is normalized to dB per 1k iterations; once it stays below `min_gain` for
+    `patience` consecutive evaluations the monitor reports convergence. The first evaluation
+    after an opacity reset scores a model still recovering from it, so its drop is recorded
+    but neither counts as a stall nor clears earlier ones.
+    """
+
+    def __init__(self, cameras, camera_split="test", interval=1000, min_gain=0.05, patience=2, start_iteration=3000, max_cameras=8):
+        step = max(len(cameras) / max_cameras, 1.0)
+        self.cameras = [cameras[int(i * step)] for i in range(min(max_cameras, len(cameras)))]
+        self.camera_split = camera_split
+        self.interval = interval
+        self.min_gain = min_gain
+        self.patience = patience
+        self.start_iteration = start_iteration
+        self.history = []
+        self.stalled = 0
+        self.decision = "continue"
+        self.converged_iteration = None
+        self.stop_iteration = None
+        self._reset_since_last = False
+
+    def should_evaluate(self, iteration):
+        return bool(self.cameras) and iteration >= self.start_iteration and iteration % self.interval == 0 and self.converged_iteration is None
+
+    def note_opacity_reset(self, iteration):
+        self._reset_since_last = True
+
+    @torch.no_grad()
+    def evaluate(self, iteration, render_image):
+        """
+        Score the camera subset with `render_image(camera) -> (3, H, W)` and update the decision.
+        Returns True the first time convergence is detected.
+        """
+        psnr_sum = 0.0
+        ssim_sum = 0.0
+        for camera in self.cameras:
+            image = torch.clamp(render_image(camera), 0.0, 1.0)
+            gt_image = torch.clamp(camera.original_image.to(image.device), 0.0, 1.0)
+            psnr_sum += psnr(image, gt_image).mean().double()
+            ssim_sum += fast_ssim(image, gt_image).double()
+        entry = {
+            "iteration": iteration,
+            "psnr": float(psnr_sum) / len(self.cameras),
+            "ssim": float(ssim_sum) / len(self.cameras),
+            "gain_per_1k": None,
+        }
+        if self.history:
+            previous = self.history[-1]
+            entry["gain_per_1k"] = (entry["psnr"] - previous["psnr"]) * 1000.0 / (iteration - previous["iteration"])
+            if self._reset_since_last:
+                entry["after_opacity_reset"] = True
+            else:
+                self.stalled = self.stalled + 1 if entry["gain_per_1k"] < self.min_gain else 0
+        self._reset_since_last = False
+        self.history.append(entry)
+        if self.stalled >= self.patience:
+            self.decision = "stop"
+            self.converged_iteration = iteration
+            return True
+        return False
+
+    def report(self):
+        return {
+            "decision": self.decision,
+            "camera_split": self.camera_split,
+            "num_cameras": len(self.cameras),
+            "interval": self.interval,
+            "min_gain": self.min_gain,
+            "patience": self.patience,
+            "converged_iteration": self.converged_iteration,
+            "stop_iteration": self.stop_iteration,
+            "latest": self.history[-1] if self.history else None,
+            "history": self.history,
+        }
+
+    def dump(self, path):
+        report = self.report()
+        report["timestamp"] = time.time()
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=4)
+        os.replace(tmp_path, path)
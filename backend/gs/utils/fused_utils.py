@@ -0,0 +1,89 @@
+import torch
+
+# Row/column indices of the upper triangle, in strip_symmetric() order
+_COV_ROWS = (0, 0, 0, 1, 1, 2)
+_COV_COLS = (0, 1, 2, 1, 2, 2)
+
+
+class ActivationBuffers:
+    """
+    Preallocated outputs for fused_activations(), reallocated only when the number of
+    Gaussians changes. Outputs handed to the rasterizer share storage with these buffers,
+    so a second forward before the previous backward is caught by autograd's version check.
+    """
+
+    def __init__(self):
+        self.scaling = None
+        self.rotation = None
+        self.opacity = None
+
+    def get(self, scaling, rotation, opacity):
+        if self.scaling is None or self.scaling.shape != scaling.shape or self.scaling.device != scaling.device:
+            self.scaling = torch.empty_like(scaling, memory_format=torch.contiguous_format)
+            self.rotation = torch.empty_like(rotation, memory_format=torch.contiguous_format)
+            self.opacity = torch.empty_like(opacity, memory_format=torch.contiguous_format)
+        # Fresh aliases, so the buffers themselves never carry autograd history
+        return self.scaling.detach(), self.rotation.detach(), self.opacity.detach()
+
+
+class _FusedActivations(torch.autograd.Function):
+    """ exp(scaling), normalize(rotation) and sigmoid(opacity) written into preallocated buffers """
+
+    @staticmethod
+    def forward(ctx, scaling, rotation, opacity, out_scaling, out_rotation, out_opacity):
+        torch.exp(scaling, out=out_scaling)
+        norm = torch.linalg.vector_norm(rotation, dim=-1, keepdim=True).clamp_min_(1e-12)
+        torch.div(rotation, norm, out=out_rotation)
+        torch.sigmoid(opacity, out=out_opacity)
+        ctx.mark_dirty(out_scaling, out_rotation, out_opacity)
+        ctx.save_for_backward(out_scaling, out_rotation, out_opacity, norm)
+        return out_scaling, out_rotation, out_opacity
+
+    @staticmethod
+    def backward(ctx, grad_scaling, grad_rotation, grad_opacity):
+        scaling, rotation, opacity, norm = ctx.saved_tensors
+        d_scaling = grad_scaling * scaling
+        d_rotation = (grad_rotation - rotation * (rotation * grad_rotation).sum(dim=-1, keepdim=True)) / norm
+        d_opacity = grad_opacity * opacity * (1.0 - opacity)
+        return d_scaling, d_rotation, d_opacity, None, None, None
+
+
+def fused_activations(scaling, rotation, opacity, buffers):
+    """
+    Activated (scaling, rotation, opacity) in one pass, matching torch.exp,
+    torch.nn.functional.normalize and torch.sigmoid, without allocating new outputs.
+    """
+    return _FusedActivations.apply(scaling, rotation, opacity, *buffers.get(scaling, rotation, opacity))
+
+
+class _JoinFeatures(torch.autograd.Function):
+    """ Hand out the contiguous feature tensor that f_dc and f_rest are views of, instead of concatenating them """
+
+    @staticmethod
+    def forward(ctx, features_dc, features_rest, features):
+        ctx.num_dc = features_dc.shape[1]
+        return features.detach()
+
+    @staticmethod
+    def backward(ctx, grad_features):
+        return grad_features[:, :ctx.num_dc], grad_features[:, ctx.num_dc:], None
+
+
+def join_features(features_dc, features_rest, features):
+    return _JoinFeatures.apply(features_dc, features_rest, features)
+
+
+def fused_covariance(scaling, rotation, scaling_modifier=1.0):
+    """
+    Upper triangle of R diag(s^2) R^T from activated scales and unit quaternions, computed
+    directly instead of through build_scaling_rotation(), a batched matmul and strip_symmetric().
+    """
+    r, x, y, z = rotation.unbind(-1)
+    R = torch.stack((
+        1 - 2 * (y * y + z * z), 2 * (x * y - r * z), 2 * (x * z + r * y),
+        2 * (x * y + r * z), 1 - 2 * (x * x + z * z), 2 * (y * z - r * x),
+        2 * (x * z - r * y), 2 * (y * z + r * x), 1 - 2 * (x * x + y * y),
+    ), dim=-1).view(-1, 3, 3)
+    variance = (scaling_modifier * scaling) ** 2
+    weighted = R * variance[:, None, :]
+    return (weighted[:, _COV_ROWS, :] * R[:, _COV_COLS, :]).sum(dim=-1)
@@ -3,6 +3,7 @@ import sys
 from datetime import datetime
 import numpy as np
 import random
+from PIL import Image
 
 def inverse_sigmoid(x):
     return torch.log(x/(1-x))
@@ -15,6 +16,12 @@ def PILtoTorch(pil_image, resolution):
     else:
         return resized_image.unsqueeze(dim=-1).permute(2, 0, 1)
 
+def composite_on_background(image, background):
+    """ Composite an RGBA PIL image onto a constant RGB background in [0, 1]; returns an RGB PIL image """
+    norm_data = np.array(image.convert("RGBA")) / 255.0
+    arr = norm_data[:, :, :3] * norm_data[:, :, 3:4] + background * (1 - norm_data[:, :, 3:4])
+    return Image.fromarray(np.array(arr * 255.0, dtype=np.uint8), "RGB")
+
 def get_expon_lr_func(
     lr_init, lr_final, lr_delay_steps=0, lr_delay_mult=1.0, max_steps=1000000
 ):
@@ -47,3 +47,50 @@ def _ssim(img1, img2, window, window_size, channel, size_average=True):
     else:
         return ssim_map.mean(1).mean(1).mean(1)
 
+# Separable Gaussian windows, keyed by (window_size, channel, device, dtype)
+_window_cache = {}
+
+def _separable_window(window_size, channel, device, dtype):
+    key = (window_size, channel, device, dtype)
+    window = _window_cache.get(key)
+    if window is None:
+        coords = torch.arange(window_size, dtype=torch.float64) - window_size // 2
+        gauss = torch.exp(-coords ** 2 / (2 * 1.5 ** 2))
+        gauss = (gauss / gauss.sum()).to(device=device, dtype=dtype)
+        window_h = gauss.view(1, 1, 1, window_size).expand(channel, 1, 1, window_size).contiguous()
+        window_v = gauss.view(1, 1, window_size, 1).expand(channel, 1, window_size, 1).contiguous()
+        window = (window_h, window_v)
+        _window_cache[key] = window
+    return window
+
+def fast_ssim(img1, img2, window_size=11, size_average=True):
+    """
+    Drop-in replacement for ssim(). The five moment maps (mu1, mu2, E[x^2], E[y^2], E[xy])
+    are filtered in one grouped convolution with a cached separable window instead of
+    five 2D convolutions with a window rebuilt on every call.
+    """
+    channel = img1.size(-3)
+    window_h, window_v = _separable_window(window_size, 5 * channel, img1.device, img1.dtype)
+    pad = window_size // 2
+
+    stacked = torch.cat((img1, img2, img1 * img1, img2 * img2, img1 * img2), dim=-3)
+    filtered = F.conv2d(stacked, window_h, padding=(0, pad), groups=5 * channel)
+    filtered = F.conv2d(filtered, window_v, padding=(pad, 0), groups=5 * channel)
+    mu1, mu2, e11, e22, e12 = torch.split(filtered, channel, dim=-3)
+
+    mu1_sq = mu1.pow(2)
+    mu2_sq = mu2.pow(2)
+    mu1_mu2 = mu1 * mu2
+
+    sigma1_sq = e11 - mu1_sq
+    sigma2_sq = e22 - mu2_sq
+    sigma12 = e12 - mu1_mu2
+
+    C1 = 0.01 ** 2
+    C2 = 0.03 ** 2
+
+    ssim_map = ((2 * mu1_mu2 + C1) * (2 * sigma12 + C2)) / ((mu1_sq + mu2_sq + C1) * (sigma1_sq + sigma2_sq + C2))
+    if size_average:
+        return ssim_map.mean()
+    else:
+        return ssim_map.mean(1).mean(1).mean(1)
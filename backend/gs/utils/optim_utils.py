@@ -0,0 +1,172 @@
+import math
+import torch
+
+LOW_PRECISION_DTYPES = (torch.float16, torch.bfloat16)
+
+STORAGE_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+}
+
+
+def stochastic_round_to_bf16(x):
+    """
+    Round a float32 tensor to bfloat16 stochastically, so that updates smaller than a
+    bfloat16 ulp still move the parameter on average instead of being rounded away.
+    """
+    bits = x.contiguous().view(torch.int32)
+    noise = torch.randint_like(bits, 0, 1 << 16)
+    rounded = (bits + noise) & -65536
+    return rounded.view(torch.float32).to(torch.bfloat16)
+
+
+def cast_update(updated, param):
+    """ Cast a float32 update back to the storage dtype of `param` """
+    if param.dtype == torch.bfloat16:
+        return stochastic_round_to_bf16(updated)
+    return updated.to(param.dtype)
+
+
+class MixedPrecisionAdam(torch.optim.Adam):
+    """
+    Adam for a mix of float32 and reduced-precision parameters.
+
+    float32 parameters go through the regular Adam step. For float16/bfloat16 parameters
+    the moments are stored as `moment_dtype` (bfloat16 by default, since float16 cannot
+    represent squared gradients of typical magnitude), and the update itself is computed
+    in float32 and written back, with stochastic rounding for bfloat16 parameters.
+    """
+
+    # Optimizer state tensors with one row per Gaussian, rewritten by densification and pruning
+    row_state_keys = ("exp_avg", "exp_avg_sq")
+
+    def __init__(self, params, moment_dtype=torch.bfloat16, **kwargs):
+        super().__init__(params, **kwargs)
+        self.moment_dtype = moment_dtype
+
+    def moment_dtype_for(self, param):
+        return self.moment_dtype if param.dtype in LOW_PRECISION_DTYPES else param.dtype
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        # Hide reduced-precision gradients from the regular Adam step and update those rows ourselves
+        pending = []
+        for group in self.param_groups:
+            for param in group["params"]:
+                if param.grad is not None and param.dtype in LOW_PRECISION_DTYPES:
+                    pending.append((group, param, param.grad))
+                    param.grad = None
+        loss = super().step(closure)
+        for group, param, grad in pending:
+            param.grad = grad
+            self._low_precision_update(group, param, grad)
+        return loss
+
+    def _low_precision_update(self, group, param, grad):
+        state = self.state[param]
+        if len(state) == 0:
+            state["step"] = torch.tensor(0.0, dtype=torch.float32)
+            state["exp_avg"] = torch.zeros_like(param, dtype=self.moment_dtype)
+            state["exp_avg_sq"] = torch.zeros_like(param, dtype=self.moment_dtype)
+        beta1, beta2 = group["betas"]
+        state["step"] += 1
+        step = state["step"].item()
+
+        grad = grad.float()
+        if group["weight_decay"] != 0:
+            grad = grad.add(param.float(), alpha=group["weight_decay"])
+        exp_avg = state["exp_avg"].float().mul_(beta1).add_(grad, alpha=1 - beta1)
+        exp_avg_sq = state["exp_avg_sq"].float().mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+
+        bias_correction1 = 1 - beta1 ** step
+        bias_correction2 = 1 - beta2 ** step
+        denom = (exp_avg_sq.sqrt() / math.sqrt(bias_correction2)).add_(group["eps"])
+        updated = param.float().addcdiv_(exp_avg, denom, value=-group["lr"] / bias_correction1)
+
+        param.copy_(cast_update(updated, param))
+        state["exp_avg"].copy_(exp_avg)
+        state["exp_avg_sq"].copy_(exp_avg_sq)
+
+    def load_state_dict(self, state_dict):
+        # Optimizer.load_state_dict casts moments to the parameter dtype; put them back to moment_dtype
+        super().load_state_dict(state_dict)
+        for group in self.param_groups:
+            for param in group["params"]:
+                state = self.state.get(param)
+                if param.dtype in LOW_PRECISION_DTYPES and state:
+                    for key in ("exp_avg", "exp_avg_sq"):
+                        if key in state:
+                            state[key] = state[key].to(self.moment_dtype)
+
+
+class RowSparseAdam(MixedPrecisionAdam):
+    """
+    Adam that only updates the rows selected by a visibility mask.
+
+    Rows outside the mask keep their parameters and moments untouched. Each row carries its
+    own step count in "row_step", so bias correction stays exact for Gaussians that were
+    skipped in earlier iterations. Moments follow the same dtype rules as MixedPrecisionAdam,
+    and every parameter group must have one row per Gaussian.
+    """
+
+    row_state_keys = ("exp_avg", "exp_avg_sq", "row_step")
+
+    @torch.no_grad()
+    def step(self, closure=None, *, visibility=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+        rows = None if visibility is None else torch.nonzero(visibility).squeeze(1)
+        for group in self.param_groups:
+            for param in group["params"]:
+                if param.grad is not None:
+                    self._sparse_update(group, param, rows)
+        return loss
+
+    def load_state_dict(self, state_dict):
+        # Optimizer.load_state_dict casts every state tensor except "step" to its parameter's dtype,
+        # which for a bfloat16 parameter would freeze the per-row step counts; restore them as int32
+        state = {index: dict(param_state) for index, param_state in state_dict["state"].items()}
+        row_steps = {index: param_state.pop("row_step") for index, param_state in state.items() if "row_step" in param_state}
+        super().load_state_dict(dict(state_dict, state=state))
+        params = [param for group in self.param_groups for param in group["params"]]
+        for index, row_step in row_steps.items():
+            param = params[index]
+            self.state[param]["row_step"] = row_step.round().to(device=param.device, dtype=torch.int32)
+
+    def _sparse_update(self, group, param, rows):
+        state = self.state[param]
+        if "exp_avg" not in state:
+            state.setdefault("step", torch.tensor(0.0, dtype=torch.float32))
+            state["exp_avg"] = torch.zeros_like(param, dtype=self.moment_dtype_for(param))
+            state["exp_avg_sq"] = torch.zeros_like(param, dtype=self.moment_dtype_for(param))
+        if "row_step" not in state:
+            # State from a dense optimizer: every row has taken the global number of steps
+            state["row_step"] = torch.full((param.shape[0],), int(state["step"]), dtype=torch.int32, device=param.device)
+        state["step"] += 1
+        if rows is None:
+            rows = torch.arange(param.shape[0], device=param.device)
+        if rows.numel() == 0:
+            return
+        beta1, beta2 = group["betas"]
+
+        grad = param.grad.index_select(0, rows).float()
+        values = param.index_select(0, rows).float()
+        if group["weight_decay"] != 0:
+            grad = grad.add(values, alpha=group["weight_decay"])
+        row_step = state["row_step"].index_select(0, rows) + 1
+        exp_avg = state["exp_avg"].index_select(0, rows).float().mul_(beta1).add_(grad, alpha=1 - beta1)
+        exp_avg_sq = state["exp_avg_sq"].index_select(0, rows).float().mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+
+        shape = (-1,) + (1,) * (param.dim() - 1)
+        bias_correction1 = (1 - torch.pow(beta1, row_step.float())).view(shape)
+        bias_correction2 = (1 - torch.pow(beta2, row_step.float())).view(shape)
+        denom = (exp_avg_sq / bias_correction2).sqrt_().add_(group["eps"])
+        values.addcdiv_(exp_avg / bias_correction1, denom, value=-group["lr"])
+
+        param.index_copy_(0, rows, cast_update(values, param))
+        state["exp_avg"].index_copy_(0, rows, exp_avg.to(state["exp_avg"].dtype))
+        state["exp_avg_sq"].index_copy_(0, rows, exp_avg_sq.to(state["exp_avg_sq"].dtype))
+        state["row_step"].index_copy_(0, rows, row_step)
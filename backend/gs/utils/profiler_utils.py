@@ -0,0 +1,117 @@
+import os
+import json
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import torch
+
+
+class TrainingProfiler:
+    """
+    Per-phase timer for the training loop.
+
+    On CUDA each phase is bracketed by timing events that are resolved lazily, so
+    profiling never forces a device synchronization inside an iteration. On CPU the
+    phases are timed with perf_counter. Samples are kept over a sliding window of
+    the last `window` occurrences of each phase and summarized as percentiles.
+    """
+
+    PHASES = ("viewer", "render", "loss", "backward", "densify", "optimizer", "checkpoint")
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, enabled=True, window=200, device=None):
+        self.enabled = enabled
+        self.window = window
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.use_cuda_events = torch.device(device).type == "cuda"
+        self._samples = {}
+        self._pending = deque()
+
+    def phase(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name):
+        if self.use_cuda_events:
+            start = torch.cuda.Event(enable_timing=True)
+            end = torch.cuda.Event(enable_timing=True)
+            start.record()
+            try:
+                yield
+            finally:
+                end.record()
+                self._pending.append((name, start, end))
+                self._collect(block=False)
+        else:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self._add_sample(name, (time.perf_counter() - start) * 1000.0)
+
+    def _add_sample(self, name, elapsed_ms):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = deque(maxlen=self.window)
+            self._samples[name] = samples
+        samples.append(elapsed_ms)
+
+    def _collect(self, block):
+        # Events complete in submission order, so stop at the first one still in flight
+        while self._pending:
+            name, start, end = self._pending[0]
+            if block:
+                end.synchronize()
+            elif not end.query():
+                break
+            self._pending.popleft()
+            self._add_sample(name, start.elapsed_time(end))
+
+    @staticmethod
+    def _percentile(sorted_samples, q):
+        if len(sorted_samples) == 1:
+            return sorted_samples[0]
+        rank = (len(sorted_samples) - 1) * q / 100.0
+        low = int(rank)
+        high = min(low + 1, len(sorted_samples) - 1)
+        return sorted_samples[low] + (sorted_samples[high] - sorted_samples[low]) * (rank - low)
+
+    def summary(self, block=True):
+        """
+        Return {phase: {"count", "mean_ms", "p50_ms", "p90_ms", "p99_ms"}} over the current window.
+        With block=False, phases still running on the device are left out instead of waited for.
+        """
+        if not self.enabled:
+            return {}
+        self._collect(block=block)
+        result = {}
+        for name in self.PHASES + tuple(n for n in self._samples if n not in self.PHASES):
+            samples = self._samples.get(name)
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            stats = {"count": len(ordered), "mean_ms": sum(ordered) / len(ordered)}
+            for q in self.PERCENTILES:
+                stats[f"p{q}_ms"] = self._percentile(ordered, q)
+            result[name] = stats
+        return result
+
+    def maybe_dump(self, path, iteration):
+        """Dump the report every `window` iterations; returns whether it was written."""
+        if not self.enabled or iteration % self.window != 0:
+            return False
+        self.dump(path, iteration)
+        return True
+
+    def dump(self, path, iteration=None):
+        if not self.enabled:
+            return
+        report = {"iteration": iteration, "window": self.window, "timestamp": time.time(), "phases": self.summary()}
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=4)
+        os.replace(tmp_path, path)
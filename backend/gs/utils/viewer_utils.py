@@ -0,0 +1,221 @@
+import copy
+import threading
+import time
+import traceback
+import torch
+from utils.fused_utils import fused_covariance
+
+
+class GaussianSnapshot:
+    """
+    Render-only copy of a GaussianModel's parameters for the viewer thread.
+
+    The optimizer updates parameters in place, so the viewer cannot simply hold references
+    to them; instead they are copied device-to-device into reusable buffers. A parameter is
+    only copied again when it changed since the previous snapshot, i.e. when it was replaced
+    (densification) or its version counter moved (optimizer step), so a paused model costs
+    nothing. The accessors mirror the ones render() uses on GaussianModel; their activated
+    tensors are computed once per update and shared by every view rendered from it.
+    """
+
+    PARAMS = ("_xyz", "_features_dc", "_features_rest", "_scaling", "_rotation", "_opacity")
+
+    def __init__(self, model):
+        self.scaling_activation = model.scaling_activation
+        self.rotation_activation = model.rotation_activation
+        self.opacity_activation = model.opacity_activation
+        self.covariance_activation = model.covariance_activation
+        self.max_sh_degree = model.max_sh_degree
+        self.active_sh_degree = model.active_sh_degree
+        self.num_gaussians = 0
+        self._buffers = {}
+        self._sources = {}
+        self._cache = {}
+
+    @torch.no_grad()
+    def update(self, model):
+        """Refresh the buffers from `model`; returns the number of bytes copied."""
+        copied = 0
+        self._cache.clear()
+        for name in self.PARAMS:
+            param = getattr(model, name)
+            source = (param.data_ptr(), param._version, param.shape, param.dtype)
+            if self._sources.get(name) == source:
+                continue
+            buffer = self._buffers.get(name)
+            if buffer is None or buffer.shape != param.shape or buffer.dtype != param.dtype or buffer.device != param.device:
+                buffer = torch.empty_like(param, memory_format=torch.contiguous_format)
+                self._buffers[name] = buffer
+            buffer.copy_(param.detach())
+            self._sources[name] = source
+            copied += param.numel() * param.element_size()
+        self.active_sh_degree = model.active_sh_degree
+        self.num_gaussians = model.num_gaussians
+        return copied
+
+    @property
+    def _features_dc(self):
+        return self._buffers["_features_dc"]
+
+    @property
+    def get_xyz(self):
+        return self._buffers["_xyz"]
+
+    def _cached(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+        return value
+
+    @property
+    def get_features(self):
+        features_dc = self._buffers["_features_dc"]
+        return self._cached("features", lambda: torch.cat((features_dc, self._buffers["_features_rest"].to(features_dc.dtype)), dim=1))
+
+    @property
+    def get_scaling(self):
+        return self._cached("scaling", lambda: self.scaling_activation(self._buffers["_scaling"]))
+
+    @property
+    def get_rotation(self):
+        return self._cached("rotation", lambda: self.rotation_activation(self._buffers["_rotation"]))
+
+    @property
+    def get_opacity(self):
+        return self._cached("opacity", lambda: self.opacity_activation(self._buffers["_opacity"]))
+
+    def get_covariance(self, scaling_modifier=1):
+        return self._cached(("covariance", scaling_modifier),
+                            lambda: self.covariance_activation(self.get_scaling, scaling_modifier, self._buffers["_rotation"]))
+
+    def get_fused_activations(self):
+        return self.get_scaling, self.get_rotation, self.get_opacity
+
+    def get_fused_covariance(self, scaling, rotation, scaling_modifier=1):
+        return fused_covariance(scaling, rotation, scaling_modifier)
+
+
+class ViewerScheduler:
+    """
+    Serves viewer frames from a background thread instead of the training loop.
+
+    step() is called once per training iteration. A frame is due when `interval_ms` have
+    passed or `interval_iters` iterations have run since the previous one (whichever comes
+    first; 0 disables a criterion), a render request is pending and the viewer thread is
+    idle. The training thread then only refreshes the GaussianSnapshot, collects `extra_stats()`
+    (read on the training thread, since its sources are not thread-safe), records an event and
+    wakes the viewer thread, which renders on its own CUDA stream after that event. Render,
+    readback and encoding therefore never run on the training thread or its stream, and the
+    time the training thread does spend here is reported as the viewer's overhead.
+    """
+
+    def __init__(self, network, pipe, render, background, opt, interval_ms=50, interval_iters=0):
+        self.network = network
+        # The viewer switches pipeline flags per request; keep that away from the training pipeline
+        self.pipe = copy.copy(pipe)
+        self.render = render
+        self.background = background
+        self.opt = opt
+        self.interval_ms = interval_ms
+        self.interval_iters = interval_iters
+
+        self._stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+        self._snapshot = None
+        # Recorded after each viewer render; the next snapshot update waits for it on the GPU
+        self._render_done = None
+        self._job = None
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+
+        self.frames = 0
+        self.render_s = 0.0
+        self.overhead_s = 0.0
+        self.snapshot_bytes = 0
+        self._start = None
+        self._last_time = 0.0
+        self._last_iteration = 0
+
+        self._thread = threading.Thread(target=self._run, name="viewer", daemon=True)
+        self._thread.start()
+
+    def step(self, gaussians, loss, iteration, extra_stats=None):
+        start = time.perf_counter()
+        if self._start is None:
+            self._start = start
+        try:
+            if not self._idle.is_set() or not self.network.has_render_work():
+                return
+            due_by_time = self.interval_ms <= 0 or (start - self._last_time) * 1000.0 >= self.interval_ms
+            due_by_iters = self.interval_iters > 0 and iteration - self._last_iteration >= self.interval_iters
+            if not (due_by_time or due_by_iters):
+                return
+            if self._snapshot is None:
+                self._snapshot = GaussianSnapshot(gaussians)
+            if self._render_done is not None:
+                # Frame readback no longer synchronizes the viewer thread, so its render may still read the buffers
+                torch.cuda.current_stream().wait_event(self._render_done)
+            self.snapshot_bytes += self._snapshot.update(gaussians)
+            ready = None
+            if self._stream is not None:
+                ready = torch.cuda.Event()
+                ready.record(torch.cuda.current_stream())
+            # The stats sources (e.g. the profiler) are only safe to read on the training thread, so the viewer thread gets a plain dict
+            stats = dict(extra_stats()) if extra_stats is not None else {}
+            self._job = (ready, loss, iteration, stats)
+            self._last_time = start
+            self._last_iteration = iteration
+            self._idle.clear()
+            self._wake.set()
+        finally:
+            self.overhead_s += time.perf_counter() - start
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            ready, loss, iteration, extra_stats = self._job
+            start = time.perf_counter()
+            try:
+                if self._stream is not None:
+                    with torch.cuda.stream(self._stream):
+                        self._stream.wait_event(ready)
+                        self._render_frame(loss, iteration, extra_stats)
+                        render_done = torch.cuda.Event()
+                        render_done.record(self._stream)
+                        self._render_done = render_done
+                else:
+                    self._render_frame(loss, iteration, extra_stats)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.frames += 1
+                self.render_s += time.perf_counter() - start
+                self._idle.set()
+
+    def _render_frame(self, loss, iteration, extra_stats):
+        def stats():
+            return dict(extra_stats, viewer=self.summary())
+        self.network.render_and_respond_async(self.pipe, self._snapshot, loss, self.render, self.background, iteration, self.opt, extra_stats=stats)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self._start if self._start is not None else 0.0
+        return {
+            "frames": self.frames,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "avg_render_ms": self.render_s * 1000.0 / self.frames if self.frames else 0.0,
+            "snapshot_mb": self.snapshot_bytes / 2**20,
+            "training_overhead_ms": self.overhead_s * 1000.0,
+            "training_overhead_pct": 100.0 * self.overhead_s / elapsed if elapsed > 0 else 0.0,
+            "delivery": self.network.delivery_stats(),
+        }
+
+    def close(self):
+        """Wait for the frame in flight, then stop the viewer thread."""
+        self._idle.wait(timeout=5.0)
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5.0)
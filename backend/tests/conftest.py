@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The Flask blueprints are imported as top-level modules of backend/ (e.g. "import training")
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
@@ -0,0 +1,103 @@
+import json
+import os
+import textwrap
+import threading
+import time
+
+import pytest
+
+import training
+
+
+def _write_stub(root, body):
+    """Install a fake backend/gs/train.py under root that runs `body`."""
+    script_dir = root / 'backend' / 'gs'
+    script_dir.mkdir(parents=True)
+    (script_dir / 'train.py').write_text(textwrap.dedent(body))
+
+
+def _run(root, model_path, task_id, **params):
+    training._internal_run_training_script(
+        str(root), str(root / 'data'), str(model_path), 'alice', task_id, {'evaluate': False, **params})
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / 'output' / 'model'
+    yield path
+    training.training_tasks.clear()
+
+
+def _record(model_path):
+    with open(os.path.join(model_path, training.TASK_RECORD_FILE)) as f:
+        return json.load(f)
+
+
+def test_exit_143_marks_task_preempted_with_checkpoint(tmp_path, model_path):
+    checkpoint = str(model_path / 'chkpnt500.pth')
+    _write_stub(tmp_path, f'''
+        import sys
+        print("Iteration 500, loss 0.1", flush=True)
+        print("[Checkpoint] iteration 500 {checkpoint}", flush=True)
+        sys.exit(143)
+    ''')
+
+    _run(tmp_path, model_path, 'alice_preempt', iterations=1000)
+
+    task = training.training_tasks['alice_preempt']
+    assert task['status'] == 'preempted'
+    assert task['latest_checkpoint'] == {'iteration': 500, 'path': checkpoint}
+    assert task['message'] == 'Training preempted at iteration 500, resumable from checkpoint'
+    record = _record(model_path)
+    assert record['status'] == 'preempted'
+    assert record['latest_checkpoint'] == {'iteration': 500, 'path': checkpoint}
+
+
+def test_cancel_records_checkpoint_written_on_sigterm(tmp_path, model_path):
+    checkpoint = str(model_path / 'chkpnt700.pth')
+    # Like PreemptionHandler: SIGTERM writes a checkpoint and exits with 143
+    _write_stub(tmp_path, f'''
+        import signal, sys, time
+        def on_sigterm(signum, frame):
+            print("[Checkpoint] iteration 700 {checkpoint}", flush=True)
+            sys.exit(143)
+        signal.signal(signal.SIGTERM, on_sigterm)
+        print("[Checkpoint] iteration 300 {str(model_path / 'chkpnt300.pth')}", flush=True)
+        time.sleep(30)
+    ''')
+
+    runner = threading.Thread(target=_run, args=(tmp_path, model_path, 'alice_cancel'))
+    runner.start()
+    deadline = time.time() + 10
+    while (training.training_tasks.get('alice_cancel') or {}).get('latest_checkpoint') is None:
+        assert time.time() < deadline, 'stub never reported its first checkpoint'
+        time.sleep(0.05)
+
+    training.cancel_training_task('alice', 'alice_cancel')
+    runner.join(timeout=10)
+    assert not runner.is_alive()
+
+    task = training.training_tasks['alice_cancel']
+    assert task['status'] == 'cancelled'
+    assert task['latest_checkpoint'] == {'iteration': 700, 'path': checkpoint}
+    assert task['message'] == 'Task cancelled by user at iteration 700, resumable from checkpoint'
+    record = _record(model_path)
+    assert record['status'] == 'cancelled'
+    assert record['latest_checkpoint'] == {'iteration': 700, 'path': checkpoint}
+
+
+def test_should_cancel_terminates_a_run_started_after_cancel(tmp_path, model_path):
+    _write_stub(tmp_path, '''
+        import time
+        time.sleep(30)
+    ''')
+
+    start = time.time()
+    training._internal_run_training_script(
+        str(tmp_path), str(tmp_path / 'data'), str(model_path), 'alice', 'alice_sweep_run0', {'evaluate': False},
+        should_cancel=lambda: True)
+
+    assert time.time() - start < 10
+    task = training.training_tasks['alice_sweep_run0']
+    assert task['status'] == 'cancelled'
+    assert task['message'] == 'Task cancelled by user before the first checkpoint'
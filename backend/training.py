@@ -5,6 +5,14 @@ import time
 import threading
 import logging
 import numpy as np
+import math
+import random
+import re
+import signal
+import itertools
+import queue
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, request, jsonify, current_app
 import sys
 
@@ -18,12 +26,105 @@ training_bp = Blueprint('training', __name__)
 # 存储训练任务的状态
 training_tasks = {}
 
+# 存储超参数搜索任务的状态
+sweep_tasks = {}
+
+# 存储离线相机路径渲染任务的状态
+render_tasks = {}
+RENDER_PROGRESS_PATTERN = re.compile(r'^\[Render\] frame (\d+)/(\d+)$')
+
+# 超参数搜索可同时运行的训练进程数，以及各工作槽位的 WebSocket 端口起点
+SWEEP_WORKER_SLOTS = int(os.environ.get('TRAINING_WORKER_SLOTS', 1))
+SWEEP_BASE_PORT = 6010
+# 所有超参数搜索共用的工作槽位池：并发的搜索不会超出槽位数，也不会分到相同的端口
+sweep_slots = queue.Queue()
+for _slot in range(SWEEP_WORKER_SLOTS):
+    sweep_slots.put(_slot)
+MAX_SWEEP_RUNS = 64
+
+# train.py 收到 SIGTERM 并保存检查点后的退出码（与 gs/utils/checkpoint_utils.py 一致）
+PREEMPTED_EXIT_CODE = 143
+CHECKPOINT_PATTERN = re.compile(r'^chkpnt(\d+)\.pth$')
+# train.py 写完检查点后打印的行；路径原样保留（可能包含空格）
+CHECKPOINT_LINE_PATTERN = re.compile(r'^\[Checkpoint\] iteration (\d+) (.+)$')
+# 持久化到模型目录中的任务记录，后端重启后仍可据此恢复训练
+TASK_RECORD_FILE = 'training_task.json'
+TASK_RECORD_KEYS = ['task_id', 'user_id', 'source_path', 'model_path', 'params', 'status', 'message', 'start_time', 'end_time', 'latest_checkpoint']
+
+def _default_training_params():
+    return {
+        'sh_degree': 3,
+        'iterations': 7000,
+        'test_iterations': [7000, 30000],
+        'save_iterations': [7000, 30000],
+        'eval': False,
+        'quiet': False
+    }
+
+
+def _save_task_record(task_id):
+    """
+    把任务的参数、状态和最新检查点写入模型目录，供恢复训练使用
+    """
+    task = training_tasks.get(task_id)
+    if not task:
+        return
+    record = {key: task.get(key) for key in TASK_RECORD_KEYS}
+    record['task_id'] = task_id
+    record_file = os.path.join(task['model_path'], TASK_RECORD_FILE)
+    try:
+        tmp_file = record_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(record, f, indent=4)
+        os.replace(tmp_file, record_file)
+    except Exception as e:
+        logger.error(f"保存任务记录失败 {record_file}: {str(e)}")
+
+def _find_latest_checkpoint(model_path):
+    """
+    模型目录中迭代次数最大的检查点，返回 {'iteration', 'path'}，没有则返回 None
+    """
+    latest = None
+    if os.path.isdir(model_path):
+        for fname in os.listdir(model_path):
+            match = CHECKPOINT_PATTERN.match(fname)
+            if match and (latest is None or int(match.group(1)) > latest['iteration']):
+                latest = {'iteration': int(match.group(1)), 'path': os.path.join(model_path, fname)}
+    return latest
 
 # New wrapper function
 def run_training_script_wrapper(root_path, source_path, model_path, user_id, task_id, params=None):
     _internal_run_training_script(root_path, source_path, model_path, user_id, task_id, params)
 
-def _internal_run_training_script(root_path, source_path, model_path, user_id, task_id, params=None):
+def _run_evaluation(root_path, model_path, task_id):
+    """
+    训练结束后用保存的模型渲染全部测试视角，计算 PSNR/SSIM/LPIPS 并写出 metrics.json，
+    返回读取到的指标；评估失败不影响训练结果，返回 None
+    """
+    script_path = os.path.join(root_path, 'backend', 'gs', 'evaluate.py')
+    command = [sys.executable, script_path, '--model_path', model_path]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        # 与训练进程分开保存，取消评估不会影响已完成的训练
+        training_tasks[task_id]['eval_process'] = process
+        for line in iter(process.stdout.readline, ''):
+            line = line.strip()
+            if line:
+                training_tasks[task_id].setdefault('output_logs', []).append(line)
+        process.wait()
+        if training_tasks[task_id].get('evaluation_cancelled'):
+            logger.info(f"模型评估已取消: {task_id}")
+            return None
+        if process.returncode != 0:
+            logger.error(f"模型评估失败: {task_id}, 返回码: {process.returncode}")
+            return None
+        with open(os.path.join(model_path, 'metrics.json'), 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"模型评估异常: {task_id}: {str(e)}")
+        return None
+
+def _internal_run_training_script(root_path, source_path, model_path, user_id, task_id, params=None, should_cancel=None):
     # 首先创建任务记录，确保在异常处理中可以访问
     training_tasks[task_id] = {
         'status': 'initializing',
@@ -32,7 +133,9 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
         'user_id': user_id,
         'source_path': source_path,
         'model_path': model_path,
+        'params': params,
         'start_time': time.time(),
+        'latest_checkpoint': _find_latest_checkpoint(model_path) if (params or {}).get('start_checkpoint') else None,
     }
 
     try:
@@ -46,6 +149,7 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
         # 更新任务状态为处理中
         training_tasks[task_id]['status'] = '处理中'
         training_tasks[task_id]['message'] = '开始训练'
+        _save_task_record(task_id)
 
         # 构建命令
         script_path = os.path.join(root_path, 'backend', 'gs', 'train.py')
@@ -58,7 +162,7 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
 
         # 确保WebSocket参数正确传递
         websocket_host = 'localhost'
-        websocket_port = 6009
+        websocket_port = int(params.get('port', 6009)) if params else 6009
         
         if params:
     
@@ -69,7 +173,7 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
             
             # 添加其他参数
             for key, value in params.items():
-                if key in ['ip', 'port']:
+                if key in ['ip', 'port', 'evaluate']:
                     continue
                     
                 if value is not None:
@@ -107,6 +211,10 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
 
         # 保存进程对象，以便可以终止它
         training_tasks[task_id]['process'] = process
+        # 取消请求可能早于进程对象保存（例如所属的超参数搜索在本次训练启动期间被取消），此时在这里终止
+        if training_tasks[task_id]['status'] == 'cancelled' or (should_cancel is not None and should_cancel()):
+            training_tasks[task_id]['status'] = 'cancelled'
+            process.terminate()
         
         # 保存WebSocket配置
         training_tasks[task_id]['websocket'] = {
@@ -125,6 +233,7 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
             for line in iter(pipe.readline, ''):
                 if not line:
                     break
+                raw_line = line.rstrip('\r\n')
                 line = line.strip()
                 if line:
                     # 记录到日志
@@ -140,12 +249,68 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
                                 if part == "Iteration":
                                     current_iteration = int(parts[i+1].strip(','))
                                     total_iterations = params.get('iterations', 30000) if params else 30000
+                                    # 收敛提前结束时以新的结束迭代次数计算进度
+                                    total_iterations = training_tasks[task_id].get('stop_iteration', total_iterations)
                                     progress = min(95, int(current_iteration / total_iterations * 100))
                                     training_tasks[task_id]['progress'] = progress
                                     training_tasks[task_id]['message'] = f'Training in progress... Iteration {current_iteration}/{total_iterations}'
                         except Exception as e:
                             logger.error(f"解析输出失败: {str(e)}")
 
+                    # 解析收敛监控输出：[Convergence] iteration N psnr X ssim Y gain_per_1k Z decision=D stop_iteration=S
+                    if not is_error and line.startswith("[Convergence]"):
+                        try:
+                            fields = line.split()
+                            convergence = {
+                                'iteration': int(fields[2]),
+                                'psnr': float(fields[4]),
+                                'ssim': float(fields[6]),
+                                'gain_per_1k': None if fields[8] == 'n/a' else float(fields[8]),
+                                'decision': fields[9].split('=', 1)[1],
+                                'stop_iteration': int(fields[10].split('=', 1)[1]),
+                            }
+                            training_tasks[task_id]['convergence'] = convergence
+                            if convergence['decision'] == 'stop':
+                                training_tasks[task_id]['stop_iteration'] = convergence['stop_iteration']
+                                training_tasks[task_id]['message'] = (
+                                    f"Converged at iteration {convergence['iteration']} "
+                                    f"(PSNR {convergence['psnr']:.2f} dB), finishing at iteration {convergence['stop_iteration']}")
+                        except Exception as e:
+                            logger.error(f"解析收敛信息失败: {str(e)}")
+
+                    # 解析训练循环耗时：[Training loop] N iterations in X s (...)
+                    if not is_error and line.startswith("[Training loop]"):
+                        try:
+                            training_tasks[task_id]['training_seconds'] = float(line.split()[5])
+                        except Exception as e:
+                            logger.error(f"解析训练耗时失败: {str(e)}")
+
+                    # 解析查看器开销：[Viewer] N frames (X fps, Y ms/frame), training-thread overhead Z ms (P% of the loop), M MB snapshotted
+                    if not is_error and line.startswith("[Viewer]"):
+                        try:
+                            fields = line.replace('(', ' ').replace(')', ' ').replace(',', ' ').split()
+                            training_tasks[task_id]['viewer'] = {
+                                'frames': int(fields[1]),
+                                'fps': float(fields[3]),
+                                'ms_per_frame': float(fields[5]),
+                                'training_overhead_ms': float(fields[9]),
+                                'training_overhead_pct': float(fields[11].rstrip('%')),
+                            }
+                        except Exception as e:
+                            logger.error(f"解析查看器开销失败: {str(e)}")
+
+                    # 解析检查点输出：[Checkpoint] iteration N path（文件写完后才会打印）
+                    if not is_error and line.startswith("[Checkpoint]"):
+                        try:
+                            match = CHECKPOINT_LINE_PATTERN.match(raw_line)
+                            if match:
+                                training_tasks[task_id]['latest_checkpoint'] = {'iteration': int(match.group(1)), 'path': match.group(2)}
+                                _save_task_record(task_id)
+                            else:
+                                logger.error(f"无法解析检查点信息: {raw_line}")
+                        except Exception as e:
+                            logger.error(f"解析检查点信息失败: {str(e)}")
+
                     # 检查是否保存了模型
                     if not is_error and "Saving Gaussians" in line:
                         training_tasks[task_id]['message'] = 'Saving model checkpoint...'
@@ -166,19 +331,28 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
         stdout_thread.join(timeout=2)
         stderr_thread.join(timeout=2)
 
-        # 检查任务是否被取消
+        # 检查任务是否被取消：取消时发送的 SIGTERM 会让训练进程先写检查点再退出，
+        # 读取线程结束后 latest_checkpoint 即为最终检查点，记录到消息中（finally 中写入任务记录）
         if training_tasks[task_id]['status'] == 'cancelled':
-            try:
-                process.terminate()
-                logger.info(f"进程已终止: {task_id}")
-            except Exception as e:
-                logger.error(f"终止进程失败: {str(e)}")
+            checkpoint = training_tasks[task_id].get('latest_checkpoint')
+            training_tasks[task_id]['message'] = (
+                f"Task cancelled by user at iteration {checkpoint['iteration']}, resumable from checkpoint"
+                if checkpoint else 'Task cancelled by user before the first checkpoint')
+            training_tasks[task_id]['end_time'] = time.time()
+            logger.info(f"训练已取消: {task_id}, 返回码: {process.returncode}, 检查点: {checkpoint}")
             return
 
         # 检查进程是否成功完成
         return_code = process.returncode
 
         if return_code == 0:
+            # 训练成功后在测试视角上批量评估模型（params 中 evaluate 为 False 时跳过）
+            metrics = None
+            if (params or {}).get('evaluate', True):
+                training_tasks[task_id]['progress'] = 95
+                training_tasks[task_id]['message'] = 'Evaluating model on held-out views...'
+                metrics = _run_evaluation(root_path, model_path, task_id)
+
             # 训练成功
             training_tasks[task_id]['status'] = 'completed'
             training_tasks[task_id]['progress'] = 100
@@ -198,6 +372,12 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
                 'processing_time': training_tasks[task_id]['end_time'] - training_tasks[task_id]['start_time'],
                 'timestamp': time.time()
             }
+            if 'convergence' in training_tasks[task_id]:
+                result_summary['convergence'] = training_tasks[task_id]['convergence']
+            if metrics is not None:
+                # 摘要中只保留整体指标，逐视角结果见 metrics.json
+                result_summary['metrics'] = {key: value for key, value in metrics.items() if key != 'per_view'}
+                training_tasks[task_id]['metrics'] = result_summary['metrics']
 
             # 保存结果摘要到文件
             summary_file = os.path.join(model_path, 'training_summary.json')
@@ -206,6 +386,15 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
 
             logger.info(f"保存结果摘要到: {summary_file}")
             logger.info(f"训练完成: {task_id}")
+        elif return_code in (PREEMPTED_EXIT_CODE, -signal.SIGTERM):
+            # 被 SIGTERM 中断（抢占），训练进程已保存检查点，可通过 /resume 恢复
+            training_tasks[task_id]['status'] = 'preempted'
+            checkpoint = training_tasks[task_id].get('latest_checkpoint')
+            training_tasks[task_id]['message'] = (
+                f"Training preempted at iteration {checkpoint['iteration']}, resumable from checkpoint"
+                if checkpoint else 'Training preempted before the first checkpoint')
+            training_tasks[task_id]['end_time'] = time.time()
+            logger.info(f"训练被中断: {task_id}, 检查点: {checkpoint}")
         else:
             # 训练失败
             training_tasks[task_id]['status'] = 'failed'
@@ -235,6 +424,10 @@ def _internal_run_training_script(root_path, source_path, model_path, user_id, t
         # 设置结束时间
         training_tasks[task_id]['end_time'] = time.time()
 
+    finally:
+        # 无论成功、失败、取消还是被中断，都记录最终状态和最新检查点
+        _save_task_record(task_id)
+
 def generate_model_path(root_path, user_id, source_folder):
     """
     生成模型输出路径：源文件夹名_model，如果存在则添加序号
@@ -309,14 +502,7 @@ def start_training():
     logger.info(f"生成的模型输出路径: {model_path}")
 
     # 合并和准备训练参数
-    training_params = {
-        'sh_degree': 3,
-        'iterations': 7000,
-        'test_iterations': [7000, 30000],
-        'save_iterations': [7000, 30000],
-        'eval': False,
-        'quiet': False
-    }
+    training_params = _default_training_params()
     training_params.update(params or {})
 
     websocket_host = training_params.get('ip', '127.0.0.1')
@@ -351,6 +537,88 @@ def start_training():
         }
     }), 200
 
+def _load_task_record(backend_path, user_id, task_id):
+    """
+    从内存或用户模型目录中的任务记录查找任务（后端重启后内存中的任务会丢失）
+    """
+    if task_id in training_tasks:
+        return {key: training_tasks[task_id].get(key) for key in TASK_RECORD_KEYS}
+    user_models_folder = os.path.join(backend_path, 'data', user_id, 'models')
+    if not os.path.isdir(user_models_folder):
+        return None
+    for item in os.listdir(user_models_folder):
+        record_file = os.path.join(user_models_folder, item, TASK_RECORD_FILE)
+        if os.path.exists(record_file):
+            try:
+                with open(record_file, 'r') as f:
+                    record = json.load(f)
+            except Exception as e:
+                logger.error(f"读取任务记录失败 {record_file}: {str(e)}")
+                continue
+            if record.get('task_id') == task_id:
+                return record
+    return None
+
+@training_bp.route('/resume/<task_id>', methods=['POST'])
+def resume_training(task_id):
+    """
+    从最新检查点恢复已取消、失败或被中断的训练任务，使用相同的参数和 WebSocket 端口
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('userId') or data.get('username') or request.args.get('username')
+    if not user_id:
+        return jsonify({'error': 'Username is required'}), 400
+    if task_id.split('_')[0] != user_id:
+        return jsonify({'error': 'Unauthorized access to task'}), 403
+
+    backend_path = current_app.root_path
+    record = _load_task_record(backend_path, user_id, task_id)
+    if record is None:
+        return jsonify({'error': 'Task not found'}), 404
+    if task_id in training_tasks and training_tasks[task_id]['status'] in ['running', 'initializing', '处理中']:
+        return jsonify({'error': 'Task is still running'}), 400
+    if record.get('status') == 'completed':
+        return jsonify({'error': 'Task already completed'}), 400
+    for tid, task_info in training_tasks.items():
+        if task_info.get('source_path') == record['source_path'] and task_info.get('status') in ['running', 'initializing', '处理中']:
+            return jsonify({'error': f'任务已在运行: {tid}'}), 400
+
+    checkpoint = _find_latest_checkpoint(record['model_path'])
+    if checkpoint is None:
+        return jsonify({'error': 'No checkpoint to resume from'}), 400
+
+    params = dict(record.get('params') or {})
+    params['start_checkpoint'] = checkpoint['path']
+    logger.info(f"从检查点恢复训练: {task_id}, 迭代 {checkpoint['iteration']}")
+
+    # 先占位，避免重复请求在线程启动前再次恢复同一任务
+    training_tasks[task_id] = {
+        'status': 'initializing',
+        'progress': 0,
+        'message': f"Resuming from iteration {checkpoint['iteration']}...",
+        'user_id': user_id,
+        'source_path': record['source_path'],
+        'model_path': record['model_path'],
+        'start_time': time.time(),
+    }
+
+    thread = threading.Thread(
+        target=_internal_run_training_script,
+        args=(os.path.dirname(backend_path), record['source_path'], record['model_path'], user_id, task_id, params)
+    )
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({
+        'message': 'Training resumed',
+        'task_id': task_id,
+        'iteration': checkpoint['iteration'],
+        'websocket': {
+            'host': params.get('ip', '127.0.0.1'),
+            'port': params.get('port', 6009)
+        }
+    }), 200
+
 @training_bp.route('/status/<task_id>', methods=['GET'])
 def get_task_status(task_id):
     """
@@ -374,15 +642,46 @@ def get_task_status(task_id):
     }
 
 
+    # 如果训练开启了 --profile，附带最近一次写出的分阶段耗时统计
+    profile_file = os.path.join(training_tasks[task_id]['model_path'], 'training_profile.json')
+    if os.path.exists(profile_file):
+        try:
+            with open(profile_file, 'r') as f:
+                task_info['profile'] = json.load(f)
+        except Exception as e:
+            logger.error(f"读取性能分析文件失败 {profile_file}: {str(e)}")
+
+    # 如果开启了 --early_stop，附带收敛监控的判断和评估指标
+    convergence_file = os.path.join(training_tasks[task_id]['model_path'], 'convergence.json')
+    if os.path.exists(convergence_file):
+        try:
+            with open(convergence_file, 'r') as f:
+                task_info['convergence'] = json.load(f)
+        except Exception as e:
+            logger.error(f"读取收敛监控文件失败 {convergence_file}: {str(e)}")
+    elif 'convergence' in training_tasks[task_id]:
+        task_info['convergence'] = training_tasks[task_id]['convergence']
+
+    # 训练结束后附带查看器对训练线程造成的开销
+    if 'viewer' in training_tasks[task_id]:
+        task_info['viewer'] = training_tasks[task_id]['viewer']
+
     # 如果任务已完成，添加结果信息
     if training_tasks[task_id]['status'] == 'completed':
         task_info['model_path'] = training_tasks[task_id]['model_path']
         task_info['processing_time'] = training_tasks[task_id]['end_time'] - training_tasks[task_id]['start_time']
+        if 'metrics' in training_tasks[task_id]:
+            task_info['metrics'] = training_tasks[task_id]['metrics']
 
     # 如果任务失败，添加错误信息
     if training_tasks[task_id]['status'] == 'failed' and 'error' in training_tasks[task_id]:
         task_info['error'] = training_tasks[task_id]['error']
 
+    # 最新检查点；任务结束但未完成时可通过 /resume 恢复
+    task_info['latest_checkpoint'] = training_tasks[task_id].get('latest_checkpoint')
+    task_info['resumable'] = (training_tasks[task_id]['status'] in ['failed', 'cancelled', 'preempted']
+                              and task_info['latest_checkpoint'] is not None)
+
     return jsonify(task_info), 200
 
 
@@ -428,10 +727,21 @@ def cancel_training_task(username, task_id):
         return {'error': 'Unauthorized access to task'}
 
     # 检查任务是否已经完成或失败
-    if training_tasks[task_id]['status'] in ['completed', 'failed', 'cancelled']:
+    if training_tasks[task_id]['status'] in ['completed', 'failed', 'cancelled', 'preempted']:
         logger.warning(f"任务已经 {training_tasks[task_id]['status']}: {task_id}")
         return {'message': f"Task already {training_tasks[task_id]['status']}"}
 
+    # 训练已经结束、正在评估：只终止评估进程，训练结果仍记为完成（不含评估指标）
+    eval_process = training_tasks[task_id].get('eval_process')
+    if eval_process is not None:
+        training_tasks[task_id]['evaluation_cancelled'] = True
+        try:
+            eval_process.terminate()
+            logger.info(f"评估进程已终止: {task_id}")
+        except Exception as e:
+            logger.error(f"终止评估进程失败: {str(e)}")
+        return {'message': 'Evaluation cancelled, training already finished'}
+
     # 更新任务状态为取消
     training_tasks[task_id]['status'] = 'cancelled'
     training_tasks[task_id]['message'] = 'Task cancelled by user'
@@ -477,7 +787,7 @@ def get_active_tasks():
                     'message': task_info.get('message'),
                     'start_time': task_info.get('start_time')
                 })
-            elif status in ['completed', 'failed', 'cancelled']:
+            elif status in ['completed', 'failed', 'cancelled', 'preempted']:
                 tasks_to_remove.append(task_id)
 
     # 集中清理所有已完成、失败或取消的任务
@@ -527,6 +837,16 @@ def get_results():
                         results.append(summary)
                 except Exception as e:
                     logger.error(f"读取摘要文件失败 {summary_file}: {str(e)}")
+                    continue
+
+                # 附带评估指标（包括逐视角结果）
+                metrics_file = os.path.join(item_path, 'metrics.json')
+                if os.path.exists(metrics_file):
+                    try:
+                        with open(metrics_file, 'r') as f:
+                            summary['metrics'] = json.load(f)
+                    except Exception as e:
+                        logger.error(f"读取评估指标文件失败 {metrics_file}: {str(e)}")
             else:
                 # 如果没有摘要文件，创建基本信息
                 results.append({
@@ -537,3 +857,433 @@ def get_results():
                 })
     results.sort(key=lambda x: x.get('timestamp', 0) if isinstance(x, dict) and 'timestamp' in x else 0, reverse=True)
     return jsonify({'results': results}), 200
+
+
+def _optimization_param_defaults():
+    """
+    OptimizationParams 各字段及其默认值，用于校验和转换超参数搜索空间
+    """
+    from gs.arguments import OptimizationParams
+    return dict(vars(OptimizationParams(ArgumentParser())))
+
+def _cast_param(value, default):
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).lower() == 'true'
+    if isinstance(default, int):
+        return int(round(value))
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+def _sample_param(rng, spec):
+    """
+    随机搜索的单个字段：列表表示从中随机选择，{'min', 'max', 'log'} 表示（对数）均匀采样
+    """
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    low, high = spec['min'], spec['max']
+    if spec.get('log'):
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if isinstance(low, int) and isinstance(high, int):
+        return rng.randint(low, high)
+    return rng.uniform(low, high)
+
+def _expand_sweep(spec, defaults):
+    """
+    把网格搜索 {'grid': {字段: [取值]}} 或随机搜索 {'random': {字段: 取值空间}, 'num_runs': N, 'seed': S}
+    展开成每次训练的参数覆盖列表
+    """
+    space = spec.get('grid') or spec.get('random')
+    if not space:
+        raise ValueError('sweep must contain a non-empty "grid" or "random" spec')
+    unknown = [key for key in space if key not in defaults]
+    if unknown:
+        raise ValueError(f'Unknown optimization parameters: {", ".join(unknown)}')
+
+    if spec.get('grid'):
+        keys = list(space.keys())
+        configs = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    else:
+        rng = random.Random(spec.get('seed'))
+        configs = [{key: _sample_param(rng, value) for key, value in space.items()} for _ in range(int(spec.get('num_runs', 8)))]
+
+    if not configs:
+        raise ValueError('sweep produced no runs')
+    if len(configs) > MAX_SWEEP_RUNS:
+        raise ValueError(f'sweep produced {len(configs)} runs, more than the limit of {MAX_SWEEP_RUNS}')
+    return [{key: _cast_param(value, defaults[key]) for key, value in config.items()} for config in configs]
+
+def _write_sweep_summary(sweep):
+    summary = {key: value for key, value in sweep.items() if key != 'lock'}
+    summary_file = os.path.join(sweep['sweep_path'], 'sweep_summary.json')
+    tmp_file = summary_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(summary, f, indent=4)
+    os.replace(tmp_file, summary_file)
+
+def _prepare_sweep_dataset(root_path, source_path, cache_dir, params, sweep_id):
+    """
+    在所有训练开始前解码一次数据集（缩放后的图像和初始点云），各次训练共享同一缓存目录
+    """
+    script_path = os.path.join(root_path, 'backend', 'gs', 'prepare_dataset.py')
+    command = [sys.executable, script_path, '--source_path', source_path, '--dataset_cache', cache_dir]
+    for key in ['images', 'resolution']:
+        if params.get(key) is not None:
+            command.extend([f'--{key}', str(params[key])])
+    if params.get('white_background'):
+        command.append('--white_background')
+    if params.get('eval'):
+        command.append('--eval')
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.error(f"数据集预处理失败: {sweep_id}: {result.stderr[-2000:]}")
+        return False
+    logger.info(f"数据集预处理完成: {sweep_id}: {result.stdout.strip().splitlines()[-1:]}")
+    return True
+
+def _run_sweep_trial(root_path, sweep_id, run):
+    """
+    在空闲的工作槽位上运行一次训练，完成后记录评估指标和 PSNR/训练秒数
+    """
+    sweep = sweep_tasks[sweep_id]
+    slot = sweep_slots.get()
+    if sweep['status'] == 'cancelled':
+        sweep_slots.put(slot)
+        run['status'] = 'cancelled'
+        return
+
+    try:
+        params = dict(sweep['base_params'])
+        params.update(run['params'])
+        params['dataset_cache'] = sweep['dataset_cache']
+        # 每个槽位使用独立的 WebSocket 端口，避免并行训练互相冲突
+        params['port'] = SWEEP_BASE_PORT + slot
+        run['status'] = 'running'
+        run['port'] = params['port']
+        run['start_time'] = time.time()
+        # cancel_sweep 可能在任务记录创建前看到 running，由训练函数在进程启动后再检查一次搜索状态
+        _internal_run_training_script(root_path, sweep['source_path'], run['model_path'], sweep['user_id'], run['task_id'], params,
+                                      should_cancel=lambda: sweep['status'] == 'cancelled')
+    finally:
+        sweep_slots.put(slot)
+
+    # 任务记录可能已被 /active 清理，指标以 metrics.json 为准
+    task = training_tasks.get(run['task_id'], {})
+    run['end_time'] = time.time()
+    run['training_seconds'] = task.get('training_seconds', run['end_time'] - run['start_time'])
+    run['metrics'] = None
+    metrics_file = os.path.join(run['model_path'], 'metrics.json')
+    if os.path.exists(metrics_file):
+        try:
+            with open(metrics_file, 'r') as f:
+                run['metrics'] = {key: value for key, value in json.load(f).items() if key != 'per_view'}
+        except Exception as e:
+            logger.error(f"读取评估指标文件失败 {metrics_file}: {str(e)}")
+    run['status'] = task.get('status', 'completed' if run['metrics'] else 'failed')
+    if run['metrics'] and run['metrics'].get('psnr') is not None and run['training_seconds'] > 0:
+        run['psnr_per_second'] = run['metrics']['psnr'] / run['training_seconds']
+
+    with sweep['lock']:
+        scored = [r for r in sweep['runs'] if r.get('psnr_per_second') is not None]
+        if scored:
+            best = max(scored, key=lambda r: r['psnr_per_second'])
+            sweep['best'] = {key: best.get(key) for key in ['run_id', 'params', 'model_path', 'metrics', 'training_seconds', 'psnr_per_second']}
+        sweep['completed_runs'] = sum(1 for r in sweep['runs'] if r['status'] in ['completed', 'failed', 'cancelled'])
+        _write_sweep_summary(sweep)
+    logger.info(f"超参数搜索 {sweep_id} 完成第 {run['run_id']} 次训练: {run['status']}, PSNR/s {run.get('psnr_per_second')}")
+
+def _run_sweep(root_path, sweep_id):
+    sweep = sweep_tasks[sweep_id]
+    try:
+        sweep['status'] = 'preparing'
+        if not _prepare_sweep_dataset(root_path, sweep['source_path'], sweep['dataset_cache'], sweep['base_params'], sweep_id):
+            # 预处理失败时各次训练各自解码数据集
+            sweep['dataset_cache'] = ''
+
+        sweep['status'] = 'running'
+        with ThreadPoolExecutor(max_workers=sweep['max_parallel']) as pool:
+            futures = [pool.submit(_run_sweep_trial, root_path, sweep_id, run) for run in sweep['runs']]
+            for future in futures:
+                future.result()
+
+        if sweep['status'] != 'cancelled':
+            sweep['status'] = 'completed' if sweep.get('best') else 'failed'
+    except Exception as e:
+        sweep['status'] = 'failed'
+        sweep['error'] = str(e)
+        logger.exception(f"超参数搜索过程中发生异常: {sweep_id}")
+    finally:
+        sweep['end_time'] = time.time()
+        with sweep['lock']:
+            _write_sweep_summary(sweep)
+
+@training_bp.route('/sweep', methods=['POST'])
+def start_sweep():
+    """
+    启动超参数搜索：按网格或随机搜索空间展开 OptimizationParams 字段，在各工作槽位上并行训练，
+    并按 测试集 PSNR / 训练秒数 选出最优配置
+    """
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    user_id = data.get('userId') or data.get('username')
+    folder_path_or_name = data.get('folderPath') or data.get('source_path')
+    if not user_id or not folder_path_or_name:
+        return jsonify({'error': 'userId/username and folderPath/source_path are required'}), 400
+    folder_name = os.path.basename(folder_path_or_name) if os.path.isabs(folder_path_or_name) else folder_path_or_name
+
+    backend_path = current_app.root_path
+    project_root = os.path.dirname(backend_path)
+    source_path = os.path.join(backend_path, 'data', user_id, folder_name)
+    if not os.path.isdir(source_path):
+        return jsonify({'error': f'Source path does not exist on server'}), 400
+
+    try:
+        configs = _expand_sweep(data.get('sweep') or {}, _optimization_param_defaults())
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid sweep spec: {str(e)}'}), 400
+
+    # 默认在留出的测试视角上评估，避免按训练视角的指标选参
+    base_params = _default_training_params()
+    base_params['eval'] = True
+    base_params.update(data.get('params') or {})
+    base_params['evaluate'] = True
+    for key in ['ip', 'port', 'dataset_cache']:
+        base_params.pop(key, None)
+
+    sweep_id = f"{user_id}_sweep_{int(time.time())}"
+    sweep_path = generate_model_path(backend_path, user_id, f"{folder_name}_sweep")
+    os.makedirs(sweep_path, exist_ok=True)
+    max_parallel = max(1, min(int(data.get('max_parallel', SWEEP_WORKER_SLOTS)), SWEEP_WORKER_SLOTS, len(configs)))
+
+    sweep_tasks[sweep_id] = {
+        'sweep_id': sweep_id,
+        'user_id': user_id,
+        'status': 'initializing',
+        'source_path': source_path,
+        'sweep_path': sweep_path,
+        'dataset_cache': os.path.join(sweep_path, 'dataset_cache'),
+        'base_params': base_params,
+        'spec': data.get('sweep'),
+        'max_parallel': max_parallel,
+        'start_time': time.time(),
+        'completed_runs': 0,
+        'best': None,
+        'runs': [{
+            'run_id': i,
+            'task_id': f"{sweep_id}_run{i}",
+            'model_path': os.path.join(sweep_path, f"run_{i:03d}"),
+            'params': config,
+            'status': 'pending',
+        } for i, config in enumerate(configs)],
+        'lock': threading.Lock(),
+    }
+
+    thread = threading.Thread(target=_run_sweep, args=(project_root, sweep_id))
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({'message': 'Sweep started', 'sweep_id': sweep_id, 'num_runs': len(configs), 'max_parallel': max_parallel}), 200
+
+@training_bp.route('/sweep/<sweep_id>', methods=['GET'])
+def get_sweep_status(sweep_id):
+    """
+    超参数搜索状态：每次训练的进度、收敛信息和评估指标，以及当前最优配置
+    """
+    user_id = request.args.get('username')
+    if sweep_id not in sweep_tasks:
+        return jsonify({'error': 'Sweep not found'}), 404
+    sweep = sweep_tasks[sweep_id]
+    if sweep['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized access to sweep'}), 403
+
+    runs = []
+    for run in sweep['runs']:
+        run_info = dict(run)
+        task = training_tasks.get(run['task_id'])
+        if task is not None and run['status'] == 'running':
+            run_info['progress'] = task.get('progress')
+            run_info['message'] = task.get('message')
+            if 'convergence' in task:
+                run_info['convergence'] = task['convergence']
+        runs.append(run_info)
+
+    return jsonify({
+        'sweep_id': sweep_id,
+        'status': sweep['status'],
+        'num_runs': len(sweep['runs']),
+        'completed_runs': sweep['completed_runs'],
+        'max_parallel': sweep['max_parallel'],
+        'best': sweep['best'],
+        'runs': runs,
+    }), 200
+
+@training_bp.route('/sweep/<sweep_id>/cancel', methods=['POST'])
+def cancel_sweep(sweep_id):
+    """
+    取消超参数搜索：未开始的训练不再启动，正在运行的训练被终止
+    """
+    user_id = (request.get_json(silent=True) or {}).get('username') or request.args.get('username')
+    if sweep_id not in sweep_tasks:
+        return jsonify({'error': 'Sweep not found'}), 404
+    sweep = sweep_tasks[sweep_id]
+    if sweep['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized access to sweep'}), 403
+
+    sweep['status'] = 'cancelled'
+    for run in sweep['runs']:
+        if run['status'] == 'running':
+            cancel_training_task(user_id, run['task_id'])
+    return jsonify({'message': 'Sweep cancelled'}), 200
+
+def _run_render_path(render_id, command):
+    """
+    运行 render_path.py，从输出中解析渲染进度；视频由 ffmpeg 直接写入输出文件
+    """
+    task = render_tasks[render_id]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        task['process'] = process
+        if task['status'] == 'cancelled':
+            process.terminate()
+        else:
+            task['status'] = 'running'
+        for line in iter(process.stdout.readline, ''):
+            line = line.strip()
+            if not line:
+                continue
+            task['output_logs'].append(line)
+            del task['output_logs'][:-50]
+            match = RENDER_PROGRESS_PATTERN.match(line)
+            if match:
+                task['frames_done'], task['num_frames'] = int(match.group(1)), int(match.group(2))
+                task['progress'] = int(100 * task['frames_done'] / max(task['num_frames'], 1))
+                task['message'] = f"Rendered {task['frames_done']}/{task['num_frames']} frames"
+            elif line.startswith('[Render]'):
+                task['message'] = line
+        process.wait()
+
+        if task['status'] == 'cancelled':
+            return
+        if process.returncode == 0 and os.path.exists(task['output_path']):
+            task['status'] = 'completed'
+            task['progress'] = 100
+        else:
+            task['status'] = 'failed'
+            task['error'] = task['output_logs'][-1] if task['output_logs'] else f'render_path.py exited with code {process.returncode}'
+            logger.error(f"相机路径渲染失败: {render_id}, 返回码: {process.returncode}")
+    except Exception as e:
+        task['status'] = 'failed'
+        task['error'] = str(e)
+        logger.exception(f"相机路径渲染过程中发生异常: {render_id}")
+    finally:
+        task['end_time'] = time.time()
+
+@training_bp.route('/render_path', methods=['POST'])
+def start_render_path():
+    """
+    离线渲染已训练模型的相机路径（训练视角、环绕转台或关键帧插值）并编码为视频，
+    在后台运行，通过 /render_path/<render_id> 查询进度
+    """
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    user_id = data.get('userId') or data.get('username')
+    model_name = data.get('modelPath') or data.get('model_path')
+    if not user_id or not model_name:
+        return jsonify({'error': 'userId/username and modelPath/model_path are required'}), 400
+
+    backend_path = current_app.root_path
+    model_path = os.path.join(backend_path, 'data', user_id, 'models', os.path.basename(os.path.normpath(model_name)))
+    if not os.path.isdir(os.path.join(model_path, 'point_cloud')):
+        return jsonify({'error': 'Model has no saved point cloud on server'}), 400
+
+    camera_path = data.get('camera_path', 'orbit')
+    if camera_path not in ['train', 'orbit', 'keyframes']:
+        return jsonify({'error': f'Unknown camera_path: {camera_path}'}), 400
+    if camera_path == 'keyframes' and not data.get('keyframes'):
+        return jsonify({'error': 'keyframes are required for the keyframes camera path'}), 400
+
+    render_id = f"{user_id}_render_{int(time.time())}"
+    render_dir = os.path.join(model_path, 'renders')
+    os.makedirs(render_dir, exist_ok=True)
+    output_path = os.path.join(render_dir, f"{render_id}.mp4")
+
+    script_path = os.path.join(os.path.dirname(backend_path), 'backend', 'gs', 'render_path.py')
+    command = [sys.executable, script_path, '--model_path', model_path, '--camera_path', camera_path, '--output', output_path]
+    for key in ['iteration', 'frames', 'fps', 'width', 'height', 'fov', 'radius', 'elevation', 'batch_size', 'crf']:
+        if data.get(key) is not None:
+            command.extend([f'--{key}', str(data[key])])
+    for key in ['look_at', 'up']:
+        if data.get(key) is not None:
+            command.extend([f'--{key}'] + [str(value) for value in data[key]])
+    if camera_path == 'keyframes':
+        keyframes_file = os.path.join(render_dir, f"{render_id}_keyframes.json")
+        with open(keyframes_file, 'w') as f:
+            json.dump({'keyframes': data['keyframes']}, f, indent=4)
+        command.extend(['--keyframes', keyframes_file])
+
+    render_tasks[render_id] = {
+        'render_id': render_id,
+        'user_id': user_id,
+        'status': 'initializing',
+        'progress': 0,
+        'message': 'Loading model...',
+        'camera_path': camera_path,
+        'model_path': model_path,
+        'output_path': output_path,
+        'frames_done': 0,
+        'num_frames': None,
+        'output_logs': [],
+        'start_time': time.time(),
+    }
+
+    thread = threading.Thread(target=_run_render_path, args=(render_id, command))
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({'message': 'Render started', 'render_id': render_id, 'output_path': output_path}), 200
+
+@training_bp.route('/render_path/<render_id>', methods=['GET'])
+def get_render_path_status(render_id):
+    """
+    相机路径渲染任务的状态和进度，完成后附带视频路径
+    """
+    user_id = request.args.get('username')
+    if render_id not in render_tasks:
+        return jsonify({'error': 'Render task not found'}), 404
+    task = render_tasks[render_id]
+    if task['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized access to render task'}), 403
+
+    task_info = {key: task.get(key) for key in ['render_id', 'status', 'progress', 'message', 'camera_path', 'frames_done', 'num_frames', 'start_time', 'end_time']}
+    if task['status'] == 'completed':
+        task_info['output_path'] = task['output_path']
+    if task['status'] == 'failed':
+        task_info['error'] = task.get('error')
+    return jsonify(task_info), 200
+
+@training_bp.route('/render_path/<render_id>/cancel', methods=['POST'])
+def cancel_render_path(render_id):
+    """
+    取消相机路径渲染任务，终止渲染进程
+    """
+    user_id = (request.get_json(silent=True) or {}).get('username') or request.args.get('username')
+    if render_id not in render_tasks:
+        return jsonify({'error': 'Render task not found'}), 404
+    task = render_tasks[render_id]
+    if task['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized access to render task'}), 403
+    if task['status'] in ['completed', 'failed', 'cancelled']:
+        return jsonify({'message': f"Render task already {task['status']}"}), 200
+
+    task['status'] = 'cancelled'
+    task['message'] = 'Render cancelled by user'
+    if 'process' in task:
+        try:
+            task['process'].terminate()
+        except Exception as e:
+            logger.error(f"终止渲染进程失败: {str(e)}")
+    return jsonify({'message': 'Render cancelled'}), 200